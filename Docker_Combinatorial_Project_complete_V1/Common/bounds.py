@@ -0,0 +1,79 @@
+import math
+import numpy as np
+
+from .features import shortest_paths
+
+'''
+Lower bounds on the objective (the longest route) and optimality gap
+certificates stored with the results:
+    "bound"        - best valid lower bound known for the istance
+    "bound_source" - where it comes from: "relaxation", "MIP dual bound",
+                     "SMT bound probes", "CP objective bound", "optimality proof"
+    "gap"          - (obj - bound) / obj
+
+A gap target is a dictionary {"rel": relative gap, "abs": absolute gap};
+a run may stop as soon as its incumbent is within either of them.
+'''
+
+RELAXATION = "relaxation"
+
+
+def relaxation_bound(m, n, l, s, D):
+    '''
+    Lower bound computed from the istance alone, valid for any distance matrix:
+    - some courier has to reach the farthest item and come back, along shortest paths
+    - every item is entered once and at least one route goes back to the depot, so the
+      cheapest incoming arcs, shared among the m couriers, bound the longest route
+    '''
+    D = np.asarray(D, dtype=float)
+    paths = shortest_paths(D)
+    round_trip = max(paths[n, j] + paths[j, n] for j in range(n))
+
+    incoming = D.copy()
+    np.fill_diagonal(incoming, np.inf)
+    arcs = incoming[:, :n].min(axis=0).sum() + incoming[:n, n].min()
+    return int(max(round_trip, math.ceil(arcs / m)))
+
+
+def gap(obj, bound):
+    if obj is None or bound is None:
+        return None
+    if obj <= 0:
+        return 0.0
+    return max(0.0, (obj - bound) / obj)
+
+
+def gap_reached(obj, bound, gap_target):
+    '''
+    :return: True if the objective is within the relative or absolute gap target of the bound
+    '''
+    if gap_target is None or obj is None or bound is None:
+        return False
+    if gap_target.get("abs") is not None and obj - bound <= gap_target["abs"]:
+        return True
+    return gap_target.get("rel") is not None and gap(obj, bound) <= gap_target["rel"]
+
+
+def add_certificate(result, data, bound=None, source=None):
+    '''
+    Store the best lower bound known for the result, its source and the gap
+    in the result, in place. A result whose objective meets a valid lower
+    bound is proven optimal.
+    :param bound: optional lower bound reported by the backend, e.g. the MIP dual bound
+    '''
+    candidates = [(relaxation_bound(*data), RELAXATION)]
+    if bound is not None:
+        candidates.append((math.ceil(bound - 1e-6), source))
+    if result["optimal"] and isinstance(result["obj"], (int, float)):
+        candidates.append((result["obj"], "optimality proof"))
+    best_bound, best_source = max(candidates, key=lambda candidate: candidate[0])
+
+    result["bound"] = int(best_bound)
+    result["bound_source"] = best_source
+    if isinstance(result["obj"], (int, float)):
+        result["gap"] = round(gap(result["obj"], best_bound), 6)
+        if result["obj"] <= best_bound:
+            result["optimal"] = True
+    else:
+        result["gap"] = None
+    return result
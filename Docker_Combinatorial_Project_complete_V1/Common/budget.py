@@ -0,0 +1,113 @@
+import time
+
+from .instances import read_header
+from .runner import run_job, run_cached, save_job_result, summary, is_better
+from .journal import run_journaled
+
+
+def predict_difficulty(job):
+    '''
+    Cheap a-priori estimate of how hard a job is.
+    All the models grow with one arc (or successor) variable per courier and
+    pair of points, so m * (n+1)^2 is used as the predicted difficulty.
+    '''
+    m, n = read_header(job[1])
+    return m * (n + 1) ** 2
+
+
+class TimeBudget:
+    '''
+    Global wall-clock budget shared by all the jobs of a batch.
+    Every job is assigned a share of the time still left in proportion to its
+    predicted difficulty, so the time not used by fast jobs automatically goes
+    back to the pool for the following ones.
+    '''
+    def __init__(self, total, min_limit=1, max_limit=300):
+        self.total = total
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.deadline = time.time() + total
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.time())
+
+    def allocate(self, weight, pending_weight):
+        '''
+        :param weight: predicted difficulty of the job to be run
+        :param pending_weight: total predicted difficulty of the jobs still to be run, including this one
+        :return: the time limit of the job in seconds, 0 if the budget is exhausted
+        '''
+        remaining = self.remaining()
+        if remaining < self.min_limit:
+            return 0
+        share = remaining * weight / pending_weight if pending_weight > 0 else remaining
+        return min(max(share, self.min_limit), self.max_limit, remaining)
+
+
+def run_batch(jobs, total_budget, min_limit=1, max_limit=300, second_pass=True, cache=None, journal=None,
+              gap=None):
+    '''
+    Run a list of jobs within a total wall-clock budget.
+    Jobs are run from the easiest to the hardest. If some time is still left
+    at the end, the jobs that were not proven optimal are run again with a
+    larger share of what is left, keeping the best of the two results.
+    :param cache: optional SolveCache the jobs are run through
+    :param journal: optional RunJournal recording the progress; jobs it marks as done are skipped
+    :param gap: optional gap target every job stops at, see Common/bounds.py
+    :return: dictionary job -> (time limit, result)
+    '''
+    def run(job, limit):
+        if journal is not None:
+            return run_journaled(job, limit, journal, cache, gap=gap)
+        return run_job(job, limit, gap=gap) if cache is None else run_cached(job, limit, cache, gap=gap)
+
+    def save(job, result, limit):
+        save_job_result(job, result, limit)
+        if journal is not None:
+            journal.mark_done(job, result)
+
+    if journal is not None:
+        journal.add_jobs(jobs)
+        done = [job for job in jobs if journal.is_done(job)]
+        if done:
+            print(f"Skipping {len(done)} jobs already done")
+        jobs = [job for job in jobs if not journal.is_done(job)]
+
+    budget = TimeBudget(total_budget, min_limit, max_limit)
+    weights = {job: predict_difficulty(job) for job in jobs}
+    order = sorted(jobs, key=lambda job: weights[job])
+    results = {}
+
+    pending_weight = sum(weights.values())
+    for job in order:
+        limit = budget.allocate(weights[job], pending_weight)
+        pending_weight -= weights[job]
+        if limit == 0:
+            print(f"Budget exhausted, skipping {job}")
+            continue
+        print(f"\nRunning {job} with a time limit of {limit:.1f}s ({budget.remaining():.1f}s left)")
+        result = run(job, limit)
+        save(job, result, limit)
+        results[job] = (limit, result)
+
+    if not second_pass:
+        return results
+
+    unproven = [job for job in order if job in results and not summary(job, results[job][1])[1]]
+    pending_weight = sum(weights[job] for job in unproven)
+    for job in unproven:
+        limit = budget.allocate(weights[job], pending_weight)
+        pending_weight -= weights[job]
+        previous_limit, previous_result = results[job]
+        if limit <= previous_limit:
+            # a second attempt with less time than the first one cannot do better
+            continue
+        print(f"\nSecond pass on {job} with a time limit of {limit:.1f}s ({budget.remaining():.1f}s left)")
+        result = run(job, limit)
+        if is_better(summary(job, result), summary(job, previous_result)):
+            save(job, result, limit)
+            results[job] = (limit, result)
+        elif journal is not None:
+            journal.mark_done(job, previous_result)
+
+    return results
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+from .instances import load_instance
+from .registry import APP_PATH, get_backend
+
+CACHE_PATH = "/app/res/cache"
+
+# Modules of Common every backend result goes through: presolve, decoding of
+# the routes, lower bounds and the final audit
+SHARED_MODEL_FILES = ["presolve.py", "decoder.py", "bounds.py", "evaluator.py"]
+
+
+def instance_hash(m, n, l, s, D):
+    '''
+    Hash of the istance data itself, independent of the file it was read from.
+    '''
+    digest = hashlib.sha256()
+    digest.update(json.dumps([int(m), int(n), [int(v) for v in l], [int(v) for v in s]]).encode())
+    digest.update(np.ascontiguousarray(D, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def model_files(job):
+    '''
+    :return: the files defining the model solved by a job, the shared modules included
+    '''
+    backend, instance, option = job
+    return get_backend(backend).model_files(option) + [os.path.join(APP_PATH, "Common", name)
+                                                       for name in SHARED_MODEL_FILES]
+
+
+def models_hash(paths):
+    return hashlib.sha256("".join(file_hash(path) for path in paths).encode()).hexdigest()
+
+
+def cache_key(job, data, options=None):
+    '''
+    Content address of a job: istance data, backend, model files, solver and options.
+    '''
+    backend, instance, option = job
+    key = json.dumps([instance_hash(*data), backend, models_hash(model_files(job)), option, options or {}])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class SolveCache:
+    '''
+    One JSON file per cache key, holding the best result found so far for it
+    together with the model files and hash it was computed with.
+    '''
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+
+    def entry_path(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def lookup(self, job, data=None, options=None):
+        '''
+        :return: the cached entry of the job, None if there is none
+        '''
+        if data is None:
+            data = load_instance(job[1])
+        entry_path = self.entry_path(cache_key(job, data, options))
+        if not os.path.exists(entry_path):
+            return None
+        with open(entry_path) as f:
+            return json.load(f)
+
+    def store(self, job, result, summary, data=None, options=None):
+        '''
+        :param summary: (time, optimal, obj) of the result
+        '''
+        if data is None:
+            data = load_instance(job[1])
+        files = model_files(job)
+        entry = {"backend": job[0], "option": job[2], "options": options or {},
+                 "instance_hash": instance_hash(*data),
+                 "model_files": files, "model_hash": models_hash(files),
+                 "optimal": summary[1], "obj": summary[2], "result": result}
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.entry_path(cache_key(job, data, options)), 'w') as f:
+            json.dump(entry, f, indent=3)
+
+    def invalidate_stale(self):
+        '''
+        Remove the entries computed with model files that have changed since.
+        :return: the number of removed entries
+        '''
+        removed = 0
+        if not os.path.isdir(self.path):
+            return removed
+        for name in os.listdir(self.path):
+            entry_path = os.path.join(self.path, name)
+            with open(entry_path) as f:
+                entry = json.load(f)
+            files = entry["model_files"]
+            if not all(os.path.exists(path) for path in files) or models_hash(files) != entry["model_hash"]:
+                os.remove(entry_path)
+                removed += 1
+        return removed
+
+    def clear(self):
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
@@ -0,0 +1,164 @@
+import numpy as np
+
+'''
+Backend-independent solution decoder.
+Raw solver values are first pulled in bulk into NumPy arrays (arc tensors,
+successor arrays, sequence matrices), then the routes of all the couriers are
+rebuilt together, one vectorized step per position along the routes.
+
+Points are 0-indexed with the depot as last point (n), like the rows of D.
+Decoded routes are a padded (m, n) array of the visited items, -1 after the
+end of each route, plus an end state per courier:
+    END_DEPOT    - the route goes back to the depot
+    END_NO_ARC   - a point with no outgoing arc was reached
+    END_SUBTOUR  - an already visited point was reached again
+'''
+
+END_DEPOT = 0
+END_NO_ARC = 1
+END_SUBTOUR = 2
+
+
+def arcs_from_pulp(route, n_points, n_couriers):
+    '''
+    :param route: PuLP variables route[i][j][k]
+    :return: (m, n+1, n+1) boolean arc tensor
+    '''
+    values = np.array([[[route[i][j][k].varValue or 0 for k in range(n_couriers)]
+                        for j in range(n_points)] for i in range(n_points)], dtype=float)
+    return values.transpose(2, 0, 1) > 0.9
+
+
+def arcs_from_z3(model, m, n):
+    '''
+    Read all the x_i_j_k Booleans of a Z3 model in a single pass over its
+    declarations, instead of evaluating every candidate arc.
+    Variables eliminated by preprocessing are false, like with model completion.
+    :return: (m, n+1, n+1) boolean arc tensor
+    '''
+    arcs = np.zeros((m, n+1, n+1), dtype=bool)
+    for decl in model.decls():
+        name = decl.name()
+        if name.startswith("x_") and decl.arity() == 0:
+            if str(model[decl]) == "True":
+                i, j, k = map(int, name[2:].split("_"))
+                arcs[i, j, k] = True
+    return arcs
+
+
+def arcs_from_path_matrix(path, m):
+    '''
+    :param path: (n+1, n+1) matrix holding the 1-indexed courier travelling each arc, 0 if none
+    :return: (m, n+1, n+1) boolean arc tensor
+    '''
+    path = np.asarray(path)
+    return path[None, :, :] == np.arange(1, m+1)[:, None, None]
+
+
+def successors_from_arcs(arcs):
+    '''
+    :return: (m, n+1) successor of every point for every courier, -1 if it has no outgoing arc
+    '''
+    arcs = arcs.copy()
+    diagonal = np.arange(arcs.shape[1])
+    arcs[:, diagonal, diagonal] = False
+    successors = arcs.argmax(axis=2)
+    successors[~arcs.any(axis=2)] = -1
+    return successors
+
+
+def decode_successors(successors):
+    '''
+    Follow the successor array of every courier from the depot, all couriers at once.
+    :param successors: (m, n+1) 0-indexed successors, -1 for no outgoing arc
+    :return: routes (m, n) padded with -1, ends (m,) end states, repeated (m,) point
+             reached twice for END_SUBTOUR couriers (-1 otherwise)
+    '''
+    successors = np.asarray(successors)
+    m, n_points = successors.shape
+    depot = n_points - 1
+    couriers = np.arange(m)
+
+    # one spare column: a route serving all the items still takes a step to return to the depot
+    routes = np.full((m, n_points), -1, dtype=int)
+    ends = np.full(m, END_NO_ARC, dtype=int)
+    repeated = np.full(m, -1, dtype=int)
+    visited = np.zeros((m, n_points), dtype=bool)
+    active = np.ones(m, dtype=bool)
+    current = np.full(m, depot, dtype=int)
+
+    for step in range(n_points):
+        if not active.any():
+            break
+        nxt = np.where(active, successors[couriers, current], -1)
+        safe = np.maximum(nxt, 0)
+
+        no_arc = active & (nxt == -1)
+        at_depot = active & (nxt == depot)
+        subtour = active & ~no_arc & ~at_depot & visited[couriers, safe]
+        ends[at_depot] = END_DEPOT
+        ends[subtour] = END_SUBTOUR
+        repeated[subtour] = nxt[subtour]
+        active &= ~(no_arc | at_depot | subtour)
+
+        routes[active, step] = nxt[active]
+        visited[couriers[active], nxt[active]] = True
+        current = np.where(active, nxt, current)
+
+    return routes[:, :-1], ends, repeated
+
+
+def decode_arcs(arcs):
+    return decode_successors(successors_from_arcs(arcs))
+
+
+def decode_sequence_matrix(sequence, depot):
+    '''
+    :param sequence: (m, L) 1-indexed points visited in order, depot at both ends, 0 padded
+    :return: routes (m, L) padded with -1
+    '''
+    sequence = np.asarray(sequence)
+    items = (sequence != 0) & (sequence != depot + 1)
+    # stable sort keeps the order of the items and moves the padding to the end
+    order = np.argsort(~items, axis=1, kind="stable")
+    routes = np.take_along_axis(np.where(items, sequence - 1, -1), order, axis=1)
+    return routes
+
+
+def route_metrics(routes, D, s):
+    '''
+    Distance and load of every route, including the legs from and to the depot.
+    :param routes: (m, L) 0-indexed items padded with -1
+    :return: distances (m,), loads (m,)
+    '''
+    D = np.asarray(D)
+    depot = D.shape[0] - 1
+    points = np.where(routes >= 0, routes, depot)
+    # padding is replaced by the depot, whose self distance is 0
+    legs = np.concatenate([np.full((routes.shape[0], 1), depot), points, np.full((routes.shape[0], 1), depot)], axis=1)
+    distances = D[legs[:, :-1], legs[:, 1:]].sum(axis=1)
+    return distances, route_loads(routes, s)
+
+
+def route_loads(routes, s):
+    s = np.asarray(s)
+    return np.where(routes >= 0, s[np.maximum(routes, 0)], 0).sum(axis=1)
+
+
+def route_items(routes):
+    '''
+    :return: list of the visited items of every courier, 1-indexed as in the JSON output
+    '''
+    return [(row[row >= 0] + 1).tolist() for row in routes]
+
+
+def pad_routes(routes, width=None):
+    '''
+    :param routes: list of the 0-indexed items of every courier
+    :return: (m, width) array padded with -1, as used by route_metrics
+    '''
+    width = max([len(route) for route in routes] + [width or 1])
+    padded = np.full((len(routes), width), -1, dtype=int)
+    for k, route in enumerate(routes):
+        padded[k, :len(route)] = route
+    return padded
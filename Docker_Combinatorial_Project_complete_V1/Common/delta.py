@@ -0,0 +1,303 @@
+import argparse
+import json
+import time
+import numpy as np
+
+from .decoder import pad_routes, route_metrics
+from .instances import read_dat
+
+'''
+Incremental re-solve of a changed istance.
+The previous solution is repaired instead of solving the new istance from
+scratch: removed items are dropped from their routes, couriers over their new
+capacity give back items, and new or evicted items are put at their cheapest
+insertion point. Only the couriers touched by the patch are then improved,
+with 2-opt and, optionally, with a backend solving the sub-istance made of
+those couriers and their items, warm started from the repaired routes.
+
+A patch is a dictionary with any of the following keys:
+    "remove_items": [item, ...]             1-indexed items of the previous istance
+    "capacities":   {"courier": capacity}   1-indexed couriers
+    "add_items":    [{"size": s, "to": [...], "from": [...]}, ...]
+                    distances from and to the new item for every point of the
+                    patched istance, items first and the depot last
+    "distances":    [[i, j, d], ...]        1-indexed points of the patched istance
+
+Routes are lists of 0-indexed items, one list per courier.
+'''
+
+
+def apply_patch(data, patch):
+    '''
+    :return: the patched istance data and, for every item of the previous
+             istance, its index in the patched one (-1 if removed)
+    '''
+    m, n, l, s, D = data
+    l = list(l)
+    D = np.asarray(D)
+    for courier, capacity in patch.get("capacities", {}).items():
+        l[int(courier) - 1] = int(capacity)
+
+    removed = {int(item) - 1 for item in patch.get("remove_items", [])}
+    keep = [i for i in range(n) if i not in removed]
+    item_map = np.full(n, -1, dtype=int)
+    item_map[keep] = np.arange(len(keep))
+
+    added = patch.get("add_items", [])
+    new_n = len(keep) + len(added)
+    new_D = np.zeros((new_n + 1, new_n + 1), dtype=int)
+    old_points = keep + [n]
+    new_points = list(range(len(keep))) + [new_n]
+    new_D[np.ix_(new_points, new_points)] = D[np.ix_(old_points, old_points)]
+    new_s = [s[i] for i in keep]
+    for t, item in enumerate(added):
+        index = len(keep) + t
+        new_D[index, :] = item["to"]
+        new_D[:, index] = item["from"]
+        new_s.append(int(item["size"]))
+    for i, j, distance in patch.get("distances", []):
+        new_D[int(i) - 1, int(j) - 1] = int(distance)
+
+    return (m, new_n, l, new_s, new_D), item_map
+
+
+def assign_routes_to_couriers(routes, s, l):
+    '''
+    SMT results only list the couriers that are used, so their routes are
+    matched to couriers by load: heaviest route first, to the smallest
+    courier it fits in.
+    '''
+    m = len(l)
+    if len(routes) == m:
+        return routes
+    loads = [sum(s[i] for i in route) for route in routes]
+    assigned = [[] for _ in range(m)]
+    free = set(range(m))
+    for r in sorted(range(len(routes)), key=lambda r: -loads[r]):
+        fitting = [k for k in free if l[k] >= loads[r]]
+        courier = min(fitting, key=lambda k: l[k]) if fitting else max(free, key=lambda k: l[k])
+        assigned[courier] = routes[r]
+        free.remove(courier)
+    return assigned
+
+
+def result_routes(backend, sol, data):
+    '''
+    :param sol: the "sol" of a result in the output format of the backend
+    :return: the routes of every courier
+    '''
+    m, n, l, s, D = data
+    if backend == "MIP":
+        # [0, item, ..., item, 0], possibly with subtour markers
+        routes = [[point - 1 for point in path if isinstance(point, int) and point != 0] for path in sol]
+    elif backend == "MZN":
+        # [n+1, item, ..., item, n+1] with the depot as point n+1
+        routes = [[point - 1 for point in path if 0 < point <= n] for path in sol]
+    else:
+        routes = [[point - 1 for point in path] for path in sol]
+    return assign_routes_to_couriers(routes, s, l)
+
+
+def backend_paths(backend, routes, n):
+    '''
+    Routes in the output format of the backend, as expected by its warm start.
+    '''
+    if backend == "MIP":
+        return [[0] + [i + 1 for i in route] + [0] for route in routes]
+    if backend == "MZN":
+        return [[n + 1] + [i + 1 for i in route] + [n + 1] for route in routes]
+    return [[i + 1 for i in route] for route in routes]
+
+
+def route_length(route, D):
+    depot = len(D) - 1
+    points = [depot] + list(route) + [depot]
+    return int(sum(D[i][j] for i, j in zip(points, points[1:])))
+
+
+def cheapest_insertion(route, item, D):
+    '''
+    :return: (increase of the route length, position) of the cheapest insertion of item
+    '''
+    depot = len(D) - 1
+    points = [depot] + list(route) + [depot]
+    increases = [D[i][item] + D[item][j] - D[i][j] for i, j in zip(points, points[1:])]
+    position = int(np.argmin(increases))
+    return int(increases[position]), position
+
+
+def two_opt(route, D):
+    '''
+    Reverse segments of the route as long as it gets shorter.
+    '''
+    route = list(route)
+    best = route_length(route, D)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(route) - 1):
+            for j in range(i + 2, len(route) + 1):
+                candidate = route[:i] + route[i:j][::-1] + route[j:]
+                length = route_length(candidate, D)
+                if length < best:
+                    route, best, improved = candidate, length, True
+    return route
+
+
+def repair(routes, data, touched, unassigned):
+    '''
+    Make the routes feasible for the patched istance and insert the unassigned items.
+    :param touched: set of couriers changed so far, updated in place
+    '''
+    m, n, l, s, D = data
+    routes = [list(route) for route in routes]
+    unassigned = list(unassigned)
+
+    # couriers over their capacity give back the items whose removal saves the most distance
+    for k in range(m):
+        while sum(s[i] for i in routes[k]) > l[k]:
+            savings = [route_length(routes[k], D) - route_length(routes[k][:p] + routes[k][p+1:], D)
+                       for p in range(len(routes[k]))]
+            unassigned.append(routes[k].pop(int(np.argmax(savings))))
+            touched.add(k)
+
+    # largest items first, each one to the courier whose route stays the shortest
+    for item in sorted(unassigned, key=lambda i: -s[i]):
+        best = None
+        for k in range(m):
+            if sum(s[i] for i in routes[k]) + s[item] > l[k]:
+                continue
+            increase, position = cheapest_insertion(routes[k], item, D)
+            length = route_length(routes[k], D) + increase
+            if best is None or length < best[0]:
+                best = (length, k, position)
+        if best is None:
+            raise ValueError(f"Item {item+1} does not fit in any courier")
+        length, k, position = best
+        routes[k].insert(position, item)
+        touched.add(k)
+    return routes
+
+
+def reoptimize(routes, data, couriers, backend, option, time_limit):
+    '''
+    Solve the sub-istance made of the given couriers and their items with a
+    backend, warm started from the current routes, and keep the new routes of
+    those couriers if they are not worse. Couriers with an empty route are
+    left out, since some models (SMT) give every courier at least one item.
+    '''
+    from .runner import run_on_data, summary
+
+    m, n, l, s, D = data
+    couriers = sorted(k for k in couriers if routes[k])
+    if not couriers:
+        return routes
+    items = sorted(i for k in couriers for i in routes[k])
+    local = {item: index for index, item in enumerate(items)}
+    points = items + [n]
+    sub_data = (len(couriers), len(items), [l[k] for k in couriers], [s[i] for i in items],
+                np.asarray(D)[np.ix_(points, points)])
+    sub_routes = [[local[i] for i in routes[k]] for k in couriers]
+    current = int(max(route_length(route, sub_data[4]) for route in sub_routes))
+
+    result = run_on_data(backend, option, sub_data, time_limit,
+                         warm_start=(current, backend_paths(backend, sub_routes, len(items))))
+    solve_time, optimal, obj = summary((backend, None, option), result)
+    if obj is None:
+        print(f"Re-optimization: no solution from {backend} for couriers {[k + 1 for k in couriers]}, "
+              f"repaired routes kept")
+        return routes
+    sol = next(iter(result.values()))["sol"] if backend == "MZN" else result["sol"]
+    new_sub_routes = result_routes(backend, sol, sub_data)
+    if sorted(i for route in new_sub_routes for i in route) != list(range(len(items))):
+        print(f"Re-optimization: incomplete routes from {backend}, repaired routes kept")
+        return routes  # e.g. a MIP result with subtours
+    if max(route_length(route, sub_data[4]) for route in new_sub_routes) > current:
+        return routes
+    routes = [list(route) for route in routes]
+    for k, route in zip(couriers, new_sub_routes):
+        routes[k] = [items[i] for i in route]
+    return routes
+
+
+def resolve(data, routes, patch, backend=None, option=None, time_limit=10):
+    '''
+    Re-solve a changed istance starting from a previous solution.
+    :param data: the previous istance data (m, n, l, s, D)
+    :param routes: the previous routes
+    :param patch: the changes, see the module description
+    :param backend: optional backend used to re-optimize the touched couriers, e.g. "SMT"
+    :return: dictionary with the patched istance data, the new routes, their
+             objective and distances and the couriers that were touched
+    '''
+    start = time.time()
+    new_data, item_map = apply_patch(data, patch)
+    m, n, l, s, D = new_data
+
+    touched = set(int(courier) - 1 for courier in patch.get("capacities", {}))
+    new_routes = []
+    for k, route in enumerate(routes):
+        mapped = [int(item_map[i]) for i in route if item_map[i] >= 0]
+        if len(mapped) < len(route):
+            touched.add(k)
+        new_routes.append(mapped)
+
+    changed_arcs = {(int(i) - 1, int(j) - 1) for i, j, distance in patch.get("distances", [])}
+    for k, route in enumerate(new_routes):
+        points = [n] + route + [n]
+        if changed_arcs & set(zip(points, points[1:])):
+            touched.add(k)
+
+    added = range(n - len(patch.get("add_items", [])), n)
+    new_routes = repair(new_routes, new_data, touched, added)
+    for k in touched:
+        new_routes[k] = two_opt(new_routes[k], D)
+    if backend is not None and touched:
+        new_routes = reoptimize(new_routes, new_data, touched, backend, option, time_limit)
+
+    distances, loads = route_metrics(pad_routes(new_routes), D, s)
+    return {"data": new_data, "routes": new_routes, "obj": int(distances.max()),
+            "distances": distances.tolist(), "touched": sorted(touched), "time": time.time() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-solve a changed istance starting from a previous solution.')
+    parser.add_argument('instance', help='previous istance in the .dat format')
+    parser.add_argument('solution', help='JSON result of the previous istance')
+    parser.add_argument('patch', help='JSON patch of the istance')
+    parser.add_argument('--solution-backend', default='SMT',
+                        help='backend that produced the solution (MIP, SMT or MZN), e.g. MIP:cbc to pick '
+                             'the cbc result of a MIP result file')
+    parser.add_argument('--engine', default=None, help='backend re-optimizing the touched couriers, e.g. SMT, MIP:highs')
+    parser.add_argument('--time-limit', type=float, default=10)
+    parser.add_argument('--output', default=None, help='where to write the patched istance routes as JSON')
+    args = parser.parse_args()
+
+    data = read_dat(args.instance)
+    with open(args.solution) as f:
+        result = json.load(f)
+    with open(args.patch) as f:
+        patch = json.load(f)
+
+    backend, _, option = args.solution_backend.partition(':')
+    if "sol" not in result:
+        result = result[option] if option else next(iter(result.values()))
+    routes = result_routes(backend, result["sol"], data)
+
+    engine, option = (None, None)
+    if args.engine:
+        engine, _, option = args.engine.partition(':')
+    repaired = resolve(data, routes, patch, engine, option or None, args.time_limit)
+    print(f"Objective {repaired['obj']} in {repaired['time']:.2f}s, couriers touched: "
+          f"{[k + 1 for k in repaired['touched']]}")
+    output = {"time": round(repaired["time"], 2), "optimal": False, "obj": repaired["obj"],
+              "sol": [[i + 1 for i in route] for route in repaired["routes"]]}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=4)
+    else:
+        print(json.dumps(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from .instances import load_instance
+from .service import stop_process_group
+
+'''
+Distributed execution of a batch through a job queue kept in a SQLite file
+on a volume shared by all the hosts (a Docker volume, an NFS mount, ...).
+The coordinator enqueues the jobs and saves their results as they come in.
+Workers on any host pull the jobs of the backends they serve, send a
+heartbeat while solving and push their incumbents and final result to the
+same file. A running job whose heartbeat stops for longer than the timeout
+is put back in the queue, and the next worker restarts it from its best
+incumbent.
+
+    python3 Main.py SMT 1:10 --queue /shared/queue.db
+    python3 -m Common.distributed worker /shared/queue.db --backends SMT MIP
+    python3 -m Common.distributed status /shared/queue.db
+
+Heartbeats are counters rather than timestamps, and only the coordinator
+clock is used to tell how long a counter has not moved, so the hosts do not
+need synchronized clocks.
+'''
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+HEARTBEAT_INTERVAL = 5      # seconds between two heartbeats of a worker
+HEARTBEAT_TIMEOUT = 30      # seconds without heartbeat after which a job is requeued
+POLL_INTERVAL = 2           # seconds between two checks of the queue
+MAX_ATTEMPTS = 3            # claims of a job before it is marked as failed
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    backend TEXT NOT NULL,
+    instance INTEGER NOT NULL,
+    option TEXT,
+    time_limit REAL NOT NULL,
+    gap TEXT,
+    data TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    beats INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    saved INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS incumbents (
+    job_id INTEGER NOT NULL,
+    worker TEXT NOT NULL,
+    obj INTEGER NOT NULL,
+    sol TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    backends TEXT NOT NULL,
+    job_id INTEGER,
+    beats INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobQueue:
+    '''
+    Every operation opens its own connection, so that a queue can be used
+    from several threads and processes at once. The default rollback journal
+    is kept: the WAL mode needs shared memory and does not work on network
+    file systems.
+    '''
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def transaction(self):
+        return Transaction(self.connect())
+
+    def reset(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM jobs")
+            conn.execute("DELETE FROM incumbents")
+
+    def enqueue(self, jobs, time_limits, gap=None):
+        '''
+        Add the jobs that are not in the queue yet; failed ones are queued again.
+        :param time_limits: time limit of every job
+        :return: the number of jobs added
+        '''
+        added = 0
+        with self.transaction() as conn:
+            for job, time_limit in zip(jobs, time_limits):
+                backend, instance, option = job
+                row = conn.execute("SELECT id, state FROM jobs WHERE backend = ? AND instance = ? AND option IS ?",
+                                   (backend, int(instance), option)).fetchone()
+                if row is not None and row["state"] != FAILED:
+                    continue
+                if row is not None:
+                    conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+                m, n, l, s, D = load_instance(instance)
+                data = json.dumps([int(m), int(n), [int(v) for v in l], [int(v) for v in s],
+                                   [[int(v) for v in row] for row in D]])
+                conn.execute("INSERT INTO jobs (backend, instance, option, time_limit, gap, data, state) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (backend, int(instance), option, float(time_limit), json.dumps(gap), data, PENDING))
+                added += 1
+        return added
+
+    def claim(self, worker, backends=None):
+        '''
+        Take the oldest pending job of one of the backends.
+        :return: the job row, None if there is nothing to do
+        '''
+        with self.transaction() as conn:
+            query = "SELECT * FROM jobs WHERE state = ?"
+            params = [PENDING]
+            if backends:
+                query += f" AND backend IN ({', '.join('?' for _ in backends)})"
+                params += list(backends)
+            row = conn.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, beats = beats + 1 "
+                         "WHERE id = ?", (RUNNING, worker, row["id"]))
+            conn.execute("UPDATE workers SET job_id = ? WHERE name = ?", (row["id"], worker))
+            return row
+
+    def register(self, worker, backends):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (name, backends, job_id, beats) VALUES (?, ?, NULL, 0)",
+                         (worker, json.dumps(backends)))
+
+    def heartbeat(self, worker, job_id=None):
+        '''
+        :return: False if the job has been taken away from the worker in the meantime
+        '''
+        with self.transaction() as conn:
+            conn.execute("UPDATE workers SET beats = beats + 1, job_id = ? WHERE name = ?", (job_id, worker))
+            if job_id is None:
+                return True
+            updated = conn.execute("UPDATE jobs SET beats = beats + 1 WHERE id = ? AND worker = ? AND state = ?",
+                                   (job_id, worker, RUNNING)).rowcount
+            return updated == 1
+
+    def add_incumbent(self, job_id, worker, obj, paths):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO incumbents (job_id, worker, obj, sol) VALUES (?, ?, ?, ?)",
+                         (job_id, worker, int(obj), json.dumps(paths)))
+
+    def best_incumbent(self, job_id):
+        '''
+        :return: (obj, paths) of the best incumbent pushed for the job, None if there is none
+        '''
+        with self.transaction() as conn:
+            row = conn.execute("SELECT obj, sol FROM incumbents WHERE job_id = ? ORDER BY obj LIMIT 1",
+                               (job_id,)).fetchone()
+        return None if row is None else (row["obj"], json.loads(row["sol"]))
+
+    def complete(self, job_id, worker, result):
+        '''
+        Store the result of a job, unless it was requeued and given to another worker.
+        :return: True if the result was stored
+        '''
+        with self.transaction() as conn:
+            updated = conn.execute("UPDATE jobs SET state = ?, result = ? WHERE id = ? AND worker = ? AND state = ?",
+                                   (DONE, json.dumps(result), job_id, worker, RUNNING)).rowcount
+            conn.execute("UPDATE workers SET job_id = NULL WHERE name = ?", (worker,))
+            return updated == 1
+
+    def fail(self, job_id, worker, error):
+        '''
+        Put a job that raised an error back in the queue, or mark it as failed
+        after MAX_ATTEMPTS attempts.
+        '''
+        with self.transaction() as conn:
+            conn.execute("UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, "
+                         "error = ? WHERE id = ? AND worker = ? AND state = ?",
+                         (MAX_ATTEMPTS, FAILED, PENDING, error, job_id, worker, RUNNING))
+            conn.execute("UPDATE workers SET job_id = NULL WHERE name = ?", (worker,))
+
+    def running_beats(self):
+        with self.transaction() as conn:
+            return {row["id"]: (row["worker"], row["beats"])
+                    for row in conn.execute("SELECT id, worker, beats FROM jobs WHERE state = ?", (RUNNING,))}
+
+    def requeue(self, job_id, worker, beats):
+        '''
+        Put a running job back in the queue if its heartbeat has not moved since it was last seen.
+        '''
+        with self.transaction() as conn:
+            state = conn.execute("SELECT CASE WHEN attempts >= ? THEN ? ELSE ? END FROM jobs WHERE id = ?",
+                                 (MAX_ATTEMPTS, FAILED, PENDING, job_id)).fetchone()[0]
+            updated = conn.execute("UPDATE jobs SET state = ?, worker = NULL, error = ? "
+                                   "WHERE id = ? AND worker = ? AND beats = ? AND state = ?",
+                                   (state, f"worker {worker} stopped sending heartbeats", job_id, worker, beats,
+                                    RUNNING)).rowcount
+            return updated == 1
+
+    def unsaved_results(self):
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT id, backend, instance, option, time_limit, result FROM jobs "
+                                "WHERE state = ? AND saved = 0", (DONE,)).fetchall()
+        return [(row["id"], (row["backend"], row["instance"], row["option"]), json.loads(row["result"]),
+                 row["time_limit"]) for row in rows]
+
+    def mark_saved(self, job_id):
+        with self.transaction() as conn:
+            conn.execute("UPDATE jobs SET saved = 1 WHERE id = ?", (job_id,))
+
+    def counts(self):
+        with self.transaction() as conn:
+            return {row["state"]: row["count"]
+                    for row in conn.execute("SELECT state, COUNT(*) AS count FROM jobs GROUP BY state")}
+
+    def workers(self):
+        with self.transaction() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM workers ORDER BY name")]
+
+
+class Transaction:
+    '''
+    Write transaction taken up front (BEGIN IMMEDIATE), so that two workers
+    cannot claim the same job; committed on success and rolled back on error.
+    '''
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+        return False
+
+
+class HeartbeatMonitor:
+    '''
+    Remembers, with the coordinator clock, since when the heartbeat counter of
+    every running job has not moved.
+    '''
+    def __init__(self, timeout=HEARTBEAT_TIMEOUT):
+        self.timeout = timeout
+        self.seen = {}
+
+    def stale(self, running_beats):
+        '''
+        :param running_beats: job id -> (worker, beats) of the running jobs
+        :return: list of (job id, worker, beats) of the jobs whose heartbeat stopped
+        '''
+        now = time.time()
+        stale = []
+        for job_id, (worker, beats) in running_beats.items():
+            previous = self.seen.get(job_id)
+            if previous is None or previous[:2] != (worker, beats):
+                self.seen[job_id] = (worker, beats, now)
+            elif now - previous[2] > self.timeout:
+                stale.append((job_id, worker, beats))
+        self.seen = {job_id: seen for job_id, seen in self.seen.items() if job_id in running_beats}
+        return stale
+
+
+def run_worker(path, name=None, backends=None, heartbeat_interval=HEARTBEAT_INTERVAL, poll=POLL_INTERVAL,
+               exit_when_idle=False):
+    '''
+    Pull jobs from the queue and solve them until stopped.
+    :param backends: backends served by the worker, all of them if None
+    :param exit_when_idle: stop once there is no pending or running job left
+    '''
+    from .runner import run_on_data, summary, result_paths
+
+    queue = JobQueue(path)
+    name = name or worker_name()
+    queue.register(name, backends or [])
+    current = {"job_id": None}
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(heartbeat_interval):
+            job_id = current["job_id"]
+            if not queue.heartbeat(name, job_id) and job_id is not None:
+                print(f"[{name}] job {job_id} was requeued, its result will be discarded")
+
+    heartbeat_thread = threading.Thread(target=beat, daemon=True)
+    heartbeat_thread.start()
+    print(f"[{name}] waiting for {', '.join(backends) if backends else 'any'} jobs on {path}")
+    try:
+        while True:
+            row = queue.claim(name, backends)
+            if row is None:
+                counts = queue.counts()
+                if exit_when_idle and not counts.get(PENDING) and not counts.get(RUNNING):
+                    break
+                time.sleep(poll)
+                continue
+
+            job_id = row["id"]
+            job = (row["backend"], row["instance"], row["option"])
+            current["job_id"] = job_id
+            warm_start = queue.best_incumbent(job_id)
+            print(f"[{name}] solving {job} with a time limit of {row['time_limit']:.1f}s"
+                  + (f", from incumbent {warm_start[0]}" if warm_start else ""))
+
+            def on_incumbent(obj, paths):
+                queue.add_incumbent(job_id, name, obj, paths)
+
+            try:
+                result = run_on_data(job[0], job[2], tuple(json.loads(row["data"])), row["time_limit"],
+                                     warm_start=warm_start, on_incumbent=on_incumbent,
+                                     gap=json.loads(row["gap"]))
+                solve_time, optimal, obj = summary(job, result)
+                if obj is not None:
+                    queue.add_incumbent(job_id, name, obj, result_paths(job, result))
+                if queue.complete(job_id, name, result):
+                    print(f"[{name}] {job} done: obj {obj}, optimal {optimal}")
+            except Exception as e:
+                print(f"[{name}] {job} failed: {e}")
+                queue.fail(job_id, name, str(e))
+            current["job_id"] = None
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+
+def run_local_worker(path, name, backends=None):
+    # own process group, shared with the processes started by the solvers, see stop_process_group
+    os.setpgid(0, 0)
+    run_worker(path, name, backends)
+
+
+def start_local_workers(path, count, backends=None):
+    '''
+    Start worker processes on this host, e.g. to try the distributed mode on one machine.
+    '''
+    workers = []
+    for index in range(count):
+        process = multiprocessing.Process(target=run_local_worker,
+                                          args=(path, f"{worker_name()}-local{index+1}", backends), daemon=False)
+        process.start()
+        workers.append(process)
+    return workers
+
+
+def run_coordinator(jobs, path, time_limit=None, gap=None, resume=False, local_workers=0,
+                    heartbeat_timeout=HEARTBEAT_TIMEOUT, poll=POLL_INTERVAL):
+    '''
+    Enqueue the jobs, requeue the ones of dead workers and save the results
+    as they arrive, until every job is done or has failed.
+    :param time_limit: time limit of every job, the default one of its backend if None
+    :param resume: keep the jobs of the previous batch in the queue, otherwise it starts empty
+    :param local_workers: number of workers started on this host
+    :return: dictionary job -> result
+    '''
+    from .runner import default_time_limit, save_job_result
+
+    queue = JobQueue(path)
+    if not resume:
+        queue.reset()
+    added = queue.enqueue(jobs, [time_limit or default_time_limit(job[0]) for job in jobs], gap)
+    print(f"Enqueued {added} jobs in {path}")
+
+    processes = start_local_workers(path, local_workers)
+    monitor = HeartbeatMonitor(heartbeat_timeout)
+    results = {}
+    try:
+        while True:
+            for job_id, worker, beats in monitor.stale(queue.running_beats()):
+                if queue.requeue(job_id, worker, beats):
+                    print(f"Job {job_id}: no heartbeat from {worker} for {heartbeat_timeout}s, requeued")
+            for job_id, job, result, limit in queue.unsaved_results():
+                save_job_result(job, result, limit)
+                queue.mark_saved(job_id)
+                results[job] = result
+            counts = queue.counts()
+            if not counts.get(PENDING) and not counts.get(RUNNING):
+                break
+            time.sleep(poll)
+    finally:
+        for process in processes:
+            stop_process_group(process)
+
+    counts = queue.counts()
+    print(f"Distributed batch finished: {counts.get(DONE, 0)} done, {counts.get(FAILED, 0)} failed")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Workers of the distributed mode, see also Main.py --queue.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    worker_parser = subparsers.add_parser('worker', help='pull and solve jobs from a queue')
+    worker_parser.add_argument('queue', help='SQLite file of the queue, on a volume shared with the coordinator')
+    worker_parser.add_argument('--backends', nargs='*', default=None, help='backends served, all by default')
+    worker_parser.add_argument('--name', default=None)
+    worker_parser.add_argument('--exit-when-idle', action='store_true',
+                               help='stop once there is no pending or running job left')
+    status_parser = subparsers.add_parser('status', help='show the jobs and workers of a queue')
+    status_parser.add_argument('queue')
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        run_worker(args.queue, args.name, args.backends, exit_when_idle=args.exit_when_idle)
+    else:
+        queue = JobQueue(args.queue)
+        print(f"Jobs: {queue.counts()}")
+        for worker in queue.workers():
+            print(f"{worker['name']}: backends {json.loads(worker['backends']) or 'all'}, "
+                  f"job {worker['job_id']}, {worker['beats']} heartbeats")
+
+
+if __name__ == '__main__':
+    main()
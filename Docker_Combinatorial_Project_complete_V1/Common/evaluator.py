@@ -0,0 +1,139 @@
+import argparse
+import json
+import numpy as np
+
+from .bounds import gap
+from .decoder import pad_routes
+from .delta import result_routes
+from .instances import read_dat
+
+'''
+Batch evaluation of candidate solutions, independent of any solver model.
+A batch of K candidates is a (K, m, L) array of 0-indexed items, every row
+being the route of one courier padded with -1 (padding may also appear
+between items, it is skipped). All the candidates are scored together:
+
+    distances      (K, m)  length of every route, legs from and to the depot included
+    loads          (K, m)  total size of the items of every route
+    within_capacity(K, m)  load <= capacity of the courier
+    visits         (K, n)  number of times every item is visited
+    covered        (K,)    every item visited exactly once
+    valid_items    (K,)    no point outside 0..n-1 apart from the padding
+    feasible       (K,)    covered, valid and within capacity for every courier
+    obj            (K,)    longest route
+'''
+
+
+def stack_routes(solutions, m, width=None):
+    '''
+    :param solutions: list of K solutions, each a list of the 0-indexed items of every courier
+    :return: (K, m, L) array padded with -1
+    '''
+    width = max([len(route) for routes in solutions for route in routes] + [width or 1])
+    batch = np.full((len(solutions), m, width), -1, dtype=int)
+    for c, routes in enumerate(solutions):
+        batch[c, :len(routes)] = pad_routes(routes, width)[:, :width]
+    return batch
+
+
+def evaluate(routes, data):
+    '''
+    Score a batch of candidate solutions in one vectorized pass.
+    :param routes: (K, m, L) 0-indexed items padded with -1, or (m, L) for a single candidate
+    :param data: istance data (m, n, l, s, D)
+    :return: dictionary of arrays, see the module description
+    '''
+    m, n, l, s, D = data
+    D = np.asarray(D)
+    s = np.asarray(s)
+    routes = np.asarray(routes, dtype=int)
+    if routes.ndim == 2:
+        routes = routes[None]
+    K, couriers, width = routes.shape
+    depot = n
+
+    # padding moved to the end of every route, keeping the order of the items
+    order = np.argsort(routes < 0, axis=2, kind="stable")
+    routes = np.take_along_axis(routes, order, axis=2)
+    valid_items = ((routes >= -1) & (routes < n)).all(axis=(1, 2))
+    is_item = (routes >= 0) & (routes < n)
+
+    points = np.where(is_item, routes, depot)
+    legs = np.concatenate([np.full((K, couriers, 1), depot), points, np.full((K, couriers, 1), depot)], axis=2)
+    # legs between two depot points only come from the padding
+    moving = (legs[:, :, :-1] != depot) | (legs[:, :, 1:] != depot)
+    distances = np.where(moving, D[legs[:, :, :-1], legs[:, :, 1:]], 0).sum(axis=2)
+    loads = np.where(is_item, s[np.where(is_item, routes, 0)], 0).sum(axis=2)
+
+    within_capacity = loads <= np.asarray(l)[None, :couriers]
+    offsets = np.arange(K)[:, None, None] * n
+    visits = np.bincount((routes + offsets)[is_item], minlength=K * n).reshape(K, n)
+    covered = (visits == 1).all(axis=1)
+
+    return {"distances": distances, "loads": loads, "within_capacity": within_capacity, "visits": visits,
+            "covered": covered, "valid_items": valid_items,
+            "feasible": covered & valid_items & within_capacity.all(axis=1) & (couriers <= m),
+            "obj": distances.max(axis=1) if couriers else np.zeros(K, dtype=int)}
+
+
+def has_markers(sol):
+    # MIP results mark broken routes with strings, e.g. 'Subtour', 'Incomplete'
+    return any(isinstance(point, str) for path in sol for point in path)
+
+
+def audit_result(backend, result, data):
+    '''
+    Check a result against the istance and return it with the objective of
+    its routes: an infeasible solution (items missing or visited twice,
+    capacity exceeded, broken routes) gets no objective and no routes.
+    :param result: result in the output format of the backend ({solver: result} for MZN)
+    '''
+    if not result:
+        return result
+    if backend == "MZN" and "sol" not in result:
+        return {solver: audit_result("MZN", solver_result, data) for solver, solver_result in result.items()}
+    sol = result.get("sol")
+    if not sol:
+        return result
+    evaluation = evaluate(pad_routes(result_routes(backend, sol, data)), data) if not has_markers(sol) else None
+    if evaluation is None or not evaluation["feasible"][0]:
+        print(f"Audit: the solution with objective {result.get('obj')} is not feasible, discarded")
+        audited = dict(result, obj="N/A", optimal=False, sol=[])
+        if "gap" in audited:
+            audited["gap"] = None
+        return audited
+    obj = int(evaluation["obj"][0])
+    if obj == result.get("obj"):
+        return result
+    print(f"Audit: objective {result.get('obj')} replaced by the length of the longest route, {obj}")
+    audited = dict(result, obj=obj)
+    if audited.get("bound") is not None:
+        audited["gap"] = round(gap(obj, audited["bound"]), 6)
+        audited["optimal"] = audited["optimal"] or obj <= audited["bound"]
+    return audited
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check stored results against their istance.')
+    parser.add_argument('instance', help='istance in the .dat format')
+    parser.add_argument('results', help='JSON result file')
+    parser.add_argument('--backend', default='MIP', help='backend that produced the results: MIP, SMT, MZN, CG, DP')
+    args = parser.parse_args()
+
+    data = read_dat(args.instance)
+    with open(args.results) as f:
+        stored = json.load(f)
+    entries = [(None, stored)] if "sol" in stored else list(stored.items())
+    for name, result in entries:
+        sol = result.get("sol") or []
+        if not sol or has_markers(sol):
+            print(f"{name or args.backend}: obj {result.get('obj')}, no complete solution")
+            continue
+        evaluation = evaluate(pad_routes(result_routes(args.backend, sol, data)), data)
+        print(f"{name or args.backend}: stored obj {result.get('obj')}, evaluated obj {int(evaluation['obj'][0])}, "
+              f"feasible {bool(evaluation['feasible'][0])}, distances {evaluation['distances'][0].tolist()}, "
+              f"loads {evaluation['loads'][0].tolist()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import time
+from functools import lru_cache
+import numpy as np
+
+from .bounds import add_certificate
+from .instances import load_instance
+from .presolve import presolve
+
+'''
+Exact bitmask dynamic programming solver for small istances, in pure NumPy.
+Subsets of items are bitmasks U over the n items.
+
+1. Held-Karp: g[U, j] is the shortest path leaving the depot, visiting
+   exactly the items of U and ending at j in U:
+       g[{j}, j] = D[depot, j]
+       g[U, j]   = min_{i in U - j} g[U - j, i] + D[i, j]
+   so that the shortest route serving U is
+       cost[U] = min_j g[U, j] + D[j, depot]
+   The DP is vectorized over all the subsets of the same size.
+
+2. Subset partition: best_k[U] is the smallest longest route needed to serve
+   the items of U with the couriers 0..k, courier k taking a subset S of U
+   that fits in its capacity (S may be empty):
+       best_k[U] = min_{S subset of U, load(S) <= l_k} max(best_(k-1)[U - S], cost[S])
+   All the (S, U - S) pairs are enumerated once per n (3^n of them) and
+   sorted by U, so that every courier is a single vectorized min reduction.
+
+best_(m-1)[all items] is the optimal objective, and the routes are rebuilt
+backwards from the stored tables. Time and memory grow as 3^n, hence the
+MAX_ITEMS limit.
+'''
+
+RESULTS_PATH = "/app/res/DP"
+
+# Largest number of items solved by the DP (3^13 subset pairs)
+MAX_ITEMS = 13
+
+
+@lru_cache(maxsize=None)
+def subset_pairs(n):
+    '''
+    :return: (S, T, starts) every pair of disjoint subsets S, T of the n items,
+             sorted by U = S | T, and the index of the first pair of every U
+    '''
+    codes = np.arange(3 ** n, dtype=np.int64)
+    S = np.zeros(3 ** n, dtype=np.int64)
+    T = np.zeros(3 ** n, dtype=np.int64)
+    for i in range(n):
+        digit = codes % 3
+        codes //= 3
+        S |= (digit == 1).astype(np.int64) << i
+        T |= (digit == 2).astype(np.int64) << i
+    order = np.argsort(S | T, kind="stable")
+    S, T = S[order], T[order]
+    starts = np.searchsorted(S | T, np.arange(2 ** n))
+    return S, T, starts
+
+
+def subset_bits(n):
+    '''
+    :return: (2^n, n) boolean membership of every item in every subset
+    '''
+    return (np.arange(2 ** n)[:, None] >> np.arange(n)[None, :]) & 1 == 1
+
+
+def held_karp(D, n):
+    '''
+    :return: g (2^n, n) shortest depot paths over each subset ending at each item,
+             cost (2^n,) shortest route serving each subset
+    '''
+    D = np.asarray(D, dtype=float)
+    depot = n
+    bits = subset_bits(n)
+    sizes = bits.sum(axis=1)
+
+    g = np.full((2 ** n, n), np.inf)
+    singles = 1 << np.arange(n)
+    g[singles, np.arange(n)] = D[depot, :n]
+    for size in range(2, n + 1):
+        masks = np.flatnonzero(sizes == size)
+        for j in range(n):
+            U = masks[bits[masks, j]]
+            previous = U ^ (1 << j)
+            g[U, j] = (g[previous, :] + D[:n, j][None, :]).min(axis=1)
+
+    cost = (g + D[:n, depot][None, :]).min(axis=1)
+    cost[0] = 0
+    return g, cost
+
+
+def partition(cost, loads, l, n):
+    '''
+    Min-max assignment of subsets to the couriers.
+    :return: tables (m, 2^n) of best_k for every courier k
+    '''
+    S, T, starts = subset_pairs(n)
+    previous = np.full(2 ** n, np.inf)
+    previous[0] = 0
+    tables = []
+    for capacity in l:
+        fitting = np.where(loads <= capacity, cost, np.inf)
+        previous = np.minimum.reduceat(np.maximum(previous[T], fitting[S]), starts)
+        tables.append(previous)
+    return np.array(tables)
+
+
+def courier_subsets(tables, cost, loads, l, n):
+    '''
+    :return: the subset of items served by every courier in an optimal solution
+    '''
+    everything = np.arange(2 ** n)
+    U = 2 ** n - 1
+    subsets = [0] * len(l)
+    for k in range(len(l) - 1, -1, -1):
+        candidates = everything[((everything & ~U) == 0) & (loads <= l[k])]
+        if k > 0:
+            rest = tables[k - 1][U ^ candidates]
+        else:
+            rest = np.where(candidates == U, 0, np.inf)
+        values = np.maximum(rest, cost[candidates])
+        S = int(candidates[np.argmin(values)])
+        subsets[k] = S
+        U ^= S
+    return subsets
+
+
+def subset_route(g, D, S, n):
+    '''
+    Follow the Held-Karp table backwards from the best last item of subset S.
+    :return: the route serving S, 0-indexed items
+    '''
+    D = np.asarray(D, dtype=float)
+    depot = n
+    route = []
+    if S == 0:
+        return route
+    last = int(np.argmin(g[S, :] + D[:n, depot]))
+    while True:
+        route.append(last)
+        previous = S ^ (1 << last)
+        if previous == 0:
+            break
+        last = int(np.argmin(g[previous, :] + D[:n, last]))
+        S = previous
+    return route[::-1]
+
+
+def solve_data(data, time_limit=300, warm_start=None, gap=None, stats=None):
+    '''
+    Solve istance data (m, n, l, s, D) to optimality by dynamic programming.
+    The solution is exact, so warm_start and gap are accepted for compatibility only.
+    :param stats: optional dictionary filled with the time taken to build the route and load tables
+    :return: the result dictionary {time, optimal, obj, sol}
+    '''
+    start_time = time.time()
+    m, n, l, s, D = data
+    if n > MAX_ITEMS:
+        raise ValueError(f"The DP solver is limited to {MAX_ITEMS} items, the istance has {n}")
+    D = np.asarray(D, dtype=int)
+
+    g, cost = held_karp(D, n)
+    loads = subset_bits(n).astype(int) @ np.asarray(s, dtype=int)
+    if stats is not None:
+        stats["build_time"] = time.time() - start_time
+    tables = partition(cost, loads, l, n)
+    obj = tables[-1][2 ** n - 1]
+
+    solve_time = time.time() - start_time
+    if not np.isfinite(obj):
+        print(f"DP: no assignment of the items fits the capacities ({solve_time:.3f}s)")
+        return {"time": round(solve_time, 2), "optimal": True, "obj": "N/A", "sol": []}
+
+    subsets = courier_subsets(tables, cost, loads, l, n)
+    routes = [subset_route(g, D, S, n) for S in subsets]
+    print(f"DP: optimal objective {int(obj)} in {solve_time:.3f}s")
+    result = {"time": round(solve_time, 2), "optimal": True, "obj": int(obj),
+              "sol": [[i + 1 for i in route] for route in routes]}
+    return add_certificate(result, (m, n, l, s, D), int(obj), "exact DP")
+
+
+def solve_instance(instance, time_limit=300, warm_start=None, gap=None):
+    reduction = presolve(load_instance(instance))
+    return reduction.postsolve("DP", solve_data(reduction.data, time_limit))
+
+
+def save_result(instance, result):
+    results_path = os.path.join(RESULTS_PATH, f"{instance}.json")
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    with open(results_path, 'w') as file:
+        json.dump({"bitmask_dp": result}, file, indent=3)
+
+
+def main(input_choice, time_limit=300):
+    if input_choice.upper() == 'ALL':
+        instance_numbers = range(1, 22)
+    elif ':' in input_choice:
+        start, end = map(int, input_choice.split(':'))
+        instance_numbers = range(start, end + 1)
+    else:
+        instance_numbers = [int(input_choice)]
+
+    for instance in instance_numbers:
+        data = load_instance(instance)
+        if data[1] > MAX_ITEMS:
+            print(f"\nIstance {instance} has {data[1]} items, more than the DP solver can handle: skipped")
+            continue
+        print(f"\nSolving istance {instance} by dynamic programming...")
+        save_result(instance, solve_instance(instance, time_limit))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve small MCP istances exactly by bitmask dynamic programming.')
+    parser.add_argument('instances', type=str, help='istance number, start:end or ALL (istances with up to '
+                                                    f'{MAX_ITEMS} items)')
+    parser.add_argument('--time-limit', type=float, default=300)
+    args = parser.parse_args()
+    main(args.instances, args.time_limit)
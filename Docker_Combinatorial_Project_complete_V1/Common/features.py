@@ -0,0 +1,59 @@
+import numpy as np
+
+# Order of the values returned by feature_vector
+FEATURE_NAMES = [
+    "m", "n", "items_per_courier",
+    "capacity_tightness", "max_item_over_min_capacity",
+    "dist_mean", "dist_cv", "depot_dist_ratio", "asymmetry", "triangle_violations",
+    "courier_classes", "largest_courier_class", "item_size_classes",
+]
+
+
+def shortest_paths(D):
+    '''
+    Floyd-Warshall closure of the distance matrix, one vectorized relaxation per pivot.
+    '''
+    closure = D.astype(float).copy()
+    for k in range(closure.shape[0]):
+        np.minimum(closure, closure[:, k:k+1] + closure[k:k+1, :], out=closure)
+    return closure
+
+
+def instance_features(m, n, l, s, D):
+    '''
+    Cheap features describing an istance, used to predict which backend
+    and model will perform best on it.
+    :return: dictionary feature name -> value
+    '''
+    D = np.asarray(D, dtype=float)
+    l = np.asarray(l)
+    s = np.asarray(s)
+    off_diagonal = ~np.eye(n+1, dtype=bool)
+    distances = D[off_diagonal]
+    dist_mean = distances.mean()
+
+    _, class_sizes = np.unique(l, return_counts=True)
+
+    features = {
+        "m": m,
+        "n": n,
+        "items_per_courier": n / m,
+        "capacity_tightness": s.sum() / l.sum(),
+        "max_item_over_min_capacity": s.max() / l.min(),
+        "dist_mean": dist_mean,
+        "dist_cv": distances.std() / dist_mean if dist_mean > 0 else 0.0,
+        # how far the depot is compared to the items among themselves
+        "depot_dist_ratio": (D[n, :n].mean() + D[:n, n].mean()) / (2 * dist_mean) if dist_mean > 0 else 0.0,
+        "asymmetry": np.abs(D - D.T)[off_diagonal].mean() / dist_mean if dist_mean > 0 else 0.0,
+        # fraction of arcs that can be shortened going through another point (non-metric istances)
+        "triangle_violations": (shortest_paths(D)[off_diagonal] < distances).mean(),
+        # couriers with the same capacity are interchangeable: symmetry classes
+        "courier_classes": len(class_sizes),
+        "largest_courier_class": class_sizes.max(),
+        "item_size_classes": len(np.unique(s)),
+    }
+    return {name: float(value) for name, value in features.items()}
+
+
+def feature_vector(features):
+    return np.array([features[name] for name in FEATURE_NAMES], dtype=float)
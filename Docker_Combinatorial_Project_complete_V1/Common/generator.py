@@ -0,0 +1,72 @@
+import argparse
+import numpy as np
+
+from .instances import write_instance
+
+SYNTHETIC_INSTANCES_PATH = "/app/instances/synthetic"
+
+
+def generate_instance(m, n, tightness=0.9, metric=True, layout="uniform", n_clusters=5,
+                      max_item_size=50, grid_size=1000, seed=0):
+    '''
+    Generate a random istance in the same shape as the shipped ones.
+    :param tightness: sum of the item sizes / sum of the courier capacities, in (0, 1]
+    :param metric: if True the distances are Manhattan distances between integer
+                   points, so the triangle inequality holds; if False every arc is
+                   perturbed independently, giving an asymmetric, non-metric matrix
+    :param layout: 'uniform' points in the square, or 'clustered' around n_clusters centres
+    :return: m, n, l, s, D with the depot as last point, like in the .dat files
+    '''
+    rng = np.random.default_rng(seed)
+
+    if layout == "uniform":
+        points = rng.integers(0, grid_size, size=(n, 2))
+    elif layout == "clustered":
+        centres = rng.integers(0, grid_size, size=(n_clusters, 2))
+        spread = grid_size / (4 * np.sqrt(n_clusters))
+        points = centres[rng.integers(0, n_clusters, size=n)] + rng.normal(0, spread, size=(n, 2))
+        points = np.clip(np.rint(points), 0, grid_size - 1).astype(int)
+    else:
+        raise ValueError(f"Unknown layout '{layout}', use 'uniform' or 'clustered'")
+    depot = np.array([[grid_size // 2, grid_size // 2]])
+    points = np.vstack([points, depot])
+
+    D = np.abs(points[:, None, :] - points[None, :, :]).sum(axis=2)
+    if not metric:
+        noise = rng.uniform(0.5, 1.5, size=D.shape)
+        D = np.rint(D * noise).astype(int)
+    np.fill_diagonal(D, 0)
+
+    s = rng.integers(1, max_item_size + 1, size=n)
+    # split the total capacity among the couriers, none smaller than the largest item
+    total_capacity = s.sum() / tightness
+    shares = rng.dirichlet(np.full(m, 5.0))
+    l = np.maximum(np.floor(shares * total_capacity).astype(int), s.max())
+
+    return m, n, l.tolist(), s.tolist(), D
+
+
+def instance_name(m, n, tightness, metric, layout, seed):
+    kind = "metric" if metric else "nonmetric"
+    return f"syn_m{m}_n{n}_t{int(round(tightness * 100))}_{kind}_{layout}_s{seed}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic MCP istance as .dat and .dzn.')
+    parser.add_argument('--m', type=int, required=True, help='number of couriers')
+    parser.add_argument('--n', type=int, required=True, help='number of items')
+    parser.add_argument('--tightness', type=float, default=0.9, help='sum of item sizes / sum of capacities')
+    parser.add_argument('--non-metric', action='store_true', help='perturb the distances so they are not a metric')
+    parser.add_argument('--layout', choices=['uniform', 'clustered'], default='uniform')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=SYNTHETIC_INSTANCES_PATH, help='output directory')
+    args = parser.parse_args()
+
+    data = generate_instance(args.m, args.n, args.tightness, not args.non_metric, args.layout, seed=args.seed)
+    name = instance_name(args.m, args.n, args.tightness, not args.non_metric, args.layout, args.seed)
+    for path in write_instance(args.out, name, data):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+
+DAT_INSTANCES_PATH = "/app/instances/dat_instances"
+DZN_INSTANCES_PATH = "/app/instances/dzn_instances"
+N_INSTANCES = 21
+
+
+def dat_path(instance_num):
+    return os.path.join(DAT_INSTANCES_PATH, f"inst{instance_num:02d}.dat")
+
+
+def dzn_path(instance_num):
+    return os.path.join(DZN_INSTANCES_PATH, f"Instance{instance_num}.dzn")
+
+
+def read_header(instance_num):
+    '''
+    Read only the first two lines of a .dat istance.
+    :return: m - number of couriers, n - number of items
+    '''
+    with open(dat_path(instance_num)) as f:
+        m = int(f.readline())
+        n = int(f.readline())
+    return m, n
+
+
+def read_dat(path):
+    '''
+    Read a .dat istance.
+    :return: m, n, l - courier capacities, s - item sizes, D - (n+1)x(n+1) distance matrix as numpy array
+    '''
+    with open(path) as f:
+        return parse_dat(f.read())
+
+
+def parse_dat(text):
+    '''
+    Same as read_dat, for the content of a .dat file.
+    '''
+    lines = [line.split() for line in text.splitlines() if line.strip()]
+    m = int(lines[0][0])
+    n = int(lines[1][0])
+    l = list(map(int, lines[2]))
+    s = list(map(int, lines[3]))
+    D = np.array(lines[4:4+n+1], dtype=int)
+    return m, n, l, s, D
+
+
+def load_instance(instance_num):
+    return read_dat(dat_path(instance_num))
+
+
+def dat_text(m, n, l, s, D):
+    '''
+    :return: the istance in the .dat format read by MIP and SMT
+    '''
+    lines = [str(m), str(n), " ".join(map(str, l)), " ".join(map(str, s))]
+    lines += ["".join(f"{int(d)} " for d in row) for row in D]
+    return "\n".join(lines) + "\n"
+
+
+def dzn_text(m, n, l, s, D):
+    '''
+    :return: the istance in the .dzn format read by the MiniZinc models
+    '''
+    rows = ["".join(f"{int(d)}, " for d in row) for row in D]
+    return (f"num_courier = {m};\n"
+            f"num_item = {n};\n"
+            f"courier_capacity = [{', '.join(map(str, l))}];\n"
+            f"item_size = [{', '.join(map(str, s))}];\n"
+            "distance_mat = [| " + "\n| ".join(rows) + "\n|];\n")
+
+
+def write_instance(directory, name, data):
+    '''
+    Write the istance both as <name>.dat and <name>.dzn in the given directory.
+    :return: the paths of the two files
+    '''
+    os.makedirs(directory, exist_ok=True)
+    dat_file = os.path.join(directory, f"{name}.dat")
+    dzn_file = os.path.join(directory, f"{name}.dzn")
+    with open(dat_file, 'w') as f:
+        f.write(dat_text(*data))
+    with open(dzn_file, 'w') as f:
+        f.write(dzn_text(*data))
+    return dat_file, dzn_file
@@ -0,0 +1,120 @@
+import json
+import os
+import time
+
+from .runner import run_job, run_cached, summary, result_paths
+
+'''
+Run journal of a batch, so that it can be resumed after the container or the
+interpreter dies. Every change of a job is appended to a JSON lines file and
+flushed to disk straight away:
+    {"job": [backend, instance, option], "state": "pending" | "running" | "done", ...}
+    {"job": [...], "incumbent": {"obj": ..., "sol": ...}}
+Replaying the file gives the state of every job and its best incumbent so far.
+'''
+
+JOURNAL_PATH = "/app/res/journal.jsonl"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+
+def job_key(job):
+    backend, instance, option = job
+    return (backend, int(instance), option)
+
+
+class RunJournal:
+    def __init__(self, path=JOURNAL_PATH, resume=False):
+        '''
+        :param resume: keep the jobs of the previous batch, otherwise the journal starts empty
+        '''
+        self.path = path
+        self.jobs = {}
+        if resume:
+            self.load()
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # last line cut short by a crash
+                self.apply(event)
+
+    def apply(self, event):
+        entry = self.jobs.setdefault(job_key(event["job"]), {"state": PENDING, "incumbent": None})
+        if "state" in event:
+            entry["state"] = event["state"]
+        if "summary" in event:
+            entry["summary"] = event["summary"]
+        incumbent = event.get("incumbent")
+        if incumbent is not None and incumbent["obj"] is not None:
+            if entry["incumbent"] is None or incumbent["obj"] < entry["incumbent"]["obj"]:
+                entry["incumbent"] = incumbent
+
+    def record(self, job, **fields):
+        event = {"job": list(job_key(job)), "time": time.time(), **fields}
+        self.apply(event)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(event) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add_jobs(self, jobs):
+        for job in jobs:
+            if job_key(job) not in self.jobs:
+                self.record(job, state=PENDING)
+
+    def state(self, job):
+        entry = self.jobs.get(job_key(job))
+        return PENDING if entry is None else entry["state"]
+
+    def is_done(self, job):
+        return self.state(job) == DONE
+
+    def warm_start(self, job):
+        '''
+        :return: (obj, paths) of the best incumbent of the job, None if there is none
+        '''
+        entry = self.jobs.get(job_key(job))
+        if entry is None or entry["incumbent"] is None:
+            return None
+        return entry["incumbent"]["obj"], entry["incumbent"]["sol"]
+
+    def mark_running(self, job, time_limit):
+        self.record(job, state=RUNNING, time_limit=time_limit)
+
+    def add_incumbent(self, job, obj, paths):
+        self.record(job, incumbent={"obj": obj, "sol": paths})
+
+    def mark_done(self, job, result):
+        solve_time, optimal, obj = summary(job, result)
+        incumbent = {"obj": obj, "sol": result_paths(job, result)} if obj is not None else None
+        self.record(job, state=DONE, summary=[solve_time, optimal, obj], incumbent=incumbent)
+
+
+def run_journaled(job, time_limit, journal, cache=None, gap=None):
+    '''
+    Run a job recording its progress in the journal. A job that was running
+    when a previous batch died is restarted from its last incumbent.
+    The caller saves the result and then marks the job as done.
+    '''
+    warm_start = journal.warm_start(job)
+    if journal.state(job) == RUNNING:
+        print(f"\n{job}: restarting interrupted job" + (f" from incumbent {warm_start[0]}" if warm_start else ""))
+    journal.mark_running(job, time_limit)
+
+    def on_incumbent(obj, paths):
+        journal.add_incumbent(job, obj, paths)
+
+    if cache is None:
+        return run_job(job, time_limit, warm_start, on_incumbent=on_incumbent, gap=gap)
+    return run_cached(job, time_limit, cache, warm_start=warm_start, on_incumbent=on_incumbent, gap=gap)
@@ -0,0 +1,254 @@
+import numpy as np
+
+from .delta import backend_paths, result_routes, route_length
+
+'''
+Presolve of an istance before any model is built, and postsolve of the
+results back to the original numbering. Every reduction is exact: the
+reduced istance has the same optimal objective, and every solution of it
+maps to a solution of the original istance with the same objective.
+
+- Couriers that must be empty are dropped: those too small for any item and,
+  with more couriers than items, all but the n largest ones (an unused large
+  courier can always take the route of a smaller one).
+- Duplicate items, at distance 0 from each other in both directions and with
+  the same distances to every other point, are merged into a super-item
+  when the distances satisfy the triangle inequality around them (removing
+  a duplicate from a route never makes it longer) and the capacities never
+  bind (all the items fit in the smallest courier), so that serving both
+  from the same courier is never worse.
+- Items that only fit in the couriers of the largest capacity class are
+  detected; when that class has a single courier, they are fixed to it.
+- The capacity of every courier is tightened to the largest load it can
+  actually reach, a subset sum of the sizes of the items it may carry,
+  taking the fixed items into account.
+
+The routes of the reduced istance are expanded by replacing every
+super-item by its items, in order, and by giving every kept courier its
+original index and an empty route to the dropped ones.
+'''
+
+
+def subset_sums(sizes, limit):
+    '''
+    :return: bitset (Python integer) of the sums of subsets of sizes up to limit
+    '''
+    reachable = 1
+    mask = (1 << (limit + 1)) - 1
+    for size in sizes:
+        reachable |= (reachable << int(size)) & mask
+    return reachable
+
+
+def is_duplicate(D, i, j):
+    '''
+    True if items i and j are at distance 0 and have the same distances to every other point.
+    '''
+    if D[i, j] != 0 or D[j, i] != 0:
+        return False
+    others = np.ones(D.shape[0], dtype=bool)
+    others[[i, j]] = False
+    return np.array_equal(D[i, others], D[j, others]) and np.array_equal(D[others, i], D[others, j])
+
+
+def removable(D, j):
+    '''
+    True if removing j from any route never makes it longer: D[p, j] + D[j, q] >= D[p, q].
+    '''
+    return bool((D[:, j][:, None] + D[j, :][None, :] >= D).all())
+
+
+class Reduction:
+    def __init__(self, data):
+        self.original = data
+        m, n, l, s, D = data
+        D = np.asarray(D)
+        l = [int(capacity) for capacity in l]
+        s = [int(size) for size in s]
+        self.log = []
+
+        if n and max(s) > max(l, default=0):
+            # infeasible: no reduction, the backend reports it on the original istance
+            self.log.append("some item fits no courier, istance left unchanged")
+            self.couriers = list(range(m))
+            self.members = [[i] for i in range(n)]
+            self.forced = {}
+            self.data = data
+            self.renumbered = False
+            return
+
+        # couriers too small for any item
+        couriers = [k for k in range(m) if l[k] >= min(s)] if n else list(range(m))
+
+        # duplicate items: merged in the first one, their representative
+        members = [[i] for i in range(n)]
+        if n and sum(s) <= min(l[k] for k in couriers):
+            representative = list(range(n))
+            for i, j in np.argwhere((D[:n, :n] == 0) & (D[:n, :n].T == 0)):
+                i, j = int(i), int(j)
+                if i < j and representative[i] == i and representative[j] == j \
+                        and is_duplicate(D, i, j) and removable(D, j):
+                    representative[j] = i
+                    members[i].append(j)
+            members = [members[i] for i in range(n) if representative[i] == i]
+            if len(members) < n:
+                self.log.append(f"merged {n - len(members)} duplicate items")
+        sizes = [sum(s[i] for i in items) for items in members]
+
+        # more couriers than items: only the largest ones can be needed
+        if len(couriers) > len(members):
+            couriers = sorted(sorted(couriers, key=lambda k: -l[k])[:len(members)])
+
+        # items fitting only the largest capacity class, fixed when it is a single courier
+        self.forced = {}
+        largest = max((l[k] for k in couriers), default=0)
+        smaller = max((l[k] for k in couriers if l[k] < largest), default=0)
+        top = [k for k in couriers if l[k] == largest]
+        only_top = [r for r, size in enumerate(sizes) if size > smaller]
+        if only_top and len(couriers) > 1:
+            self.log.append(f"{len(only_top)} items only fit couriers of capacity {largest}")
+        if len(top) == 1 and only_top and sum(sizes[r] for r in only_top) <= largest:
+            self.forced = {r: top[0] for r in only_top}
+            self.log.append(f"{len(only_top)} items fixed to courier {top[0] + 1}")
+
+        # largest reachable load of every courier
+        capacities = []
+        for k in couriers:
+            fixed = sum(sizes[r] for r, courier in self.forced.items() if courier == k)
+            free = [size for r, size in enumerate(sizes) if r not in self.forced]
+            reachable = subset_sums(free, l[k] - fixed)
+            capacities.append(fixed + reachable.bit_length() - 1)
+        if any(capacity < l[k] for capacity, k in zip(capacities, couriers)):
+            self.log.append("tightened capacities to the reachable loads")
+
+        kept = [k for k, capacity in zip(couriers, capacities) if capacity > 0 or not members]
+        capacities = [capacity for k, capacity in zip(couriers, capacities) if k in kept]
+        if len(kept) < m:
+            self.log.append(f"dropped {m - len(kept)} couriers that must be empty")
+
+        self.couriers = kept
+        self.members = members
+        points = [items[0] for items in members] + [n]
+        self.data = (len(kept), len(members), capacities, sizes, D[np.ix_(points, points)])
+        self.renumbered = len(kept) < m or len(members) < n
+
+    def original_routes(self, routes):
+        '''
+        :param routes: 0-indexed items of every courier of the reduced istance
+        :return: 0-indexed items of every courier of the original istance
+        '''
+        original = [[] for _ in range(self.original[0])]
+        for k, route in zip(self.couriers, routes):
+            original[k] = [i for r in route for i in self.members[r]]
+        return original
+
+    def reduced_routes(self, routes):
+        '''
+        :param routes: 0-indexed items of every courier of the original istance
+        :return: the routes of the reduced istance, None if they do not fit in it
+                 (dropped courier used, duplicates split or capacities exceeded)
+        '''
+        m, n, l, s, D = self.data
+        reduced_item = {items[0]: r for r, items in enumerate(self.members)}
+        member_of = {i: r for r, items in enumerate(self.members) for i in items}
+        if any(routes[k] for k in range(len(routes)) if k not in self.couriers):
+            return None
+        reduced = []
+        for k in self.couriers:
+            route = routes[k]
+            if any(any(i not in route for i in self.members[member_of[i]]) for i in route):
+                return None
+            reduced.append([reduced_item[i] for i in route if i in reduced_item])
+        if any(sum(s[r] for r in route) > capacity for route, capacity in zip(reduced, l)):
+            return None
+        return reduced
+
+    def map_path(self, backend, path):
+        m, n = self.original[0], self.original[1]
+        reduced_n = self.data[1]
+        mapped = []
+        for point in path:
+            if isinstance(point, str) or (backend == "MIP" and point == 0):
+                mapped.append(point)
+            elif backend == "MZN" and point == reduced_n + 1:
+                mapped.append(n + 1)
+            else:
+                mapped.extend(i + 1 for i in self.members[point - 1])
+        return mapped
+
+    def empty_path(self, backend):
+        if backend == "MIP":
+            return [0, 0]
+        if backend == "MZN":
+            return [self.original[1] + 1, self.original[1] + 1]
+        return []
+
+    def map_sol(self, backend, sol):
+        if not sol:
+            return sol
+        paths = [self.map_path(backend, path) for path in sol]
+        if backend == "SMT" or len(paths) != len(self.couriers):
+            # SMT only lists the couriers that are used
+            return paths
+        original = [self.empty_path(backend) for _ in range(self.original[0])]
+        for k, path in zip(self.couriers, paths):
+            original[k] = path
+        return original
+
+    def postsolve(self, backend, result):
+        '''
+        :param result: result of the reduced istance in the output format of the backend
+        :return: the same result with the original couriers and items
+        '''
+        if not self.renumbered or result is None:
+            return result
+        if backend == "MZN":
+            return {solver: dict(solver_result, sol=self.map_sol(backend, solver_result.get("sol")))
+                    for solver, solver_result in result.items()}
+        return dict(result, sol=self.map_sol(backend, result.get("sol")))
+
+    def reduce_warm_start(self, backend, warm_start):
+        '''
+        :param warm_start: (obj, paths) in the original numbering and the output format of the backend
+        :return: the warm start of the reduced istance, None if the solution does not fit in it
+        '''
+        if warm_start is None or not self.renumbered:
+            return warm_start
+        obj, paths = warm_start
+        if not paths or any(isinstance(point, str) for path in paths for point in path):
+            return None
+        routes = self.reduced_routes(result_routes(backend, paths, self.original))
+        if routes is None:
+            return None
+        D = self.data[4]
+        return min(obj, max(route_length(route, D) for route in routes)), backend_paths(backend, routes, self.data[1])
+
+    def incumbent_callback(self, backend, on_incumbent):
+        '''
+        :return: on_incumbent called with the paths of the original istance
+        '''
+        if on_incumbent is None or not self.renumbered:
+            return on_incumbent
+        return lambda obj, paths: on_incumbent(obj, self.map_sol(backend, paths))
+
+
+def presolve(data):
+    '''
+    :return: the Reduction of istance data (m, n, l, s, D), holding the reduced istance in .data
+    '''
+    reduction = Reduction(data)
+    if reduction.log:
+        print(f"Presolve: {', '.join(reduction.log)} "
+              f"({reduction.original[0]}x{reduction.original[1]} -> {reduction.data[0]}x{reduction.data[1]})")
+    return reduction
+
+
+def solve_reduced(backend, data, solve, warm_start=None, on_incumbent=None):
+    '''
+    Presolve the istance, solve the reduced one and map its result back.
+    :param solve: function(data, warm_start, on_incumbent) returning a result in the output format of the backend
+    '''
+    reduction = presolve(data)
+    result = solve(reduction.data, reduction.reduce_warm_start(backend, warm_start),
+                   reduction.incumbent_callback(backend, on_incumbent))
+    return reduction.postsolve(backend, result)
@@ -0,0 +1,222 @@
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+from abc import ABC, abstractmethod
+
+'''
+Registry of the solving backends.
+Each backend declares its name, the instance argument syntax it accepts on
+the command line and its capabilities; its module, and with it the solver
+libraries, is only imported the first time the backend is actually used.
+'''
+
+APP_PATH = "/app"
+
+# Capabilities a backend can declare
+WARM_START = "warm_start"        # uses a previous solution as starting point
+UPPER_BOUND = "upper_bound"      # uses a previous objective as upper bound
+INCUMBENTS = "incumbents"        # reports improving solutions while searching
+BUILD_STATS = "build_stats"      # reports the model build time
+
+BACKENDS = {}
+
+
+class Backend(ABC):
+    name = None
+    module = None
+    syntax = ""
+    capabilities = set()
+    default_time_limit = 300
+
+    def load(self):
+        return importlib.import_module(self.module)
+
+    @abstractmethod
+    def solve_instance(self, instance, option, time_limit, warm_start=None, gap=None):
+        '''
+        Solve a numbered istance and return the result in the backend JSON format.
+        gap - optional gap target {"rel": ..., "abs": ...}, see Common/bounds.py
+        '''
+
+    @abstractmethod
+    def solve_data(self, data, option, time_limit, warm_start=None, stats=None, on_incumbent=None, params=None,
+                   gap=None):
+        '''
+        Solve istance data (m, n, l, s, D) and return the result in the backend JSON format.
+        params - optional backend parameters: solver options (MIP), Z3 configuration (SMT),
+                 search annotation values (MZN), e.g. found by Common/tuner.py
+        '''
+
+    @abstractmethod
+    def save_result(self, instance, option, result):
+        '''Save the result in the results directory of the backend.'''
+
+    @abstractmethod
+    def model_files(self, option):
+        '''Files defining the model, used to invalidate cached results.'''
+
+
+def register(backend_class):
+    BACKENDS[backend_class.name] = backend_class()
+    return backend_class
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Options: {', '.join(BACKENDS)}")
+    return BACKENDS[name]
+
+
+@register
+class MIPBackend(Backend):
+    name = "MIP"
+    module = "MIP.main"
+    syntax = "start:end:solver or instance:solver, solver in cbc, highs, gurobi, ALL (e.g. 3:7:cbc)"
+    capabilities = {WARM_START, UPPER_BOUND, BUILD_STATS}
+
+    def solve_instance(self, instance, option, time_limit, warm_start=None, gap=None):
+        return self.load().solve_instance(instance, option, time_limit, warm_start=warm_start, gap=gap)
+
+    def solve_data(self, data, option, time_limit, warm_start=None, stats=None, on_incumbent=None, params=None,
+                   gap=None):
+        return self.load().solve_instance_data(data, option, time_limit, warm_start=warm_start, stats=stats,
+                                               options=params, gap=gap)
+
+    def save_result(self, instance, option, result):
+        self.load().update_json(instance, option, result)
+
+    def model_files(self, option):
+        return [os.path.join(APP_PATH, "MIP", "mip_problem.py")]
+
+
+@register
+class SMTBackend(Backend):
+    name = "SMT"
+    module = "SMT.SMT"
+    syntax = "instance, start:end or ALL, optionally followed by :race (e.g. 5:7:race)"
+    capabilities = {WARM_START, UPPER_BOUND, INCUMBENTS, BUILD_STATS}
+
+    def solve_instance(self, instance, option, time_limit, warm_start=None, gap=None):
+        return self.load().solve_instance(instance, time_limit, race=option == "race", warm_start=warm_start,
+                                          gap=gap)
+
+    def solve_data(self, data, option, time_limit, warm_start=None, stats=None, on_incumbent=None, params=None,
+                   gap=None):
+        smt = self.load()
+        m, n, l, s, D = data
+        D = [list(map(int, row)) for row in D]
+        if option == "race":
+            return smt.solve_mcp_race(m, n, l, s, D, None, None, timeout=time_limit, warm_start=warm_start,
+                                      stats=stats, on_incumbent=on_incumbent, gap=gap)
+        return smt.solve_mcp(m, n, l, s, D, None, None, timeout=time_limit, warm_start=warm_start, stats=stats,
+                             on_incumbent=on_incumbent, config=params, gap=gap)
+
+    def save_result(self, instance, option, result):
+        self.load().save_result(instance, result)
+
+    def model_files(self, option):
+        return [os.path.join(APP_PATH, "SMT", "SMT.py")]
+
+
+@register
+class MZNBackend(Backend):
+    name = "MZN"
+    module = "MZN.Main_MZN"
+    syntax = "instance:model_N or start:end:model_N (e.g. 3:5:model_2)"
+    capabilities = {UPPER_BOUND, BUILD_STATS}
+    models_path = os.path.join(APP_PATH, "MZN", "Solvers", "projectmodels")
+
+    @property
+    def default_time_limit(self):
+        return self.load().TIMELIMIT
+
+    def solve_instance(self, instance, option, time_limit, warm_start=None, gap=None):
+        return self.load().solve_instance(instance, option, time_limit, warm_start=warm_start, gap=gap)
+
+    def solve_data(self, data, option, time_limit, warm_start=None, stats=None, on_incumbent=None, params=None,
+                   gap=None):
+        from .instances import dzn_text
+        return self.load().solve_data(dzn_text(*data), option, time_limit, warm_start=warm_start,
+                                      search_params=params, gap=gap, data=data, stats=stats)
+
+    def save_result(self, instance, option, result):
+        self.load().save_result(instance, result)
+
+    def model_files(self, option):
+        model_name = next(name for name in sorted(os.listdir(self.models_path)) if name.startswith(f"{option}."))
+        return [os.path.join(self.models_path, model_name)]
+
+
+@register
+class CGBackend(Backend):
+    name = "CG"
+    module = "MIP.column_generation"
+    syntax = "instance, start:end or ALL (e.g. 11:21)"
+    capabilities = {WARM_START, BUILD_STATS}
+
+    def solve_instance(self, instance, option, time_limit, warm_start=None, gap=None):
+        return self.load().solve_instance(instance, time_limit, warm_start=warm_start, gap=gap)
+
+    def solve_data(self, data, option, time_limit, warm_start=None, stats=None, on_incumbent=None, params=None,
+                   gap=None):
+        return self.load().solve_data(data, time_limit, warm_start=warm_start, gap=gap, stats=stats)
+
+    def save_result(self, instance, option, result):
+        self.load().save_result(instance, result)
+
+    def model_files(self, option):
+        return [os.path.join(APP_PATH, "MIP", "column_generation.py")]
+
+
+@register
+class DPBackend(Backend):
+    name = "DP"
+    module = "Common.exact_dp"
+    syntax = "instance, start:end or ALL (e.g. 1:10), istances with up to 13 items"
+    capabilities = {BUILD_STATS}
+
+    def solve_instance(self, instance, option, time_limit, warm_start=None, gap=None):
+        return self.load().solve_instance(instance, time_limit)
+
+    def solve_data(self, data, option, time_limit, warm_start=None, stats=None, on_incumbent=None, params=None,
+                   gap=None):
+        return self.load().solve_data(data, time_limit, stats=stats)
+
+    def save_result(self, instance, option, result):
+        self.load().save_result(instance, result)
+
+    def model_files(self, option):
+        return [os.path.join(APP_PATH, "Common", "exact_dp.py")]
+
+
+def import_time(name):
+    '''
+    Cold import time of a backend module in seconds, measured in a fresh interpreter.
+    '''
+    code = f"import time; start = time.perf_counter(); import {get_backend(name).module}; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=APP_PATH)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the cold import time of the command line and the backends.')
+    parser.add_argument('--budget', type=float, default=1.0, help='maximum import time of Main.py in seconds')
+    args = parser.parse_args()
+
+    main_time = float(subprocess.run(
+        [sys.executable, "-c", "import time; start = time.perf_counter(); import Main; print(time.perf_counter() - start)"],
+        capture_output=True, text=True, check=True, cwd=APP_PATH).stdout.strip().splitlines()[-1])
+    print(f"Main.py: {main_time:.3f}s (budget {args.budget:.3f}s)")
+    for name in BACKENDS:
+        try:
+            print(f"{name}: {import_time(name):.3f}s")
+        except subprocess.CalledProcessError as e:
+            print(f"{name}: import failed\n{e.stderr}")
+    return 0 if main_time <= args.budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
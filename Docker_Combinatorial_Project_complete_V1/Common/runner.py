@@ -0,0 +1,133 @@
+from .evaluator import audit_result
+from .features import instance_features
+from .instances import load_instance
+from .presolve import solve_reduced
+from .registry import get_backend, INCUMBENTS
+from .selector import record_benchmark
+from .tuner import tuned_params
+
+'''
+A job is a tuple (backend, instance, option):
+    MIP - option is the solver name: cbc, highs, gurobi
+    SMT - option is None, or 'race' for the parallel configuration race
+    MZN - option is the two digit model number, e.g. '02'
+    CG  - option is None
+    DP  - option is None
+'''
+
+
+def default_time_limit(backend):
+    # time limit of each backend when it is run on its own
+    return get_backend(backend).default_time_limit
+
+
+def run_job(job, time_limit, warm_start=None, on_incumbent=None, gap=None):
+    '''
+    Run a single job with the given time limit.
+    :param warm_start: optional (obj, paths) of a previous result of the same job
+    :param on_incumbent: optional callback(obj, paths), see run_on_data
+    :param gap: optional gap target {"rel": ..., "abs": ...}: the job stops once its
+                incumbent is within it of a valid lower bound
+    :return: the result of the backend, in its own JSON output format, with its
+             objective checked against its routes (see Common/evaluator.py)
+    '''
+    backend, instance, option = job
+    data = load_instance(instance)
+    if (on_incumbent is not None and INCUMBENTS in get_backend(backend).capabilities) \
+            or tuned_params(backend, option, data) is not None:
+        return run_on_data(backend, option, data, time_limit, warm_start=warm_start, on_incumbent=on_incumbent,
+                           gap=gap)
+    result = get_backend(backend).solve_instance(instance, option, time_limit, warm_start=warm_start, gap=gap)
+    return audit_result(backend, result, data)
+
+
+def run_on_data(backend, option, data, time_limit, warm_start=None, stats=None, on_incumbent=None, params=None,
+                gap=None):
+    '''
+    Same as run_job, for istance data (m, n, l, s, D) that is not one of the
+    numbered istances, e.g. a generated one.
+    :param stats: optional dictionary filled with the model build time, when the backend reports it
+    :param on_incumbent: optional callback(obj, paths) called on every improving solution,
+                         when the backend reports them while searching
+    :param params: optional backend parameters, see Backend.solve_data; by default the
+                   ones tuned for the class of the istance, if any (Common/tuner.py)
+    The backend solves the presolved istance (Common/presolve.py), the result
+    and the incumbents are mapped back to the original one, and the result is
+    checked against the original istance (Common/evaluator.py).
+    '''
+    if params is None:
+        params = tuned_params(backend, option, data)
+        if params is not None:
+            print(f"Using the {backend} parameters tuned for this istance class: {params}")
+
+    def solve(reduced_data, reduced_warm_start, reduced_on_incumbent):
+        return get_backend(backend).solve_data(reduced_data, option, time_limit, warm_start=reduced_warm_start,
+                                               stats=stats, on_incumbent=reduced_on_incumbent, params=params, gap=gap)
+
+    return audit_result(backend, solve_reduced(backend, data, solve, warm_start, on_incumbent), data)
+
+
+def run_cached(job, time_limit, cache, warm_start=None, on_incumbent=None, gap=None):
+    '''
+    Run a job through the solve cache: a cached optimal result is returned
+    straight away, a cached non-optimal one is used as warm start and upper
+    bound of a new attempt. Results are cached per parameters and gap target.
+    :param warm_start: optional (obj, paths) known from elsewhere, used if better than the cached one
+    '''
+    data = load_instance(job[1])
+    options = {"params": tuned_params(job[0], job[2], data), "gap": gap}
+    entry = cache.lookup(job, data, options)
+    if entry is not None and entry["optimal"]:
+        print(f"\n{job}: proven optimal result found in cache (obj {entry['obj']})")
+        return entry["result"]
+
+    if entry is not None and entry["obj"] is not None and (warm_start is None or entry["obj"] <= warm_start[0]):
+        print(f"\n{job}: warm starting from cached result (obj {entry['obj']})")
+        warm_start = (entry["obj"], result_paths(job, entry["result"]))
+
+    result = run_job(job, time_limit, warm_start, on_incumbent, gap)
+    new_summary = summary(job, result)
+    if entry is None or is_better(new_summary, (None, entry["optimal"], entry["obj"])):
+        cache.store(job, result, new_summary, data, options)
+        return result
+    return entry["result"]
+
+
+def save_job_result(job, result, time_limit=None):
+    '''
+    Save the result in the results directory of its backend and append it to
+    the benchmark records used by the automatic selection.
+    '''
+    backend, instance, option = job
+    get_backend(backend).save_result(instance, option, result)
+    record_benchmark(job, time_limit, summary(job, result), instance_features(*load_instance(instance)))
+
+
+def result_paths(job, result):
+    if job[0] == "MZN":
+        result = next(iter(result.values()))
+    return result["sol"]
+
+
+def summary(job, result):
+    '''
+    :return: the (time, optimal, obj) of a result, whatever the backend
+    '''
+    if job[0] == "MZN":
+        result = next(iter(result.values()))
+    obj = result["obj"]
+    if not isinstance(obj, (int, float)):
+        obj = None
+    return float(result["time"]), bool(result["optimal"]), obj
+
+
+def is_better(new, old):
+    '''
+    :param new, old: (time, optimal, obj) summaries of two results of the same job
+    :return: True if the new result should replace the old one
+    '''
+    if new[1] != old[1]:
+        return new[1]
+    if new[2] is None:
+        return False
+    return old[2] is None or new[2] < old[2]
@@ -0,0 +1,111 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+from .bounds import relaxation_bound
+from .generator import generate_instance, instance_name, SYNTHETIC_INSTANCES_PATH
+from .instances import write_instance
+from .shared import SharedInstance, attach
+
+SCALING_RESULTS_PATH = "/app/res/scaling.jsonl"
+
+# (m, n) steps of the scaling ladder, from the size of the shipped istances
+# up to the production sizes
+SCALING_LADDER = [(3, 50), (10, 100), (20, 250), (30, 500), (50, 1000), (50, 2000)]
+DEFAULT_BACKENDS = [("MIP", "highs"), ("SMT", None), ("MZN", "10")]
+
+
+def scaling_worker(backend, option, handle, time_limit, queue):
+    from .runner import run_on_data, summary
+
+    stats = {}
+    start = time.time()
+    with attach(handle) as data:
+        result = run_on_data(backend, option, data, time_limit, stats=stats)
+    wall_time = time.time() - start
+    solve_time, optimal, obj = summary((backend, None, option), result)
+    # peak resident memory in kB, including external solver processes such as CBC
+    memory = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    queue.put({"build_time": stats.get("build_time"), "wall_time": wall_time,
+               "optimal": optimal, "obj": obj, "peak_memory_kb": memory})
+
+
+def measure(backend, option, handle, time_limit):
+    '''
+    Run one backend on one istance in a fresh process, so build time and peak
+    memory are measured in isolation and a crash does not stop the ladder.
+    :param handle: the istance published in shared memory, see Common/shared.py
+    '''
+    # a forked child starts with the peak memory (ru_maxrss) of the parent, pages
+    # inherited from it included: a spawned interpreter only counts its own
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=scaling_worker, args=(backend, option, handle, time_limit, queue))
+    process.start()
+    # building the model is not covered by the solver time limit, so allow some slack
+    process.join(timeout=2 * time_limit + 60)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return {"error": "killed after exceeding the time limit"}
+    if queue.empty():
+        return {"error": f"process exited with code {process.exitcode}"}
+    return queue.get()
+
+
+def run_ladder(ladder=SCALING_LADDER, backends=DEFAULT_BACKENDS, time_limit=300, tightness=0.9,
+               metric=True, layout="uniform", seed=0, results_path=SCALING_RESULTS_PATH):
+    '''
+    Generate one istance per ladder step, solve it with every backend and
+    append build time, peak memory and solution quality to results_path.
+    '''
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    for m, n in ladder:
+        data = generate_instance(m, n, tightness, metric, layout, seed=seed)
+        name = instance_name(m, n, tightness, metric, layout, seed)
+        write_instance(SYNTHETIC_INSTANCES_PATH, name, data)
+        bound = relaxation_bound(*data)
+
+        # published once and shared by the processes of all the backends
+        with SharedInstance(data) as shared:
+            for backend, option in backends:
+                print(f"\n{name}: running {backend} {option or ''}")
+                record = {"instance": name, "m": m, "n": n, "backend": backend, "option": option,
+                          "time_limit": time_limit, "lower_bound": bound}
+                record.update(measure(backend, option, shared.handle, time_limit))
+                if record.get("obj") is not None:
+                    record["obj_over_lower_bound"] = record["obj"] / bound
+                print(record)
+                with open(results_path, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+
+
+def parse_backend(text):
+    # 'MIP:highs', 'SMT', 'MZN:10'
+    backend, _, option = text.partition(':')
+    return backend, option or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the backends on a ladder of growing synthetic istances.')
+    parser.add_argument('--backends', nargs='+', default=None,
+                        help="backends to run, e.g. MIP:highs SMT MZN:10")
+    parser.add_argument('--max-n', type=int, default=None, help='stop the ladder at this number of items')
+    parser.add_argument('--time-limit', type=float, default=300)
+    parser.add_argument('--tightness', type=float, default=0.9)
+    parser.add_argument('--non-metric', action='store_true')
+    parser.add_argument('--layout', choices=['uniform', 'clustered'], default='uniform')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    backends = [parse_backend(text) for text in args.backends] if args.backends else DEFAULT_BACKENDS
+    ladder = [(m, n) for m, n in SCALING_LADDER if args.max_n is None or n <= args.max_n]
+    run_ladder(ladder, backends, args.time_limit, args.tightness, not args.non_metric, args.layout, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import json
+import os
+import numpy as np
+
+from .exact_dp import MAX_ITEMS as EXACT_DP_ITEMS
+from .features import instance_features, feature_vector
+from .instances import load_instance, N_INSTANCES
+
+BENCHMARKS_PATH = "/app/res/benchmarks.jsonl"
+RESULTS_PATH = "/app/res"
+
+# Used when no stored benchmark is available yet, best first.
+# The heuristic sequence models scale to the large istances, while the exact
+# formulations only pay off on the small ones.
+DEFAULT_PORTFOLIO_SMALL = [("MZN", "10"), ("MIP", "highs"), ("SMT", None), ("MZN", "07")]
+DEFAULT_PORTFOLIO_LARGE = [("MZN", "10"), ("MZN", "11"), ("MIP", "highs"), ("MZN", "12")]
+SMALL_INSTANCE_ITEMS = 20
+# Istances up to this size are solved to optimality by the exact DP backend in
+# well under a second, faster than starting any of the solvers
+EXACT_DP_PORTFOLIO = [("DP", None)]
+
+
+def record_benchmark(job, time_limit, summary, features, path=BENCHMARKS_PATH):
+    '''
+    Append the outcome of a job to the benchmark file used to train the selector.
+    :param summary: (time, optimal, obj) of the result
+    '''
+    backend, instance, option = job
+    solve_time, optimal, obj = summary
+    record = {"backend": backend, "instance": instance, "option": option, "time_limit": time_limit,
+              "time": solve_time, "optimal": optimal, "obj": obj, "features": features}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def load_benchmarks(path=BENCHMARKS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_stored_results(results_path=RESULTS_PATH):
+    '''
+    Turn the result files of the shipped istances into benchmark records.
+    MiniZinc files do not record which model produced them, so only MIP and
+    SMT results can be used.
+    '''
+    records = []
+    for instance in range(1, N_INSTANCES + 1):
+        files = [("MIP", os.path.join(results_path, "MIP", f"{instance}.json")),
+                 ("SMT", os.path.join(results_path, "SMT", f"{instance:02d}.json"))]
+        for backend, file_path in files:
+            if not os.path.exists(file_path):
+                continue
+            with open(file_path) as f:
+                stored = json.load(f)
+            entries = stored.items() if backend == "MIP" else [(None, stored)]
+            features = None
+            for option, result in entries:
+                obj = result.get("obj")
+                if features is None:
+                    features = instance_features(*load_instance(instance))
+                records.append({"backend": backend, "instance": instance, "option": option,
+                                "time": float(result.get("time") or 0), "optimal": bool(result.get("optimal")),
+                                "obj": obj if isinstance(obj, (int, float)) else None,
+                                "features": features})
+    return records
+
+
+def outcome_key(record):
+    # proven optimal first, then lower objective, then faster
+    obj = record["obj"] if record["obj"] is not None else float("inf")
+    return (not record["optimal"], obj, record["time"])
+
+
+class BackendSelector:
+    '''
+    k-nearest-neighbours selector trained on stored benchmark records.
+    Each training istance ranks the configurations that were run on it; a new
+    istance is scored by averaging those ranks over its nearest neighbours in
+    the (log-scaled, standardized) feature space.
+    '''
+    def __init__(self, records, k=3):
+        self.k = k
+        best = {}
+        for record in records:
+            key = (tuple(sorted(record["features"].items())), (record["backend"], record["option"]))
+            if key not in best or outcome_key(record) < outcome_key(best[key]):
+                best[key] = record
+
+        by_instance = {}
+        for (instance_key, config), record in best.items():
+            by_instance.setdefault(instance_key, []).append((config, record))
+
+        self.instances = []
+        for instance_key, entries in by_instance.items():
+            entries.sort(key=lambda entry: outcome_key(entry[1]))
+            n_configs = len(entries)
+            scores = {config: 1.0 - rank / (n_configs - 1) if n_configs > 1 else 1.0
+                      for rank, (config, record) in enumerate(entries)}
+            self.instances.append((feature_vector(dict(instance_key)), scores))
+
+        if self.instances:
+            X = np.log1p(np.array([vector for vector, _ in self.instances]))
+            self.mean = X.mean(axis=0)
+            self.std = X.std(axis=0)
+            self.std[self.std == 0] = 1.0
+            self.X = (X - self.mean) / self.std
+
+    def rank(self, features):
+        '''
+        :return: the known configurations (backend, option) from the most to the least promising
+        '''
+        if not self.instances:
+            return DEFAULT_PORTFOLIO_SMALL if features["n"] <= SMALL_INSTANCE_ITEMS else DEFAULT_PORTFOLIO_LARGE
+
+        x = (np.log1p(feature_vector(features)) - self.mean) / self.std
+        distances = np.linalg.norm(self.X - x, axis=1)
+        neighbours = np.argsort(distances)[:self.k]
+
+        totals = {}
+        for index in neighbours:
+            weight = 1.0 / (distances[index] + 1e-6)
+            for config, score in self.instances[index][1].items():
+                total, weights = totals.get(config, (0.0, 0.0))
+                totals[config] = (total + weight * score, weights + weight)
+        return sorted(totals, key=lambda config: -totals[config][0] / totals[config][1])
+
+    def select(self, features, portfolio_size=1):
+        return self.rank(features)[:portfolio_size]
+
+
+def train_selector(k=3):
+    return BackendSelector(load_benchmarks() + load_stored_results(), k=k)
+
+
+def auto_jobs(instances, portfolio_size=1, selector=None):
+    '''
+    :return: the (backend, instance, option) jobs picked for each istance,
+             the exact DP for the istances with at most EXACT_DP_ITEMS items
+    '''
+    if selector is None:
+        selector = train_selector()
+    jobs = []
+    for instance in instances:
+        features = instance_features(*load_instance(instance))
+        if features["n"] <= EXACT_DP_ITEMS:
+            portfolio = EXACT_DP_PORTFOLIO
+        else:
+            portfolio = selector.select(features, portfolio_size)
+        print(f"Istance {instance}: selected {portfolio}")
+        jobs.extend((backend, instance, option) for backend, option in portfolio)
+    return jobs
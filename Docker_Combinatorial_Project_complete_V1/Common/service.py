@@ -0,0 +1,325 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import signal
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .instances import parse_dat
+from .shared import SharedInstance, attach, share_tracker
+
+'''
+Long-running solver service.
+A pool of worker processes per backend is started once, with the solver
+libraries already imported, and jobs are dispatched to idle workers as soon
+as they are submitted over HTTP:
+
+    POST   /jobs              submit {"backend", "option", "time_limit", "instance": {m, n, l, s, D} or "dat": text}
+    GET    /jobs/<id>         state, incumbents found so far and final result
+    GET    /jobs/<id>/stream  one JSON line per incumbent, then the final state
+    DELETE /jobs/<id>         cancel a pending or running job
+    GET    /health            worker pools and number of jobs
+
+The istance of a job is published in shared memory when it is submitted and
+released when the job ends or is cancelled; workers only receive its handle.
+'''
+
+DEFAULT_POOL_SIZES = {"MIP": 1, "SMT": 2, "MZN": 1}
+DEFAULT_TIME_LIMIT = 300
+
+
+def worker_main(backend, task_queue, results_queue):
+    # own process group, shared with the processes started by the solvers (SMT race, CBC)
+    os.setpgid(0, 0)
+    # load the solver libraries of the backend once, before any job arrives
+    from .registry import get_backend
+    from .runner import run_on_data, summary
+    get_backend(backend).load()
+
+    results_queue.put(("ready", backend, None))
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        job_id, option, handle, time_limit = task
+
+        def on_incumbent(obj, paths):
+            results_queue.put(("incumbent", job_id, {"obj": obj, "sol": paths, "time": time.time()}))
+
+        try:
+            with attach(handle) as data:
+                result = run_on_data(backend, option, data, time_limit, on_incumbent=on_incumbent)
+            solve_time, optimal, obj = summary((backend, None, option), result)
+            results_queue.put(("done", job_id, {"result": result, "optimal": optimal, "obj": obj}))
+        except Exception as e:
+            results_queue.put(("failed", job_id, str(e)))
+
+
+def stop_process_group(process):
+    '''
+    Terminate a process together with the processes it started, see worker_main.
+    '''
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass  # the group is empty, or not created yet
+    process.terminate()
+    process.join()
+
+
+class Worker:
+    def __init__(self, backend, results_queue):
+        self.backend = backend
+        self.task_queue = multiprocessing.Queue()
+        # not a daemon: the SMT race starts processes of its own
+        self.process = multiprocessing.Process(target=worker_main, args=(backend, self.task_queue, results_queue))
+        self.process.start()
+        self.job_id = None
+
+
+class SolverService:
+    def __init__(self, pool_sizes=DEFAULT_POOL_SIZES):
+        self.results_queue = multiprocessing.Queue()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.jobs = {}
+        self.shared = {}
+        self.ids = itertools.count(1)
+        self.pending = {backend: deque() for backend in pool_sizes}
+        share_tracker()
+        self.workers = {backend: [Worker(backend, self.results_queue) for _ in range(size)]
+                        for backend, size in pool_sizes.items()}
+        self.running = True
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+
+    def submit(self, backend, option, data, time_limit=DEFAULT_TIME_LIMIT):
+        if backend not in self.workers:
+            raise ValueError(f"No worker pool for backend '{backend}'")
+        with self.lock:
+            job_id = str(next(self.ids))
+            self.jobs[job_id] = {"id": job_id, "backend": backend, "option": option, "time_limit": time_limit,
+                                 "state": "pending", "submitted": time.time(), "incumbents": [], "result": None}
+            self.shared[job_id] = SharedInstance(data)
+            self.pending[backend].append((job_id, option, self.shared[job_id].handle, time_limit))
+            self.dispatch(backend)
+        return job_id
+
+    def dispatch(self, backend):
+        # to be called holding the lock
+        for worker in self.workers[backend]:
+            if not self.pending[backend]:
+                return
+            if worker.job_id is None:
+                task = self.pending[backend].popleft()
+                worker.job_id = task[0]
+                self.jobs[task[0]]["state"] = "running"
+                self.jobs[task[0]]["started"] = time.time()
+                worker.task_queue.put(task)
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["state"] not in ("pending", "running"):
+                return False
+            backend = job["backend"]
+            if job["state"] == "pending":
+                self.pending[backend] = deque(task for task in self.pending[backend] if task[0] != job_id)
+            else:
+                # a running solver cannot be interrupted cleanly: replace its worker by a fresh one
+                workers = self.workers[backend]
+                index = next(i for i, worker in enumerate(workers) if worker.job_id == job_id)
+                stop_process_group(workers[index].process)
+                workers[index] = Worker(backend, self.results_queue)
+            self.shared.pop(job_id).release()
+            job["state"] = "cancelled"
+            job["finished"] = time.time()
+            self.dispatch(backend)
+            self.changed.notify_all()
+        return True
+
+    def replace_dead_workers(self):
+        '''
+        Replace the workers that exited (solver crash, out of memory, killed),
+        failing the job they were running. To be called holding the lock.
+        '''
+        for backend, workers in self.workers.items():
+            for index, worker in enumerate(workers):
+                if worker.process.is_alive():
+                    continue
+                job = self.jobs.get(worker.job_id)
+                if job is not None and job["state"] == "running":
+                    job["state"] = "failed"
+                    job["result"] = f"worker exited with code {worker.process.exitcode}"
+                    job["finished"] = time.time()
+                    self.shared.pop(worker.job_id).release()
+                # the processes the worker started may have outlived it
+                stop_process_group(worker.process)
+                workers[index] = Worker(backend, self.results_queue)
+                self.dispatch(backend)
+                self.changed.notify_all()
+
+    def collect(self):
+        last_check = time.time()
+        while self.running:
+            if time.time() - last_check >= 0.5:
+                with self.lock:
+                    if self.running:
+                        self.replace_dead_workers()
+                last_check = time.time()
+            try:
+                kind, job_id, payload = self.results_queue.get(timeout=0.5)
+            except queue_module.Empty:
+                continue
+            if kind == "ready":
+                continue
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None or job["state"] != "running":
+                    continue  # late message of a cancelled job
+                if kind == "incumbent":
+                    job["incumbents"].append(payload)
+                else:
+                    job["state"] = "done" if kind == "done" else "failed"
+                    job["result"] = payload
+                    job["finished"] = time.time()
+                    self.shared.pop(job_id).release()
+                    for worker in self.workers[job["backend"]]:
+                        if worker.job_id == job_id:
+                            worker.job_id = None
+                    self.dispatch(job["backend"])
+                self.changed.notify_all()
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else json.loads(json.dumps(job))
+
+    def wait_for_change(self, job_id, seen_incumbents, timeout=1.0):
+        '''
+        Block until the job has more than seen_incumbents incumbents or is finished.
+        '''
+        with self.lock:
+            self.changed.wait_for(lambda: len(self.jobs[job_id]["incumbents"]) > seen_incumbents
+                                  or self.jobs[job_id]["state"] not in ("pending", "running"), timeout=timeout)
+
+    def health(self):
+        with self.lock:
+            return {"workers": {backend: [worker.process.is_alive() for worker in workers]
+                                for backend, workers in self.workers.items()},
+                    "jobs": len(self.jobs),
+                    "pending": {backend: len(tasks) for backend, tasks in self.pending.items()}}
+
+    def shutdown(self):
+        with self.lock:
+            self.running = False
+        for workers in self.workers.values():
+            for worker in workers:
+                stop_process_group(worker.process)
+        for shared in self.shared.values():
+            shared.release()
+        self.shared.clear()
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if parts == ["health"]:
+                return self.send_json(200, service.health())
+            if len(parts) >= 2 and parts[0] == "jobs":
+                job = service.status(parts[1])
+                if job is None:
+                    return self.send_json(404, {"error": "unknown job"})
+                if len(parts) == 3 and parts[2] == "stream":
+                    return self.stream(parts[1])
+                return self.send_json(200, job)
+            self.send_json(404, {"error": "not found"})
+
+        def stream(self, job_id):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            seen = 0
+            while True:
+                service.wait_for_change(job_id, seen)
+                job = service.status(job_id)
+                for incumbent in job["incumbents"][seen:]:
+                    self.wfile.write((json.dumps({"incumbent": incumbent}) + "\n").encode())
+                seen = len(job["incumbents"])
+                self.wfile.flush()
+                if job["state"] not in ("pending", "running"):
+                    self.wfile.write((json.dumps({"state": job["state"], "result": job["result"]}) + "\n").encode())
+                    return
+
+        def do_POST(self):
+            if self.path.strip("/") != "jobs":
+                return self.send_json(404, {"error": "not found"})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if "dat" in request:
+                    data = parse_dat(request["dat"])
+                else:
+                    instance = request["instance"]
+                    data = (instance["m"], instance["n"], instance["l"], instance["s"], instance["D"])
+                job_id = service.submit(request["backend"], request.get("option"), data,
+                                        request.get("time_limit", DEFAULT_TIME_LIMIT))
+            except (ValueError, KeyError, TypeError) as e:
+                return self.send_json(400, {"error": str(e)})
+            self.send_json(202, {"id": job_id})
+
+        def do_DELETE(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "jobs":
+                if service.cancel(parts[1]):
+                    return self.send_json(200, {"id": parts[1], "state": "cancelled"})
+                return self.send_json(409, {"error": "job is unknown or already finished"})
+            self.send_json(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def parse_pool_sizes(items):
+    # ['SMT=2', 'MIP=1'] -> {'SMT': 2, 'MIP': 1}
+    return {backend: int(size) for backend, size in (item.split('=') for item in items)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the MCP solvers as a long-running HTTP service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', nargs='+', default=None,
+                        help='worker processes per backend, e.g. SMT=2 MIP=1 MZN=1')
+    args = parser.parse_args()
+
+    pool_sizes = parse_pool_sizes(args.workers) if args.workers else DEFAULT_POOL_SIZES
+    service = SolverService(pool_sizes)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Solver service listening on http://{args.host}:{args.port} with workers {pool_sizes}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+'''
+Istance data shared between processes.
+The distance matrix is the only large part of an istance, (n+1)^2 integers:
+instead of pickling it into every child process, the parent publishes it once
+in a shared memory segment and passes the children a small picklable handle,
+from which they attach a read-only NumPy view of the matrix, without copying:
+
+    with SharedInstance(data) as shared:
+        process = multiprocessing.Process(target=worker, args=(shared.handle,))
+        ...
+
+    def worker(handle):
+        with attach(handle) as (m, n, l, s, D):
+            ...
+
+The publisher owns the segment and unlinks it when leaving the with block or
+on release(), after its children are done with it. If the publisher dies
+first, the multiprocessing resource tracker unlinks the segment when the
+process exits, so segments are never left behind in /dev/shm.
+Children only close their own mapping.
+'''
+
+
+def share_tracker():
+    '''
+    To be called before forking long-lived workers that attach to istances
+    published later: a process forked before the resource tracker is running
+    starts its own one, which unlinks the segments the process attached to
+    as soon as it exits, even if the publisher still uses them.
+    '''
+    resource_tracker.ensure_running()
+
+
+class SharedInstance:
+    def __init__(self, data):
+        m, n, l, s, D = data
+        D = np.ascontiguousarray(D, dtype=np.int64)
+        # a segment cannot be empty
+        self.segment = shared_memory.SharedMemory(create=True, size=max(D.nbytes, 1))
+        np.ndarray(D.shape, dtype=D.dtype, buffer=self.segment.buf)[...] = D
+        self.handle = (int(m), int(n), [int(x) for x in l], [int(x) for x in s],
+                       self.segment.name, D.shape, D.dtype.str)
+
+    def release(self):
+        if self.segment is not None:
+            self.segment.close()
+            try:
+                self.segment.unlink()
+            except FileNotFoundError:
+                pass
+            self.segment = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextmanager
+def attach(handle):
+    '''
+    :param handle: the handle of a SharedInstance
+    :return: the istance data (m, n, l, s, D), D being a read-only view of the shared segment
+    '''
+    m, n, l, s, name, shape, dtype = handle
+    segment = shared_memory.SharedMemory(name=name)
+    D = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+    D.flags.writeable = False
+    try:
+        yield m, n, l, s, D
+    finally:
+        del D
+        try:
+            segment.close()
+        except BufferError:
+            # the caller still holds views of the matrix: the mapping is closed with them
+            pass
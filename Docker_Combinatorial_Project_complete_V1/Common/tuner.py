@@ -0,0 +1,300 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+from contextlib import ExitStack
+from statistics import NormalDist
+
+from .instances import load_instance
+from .shared import SharedInstance, attach
+from .selector import SMALL_INSTANCE_ITEMS
+
+'''
+Automatic parameter tuner, in the style of iterated F-race (irace).
+Candidate configurations of one target (backend, option) are raced over the
+training istances of an istance class: every alive candidate is run on the
+next istance in parallel, and after a few istances the Friedman test is used
+to discard the candidates that are significantly worse than the best one.
+The elites of a race are mutated into the candidates of the next one.
+
+The configurations are the params given to Backend.solve_data:
+    MIP - solver options, e.g. {"cuts": "root", "heuristics": "on"} for cbc
+    SMT - a Z3 configuration like the RACE_CONFIGS entries of SMT/SMT.py
+    MZN - values of the search annotation parameters, given as data
+'''
+
+TUNED_CONFIGS_PATH = "/app/res/tuned_configs.json"
+
+# Values tried for each parameter, the first one being the default of the solver;
+# for MZN the default is the value in the model file, see parameter_space
+PARAMETER_SPACE = {
+    ("MIP", "cbc"): {
+        "cuts": ["on", "off", "root", "ifmove"],
+        "heuristics": ["on", "off"],
+        "preprocess": ["sos", "on", "off", "equal"],
+        "strategy": [1, 0, 2],
+        "feasibilityPump": ["on", "off"],
+    },
+    ("MIP", "highs"): {
+        "presolve": ["choose", "on", "off"],
+        "mip_heuristic_effort": [0.05, 0.01, 0.1, 0.3],
+        "mip_detect_symmetry": [True, False],
+        "random_seed": [0, 1, 2, 3],
+    },
+    ("SMT", None): {
+        "optsmt_engine": ["basic", "symba"],
+        "smt.arith.solver": [6, 2],
+        "smt.phase_selection": [3, 0, 5],
+        "smt.random_seed": [0, 1, 2, 3],
+        "tactics": [(), ("simplify",), ("simplify", "propagate-values")],
+    },
+    "MZN": {
+        "relax_rate": [30, 50, 70, 80, 90],
+        "restart_scale": [50, 100, 200, 500, 1000],
+    },
+}
+
+
+def parameter_space(backend, option):
+    if backend == "MZN":
+        from MZN.Main_MZN import MiniZinc_Mangager
+        manager = MiniZinc_Mangager()
+        with open(os.path.join(manager.model_parent_directory, manager.get_model_path(option))) as f:
+            return model_parameter_space(f.read())
+    return PARAMETER_SPACE[(backend, option)]
+
+
+def model_parameter_space(model_text):
+    '''
+    Space of the search parameters of a MiniZinc model, the hand-tuned value in
+    the model file (a number or an expression like num_item) coming first.
+    '''
+    from MZN.Main_MZN import search_parameters
+    space = {}
+    for name, value in search_parameters(model_text).items():
+        default = int(value) if value.isdigit() else value
+        space[name] = [default] + [other for other in PARAMETER_SPACE["MZN"][name] if other != default]
+    return space
+
+
+def backend_params(backend, config):
+    '''
+    Turn a flat configuration {name: value} into the params of the backend.
+    '''
+    if backend != "SMT":
+        return dict(config)
+    # Z3 parameters with a module prefix are global, the others belong to Optimize
+    return {"global": {name: value for name, value in config.items() if "." in name},
+            "opt": {name: value for name, value in config.items() if "." not in name and name != "tactics"},
+            "tactics": list(config.get("tactics", ()))}
+
+
+def instance_class(data):
+    m, n, l, s, D = data
+    return "small" if n <= SMALL_INSTANCE_ITEMS else "large"
+
+
+def default_config(space):
+    return {name: values[0] for name, values in space.items()}
+
+
+def sample_config(space, rng):
+    return {name: rng.choice(values) for name, values in space.items()}
+
+
+def mutate_config(config, space, rng, rate=0.3):
+    # resample each parameter of an elite with probability rate
+    return {name: rng.choice(values) if rng.random() < rate else config[name] for name, values in space.items()}
+
+
+def tune_worker(task):
+    from .runner import run_on_data, summary
+    backend, option, params, handle, time_limit = task
+    try:
+        with attach(handle) as data:
+            result = run_on_data(backend, option, data, time_limit, params=params)
+        return summary((backend, None, option), result)
+    except Exception as e:
+        # a configuration that fails costs as much as one finding no solution
+        print(f"  configuration {params} failed: {e}")
+        return time_limit, False, None
+
+
+def cost(run_summary):
+    # lower is better: objective first, solve time to break ties
+    solve_time, optimal, obj = run_summary
+    return (float('inf') if obj is None else obj, solve_time)
+
+
+def block_ranks(costs):
+    '''
+    Ranks (1 = best) of the candidates on one istance, ties sharing their average rank.
+    '''
+    order = sorted(range(len(costs)), key=lambda i: costs[i])
+    ranks = [0.0] * len(costs)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and costs[order[end + 1]] == costs[order[start]]:
+            end += 1
+        for position in range(start, end + 1):
+            ranks[order[position]] = (start + end) / 2 + 1
+        start = end + 1
+    return ranks
+
+
+def chi2_quantile(p, df):
+    # Wilson-Hilferty approximation, accurate enough for the test thresholds
+    z = NormalDist().inv_cdf(p)
+    return df * (1 - 2 / (9 * df) + z * (2 / (9 * df)) ** 0.5) ** 3
+
+
+def friedman_survivors(ranks, alpha=0.05):
+    '''
+    Friedman test over the rank blocks of the alive candidates, followed by the
+    pairwise comparison with the best candidate used by F-race.
+    :param ranks: one list of candidate ranks per istance
+    :return: indices of the candidates that are not significantly worse than the best one
+    '''
+    b, k = len(ranks), len(ranks[0])
+    rank_sums = [sum(block[j] for block in ranks) for j in range(k)]
+    a = sum(r * r for block in ranks for r in block)
+    c = b * k * (k + 1) ** 2 / 4
+    if a == c:
+        return list(range(k))  # all the candidates tied on every istance
+    statistic = (k - 1) * sum((r - b * (k + 1) / 2) ** 2 for r in rank_sums) / (a - c)
+    if statistic <= chi2_quantile(1 - alpha, k - 1):
+        return list(range(k))
+
+    # for (b-1)(k-1) degrees of freedom the t quantile is close to the normal one
+    t = NormalDist().inv_cdf(1 - alpha / 2)
+    threshold = t * (2 * b * (a - sum(r * r for r in rank_sums) / b) / ((b - 1) * (k - 1))) ** 0.5
+    best = min(rank_sums)
+    return [j for j in range(k) if rank_sums[j] - best <= threshold]
+
+
+def race(backend, option, candidates, instances, time_limit, pool, first_test=3, alpha=0.05):
+    '''
+    Race the candidate configurations over the istances.
+    :param instances: list of handles of the istances published in shared memory
+    :return: the surviving candidates, best first, with their mean rank
+    '''
+    alive = list(range(len(candidates)))
+    costs = {i: [] for i in alive}
+    for step, handle in enumerate(instances):
+        tasks = [(backend, option, backend_params(backend, candidates[i]), handle, time_limit) for i in alive]
+        for i, run_summary in zip(alive, pool.map(tune_worker, tasks)):
+            costs[i].append(cost(run_summary))
+        print(f"  istance {step+1}/{len(instances)}: {len(alive)} candidates, costs {[costs[i][-1] for i in alive]}")
+
+        if step + 1 >= first_test and len(alive) > 1:
+            # the candidates still alive are ranked among themselves on every istance seen so far
+            blocks = [block_ranks([costs[i][block] for i in alive]) for block in range(step + 1)]
+            alive = [alive[j] for j in friedman_survivors(blocks, alpha)]
+        if len(alive) == 1:
+            break
+
+    blocks = [block_ranks([costs[i][block] for i in alive]) for block in range(len(costs[alive[0]]))]
+    mean_rank = {i: sum(block[j] for block in blocks) / len(blocks) for j, i in enumerate(alive)}
+    return [(candidates[i], mean_rank[i]) for i in sorted(alive, key=mean_rank.get)]
+
+
+def tune(backend, option, instances, time_limit=60, iterations=3, n_candidates=8, n_elites=2, workers=None,
+         seed=0):
+    '''
+    Iterated racing: the first race starts from the default configuration and
+    random ones, the following ones from the elites and their mutations.
+    :param instances: list of istance data of the same class
+    :return: the best configuration found and its mean rank in the last race
+    '''
+    rng = random.Random(seed)
+    space = parameter_space(backend, option)
+    candidates = [default_config(space)]
+    for attempt in range(100 * n_candidates):
+        if len(candidates) >= n_candidates:
+            break
+        new = sample_config(space, rng)
+        if new not in candidates:
+            candidates.append(new)
+    elites = []
+    # every training istance is published once in shared memory for all the runs
+    with ExitStack() as stack:
+        handles = [stack.enter_context(SharedInstance(data)).handle for data in instances]
+        # one process per run, so that global solver parameters do not leak between configurations
+        with multiprocessing.Pool(workers, maxtasksperchild=1) as pool:
+            for iteration in range(iterations):
+                print(f"\nRace {iteration+1}/{iterations} of {backend} {option or ''}: {len(candidates)} candidates")
+                training = list(handles)
+                rng.shuffle(training)
+                elites = race(backend, option, candidates, training, time_limit, pool)[:n_elites]
+                candidates = [config for config, mean_rank in elites]
+                for attempt in range(100 * n_candidates):
+                    if len(candidates) >= n_candidates:
+                        break
+                    new = mutate_config(rng.choice(elites)[0], space, rng)
+                    if new not in candidates:
+                        candidates.append(new)
+    return elites[0]
+
+
+def tune_classes(backend, option, instance_numbers, time_limit=60, path=TUNED_CONFIGS_PATH, **race_options):
+    '''
+    Tune one target separately on every istance class of the training set and
+    store the best configuration of each class in path.
+    '''
+    classes = {}
+    for instance in instance_numbers:
+        data = load_instance(instance)
+        classes.setdefault(instance_class(data), []).append((instance, data))
+
+    tuned = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            tuned = json.load(f)
+    target = f"{backend}:{option}" if option else backend
+    for class_name, members in classes.items():
+        config, mean_rank = tune(backend, option, [data for instance, data in members], time_limit, **race_options)
+        print(f"\nBest {target} configuration for {class_name} istances: {config}")
+        tuned.setdefault(target, {})[class_name] = {"params": backend_params(backend, config), "config": config,
+                                                     "mean_rank": mean_rank,
+                                                     "instances": [instance for instance, data in members]}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(tuned, f, indent=3)
+    return tuned
+
+
+def tuned_params(backend, option, data, path=TUNED_CONFIGS_PATH):
+    '''
+    :return: the tuned params of the target for the class of the istance, None if not tuned
+    '''
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        tuned = json.load(f)
+    target = f"{backend}:{option}" if option else backend
+    entry = tuned.get(target, {}).get(instance_class(data))
+    return None if entry is None else entry["params"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the solver parameters of a backend by iterated racing.')
+    parser.add_argument('target', help="backend and option, e.g. MIP:cbc, MIP:highs, SMT, MZN:10")
+    parser.add_argument('instances', help="training istances, e.g. 1:10")
+    parser.add_argument('--time-limit', type=float, default=60, help='time limit of every run')
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--candidates', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    backend, _, option = args.target.partition(':')
+    start, _, end = args.instances.partition(':')
+    instance_numbers = range(int(start), int(end or start) + 1)
+    tune_classes(backend, option or None, instance_numbers, args.time_limit, iterations=args.iterations,
+                 n_candidates=args.candidates, workers=args.workers, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
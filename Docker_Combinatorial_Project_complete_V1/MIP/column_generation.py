@@ -0,0 +1,532 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import highspy
+
+from Common.bounds import add_certificate, gap_reached, relaxation_bound
+from Common.delta import repair, two_opt, route_length, cheapest_insertion
+from Common.instances import load_instance
+from Common.presolve import solve_reduced
+
+'''
+Set-partitioning backend solved by column generation.
+Columns are courier routes with their distance d_r and load w_r. Couriers
+only differ by their capacity, so a set of routes can be given to the
+couriers as long as, for every distinct capacity c_j (c_1 < ... < c_p),
+the routes heavier than c_{j-1} are no more than the N_j couriers of
+capacity at least c_j.
+
+The lower bound is found by bisection on a target T: T is proven too small
+when the LP of the set-partitioning problem over the routes no longer than T
+has no solution. That LP is solved by column generation, in phase 1 form
+(an artificial variable y_i per item, minimizing their sum):
+
+    min sum_i y_i
+    sum_r a_ir x_r + y_i = 1                 every item i          (duals pi_i)
+    sum_{r: w_r > c_(j-1)} x_r <= N_j        every capacity c_j    (duals mu_j)
+
+Pricing looks for the routes of largest prize sum_i pi_i a_ir, penalized by
+the capacity duals, with a DP over (load, last item) on q-routes (routes
+allowed to visit an item more than once) where the limit d_r <= T is
+relaxed with a Lagrangian multiplier. The DP gives an upper bound P on the
+prize of any route, so LP - m * max(0, P) is a lower bound of the phase 1
+problem, and T is infeasible as soon as it is positive.
+
+The routes found on the way are turned into elementary ones (first visit of
+every item, then 2-opt) and collected, and the min-max problem over all of
+them is finally solved as an integer program with HiGHS. Routes are kept in
+a pool per distance matrix, in memory and in a file of ROUTE_POOLS_PATH (or
+of the given pool directory), so that they are reused by the following
+targets and by the runs on istances with the same distance matrix.
+'''
+
+RESULTS_PATH = "/app/res/CG"
+ROUTE_POOLS_PATH = "/app/res/route_pools"
+MAX_POOL_ROUTES = 5000          # routes kept in a pool file
+ROUTES_PER_PRICING = 10         # q-routes kept by each DP run
+MULTIPLIER_STEPS = 6            # DP runs of the Lagrangian multiplier search
+MAX_ITERATIONS = 60             # column generation iterations of a target
+BOUND_SHARE = 0.7               # share of the time limit spent on the lower bound
+EPSILON = 1e-6
+
+ROUTE_POOLS = {}
+
+
+def matrix_hash(D):
+    return hashlib.sha256(np.ascontiguousarray(D, dtype=np.int64).tobytes()).hexdigest()
+
+
+def load_pool(D, path=ROUTE_POOLS_PATH):
+    '''
+    :param path: directory of the pool files
+    :return: the set of elementary routes (tuples of 0-indexed items) known for the distance matrix
+    '''
+    pool_path = os.path.join(path, f"{matrix_hash(D)}.json")
+    if pool_path not in ROUTE_POOLS:
+        ROUTE_POOLS[pool_path] = set()
+        if os.path.exists(pool_path):
+            with open(pool_path) as f:
+                ROUTE_POOLS[pool_path] = {tuple(route) for route in json.load(f)}
+    return ROUTE_POOLS[pool_path]
+
+
+def save_pool(D, routes, distances, path=ROUTE_POOLS_PATH):
+    '''
+    Keep the shortest routes in the pool of the distance matrix and in its
+    file, which is only written when the pool has changed.
+    '''
+    pool_path = os.path.join(path, f"{matrix_hash(D)}.json")
+    kept = sorted(routes, key=lambda route: (distances[route], route))[:MAX_POOL_ROUTES]
+    if set(kept) == ROUTE_POOLS.get(pool_path) and os.path.exists(pool_path):
+        return
+    ROUTE_POOLS[pool_path] = set(kept)
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(pool_path, 'w') as f:
+            json.dump([list(route) for route in kept], f)
+    except OSError as e:
+        print(f"Could not save the route pool: {e}")
+
+
+def capacity_classes(l):
+    '''
+    :return: the distinct capacities, ascending, and the number of couriers with at least each of them
+    '''
+    capacities = sorted(set(int(c) for c in l))
+    return capacities, [sum(1 for c in l if c >= capacity) for capacity in capacities]
+
+
+def q_route_dp(D, sizes, capacity, prizes, multiplier):
+    '''
+    f[0, q, j] is the least multiplier * distance - collected prizes of a path
+    from the depot to item j with load q, item j being possibly visited
+    before; f[1, q, j] is the least one coming from another item than the
+    first, so that paths never go back to the item they just left (2-cycle
+    elimination).
+    :return: f plus the distance back to the depot, and the previous item of every state
+    '''
+    n = len(sizes)
+    arc_cost = multiplier * D[:n, :n] - prizes[None, :]
+    np.fill_diagonal(arc_cost, np.inf)  # no item right after itself
+    start_cost = multiplier * D[n, :n] - prizes
+    f = np.full((2, capacity + 1, n), np.inf)
+    pred = np.full((2, capacity + 1, n), -1, dtype=int)   # -1 for the depot
+    for q in range(1, capacity + 1):
+        items = np.nonzero(sizes <= q)[0]
+        if len(items) == 0:
+            continue
+        previous = q - sizes[items]
+        # from item i to item j, the best path to i that does not come from j
+        from_j = pred[0, previous, :] == items[:, None]
+        reach = np.where(from_j, f[1, previous, :], f[0, previous, :])
+        candidates = np.concatenate([reach + arc_cost[:, items].T,
+                                     np.where(sizes[items] == q, start_cost[items], np.inf)[:, None]], axis=1)
+        two_best = np.argpartition(candidates, 1, axis=1)[:, :2]
+        two_costs = np.take_along_axis(candidates, two_best, axis=1)
+        order = np.argsort(two_costs, axis=1)
+        two_best = np.take_along_axis(two_best, order, axis=1)
+        two_costs = np.take_along_axis(two_costs, order, axis=1)
+        f[:, q, items] = two_costs.T
+        pred[:, q, items] = np.where(two_best == n, -1, two_best).T
+    return f[0] + multiplier * D[:n, n][None, :], pred
+
+
+def q_route(pred, sizes, q, j):
+    route = []
+    label = 0
+    while j >= 0:
+        route.append(int(j))
+        previous = pred[label, q, j]
+        q -= sizes[j]
+        label = 1 if previous >= 0 and pred[0, q, previous] == j else 0
+        j = previous
+    return tuple(reversed(route))
+
+
+def price(D, s, capacities, penalties, prizes, target, multiplier):
+    '''
+    Upper bound, for every capacity class, on the penalized prize of the routes
+    no longer than target, with the Lagrangian relaxation of the length limit
+    over q-routes. Items of size 0 are counted with size 1, and the capacities
+    raised accordingly, so that the DP stays a relaxation.
+    :param penalties: penalty of the routes of every capacity class, from the capacity duals
+    :return: (bound on the best penalized prize, multiplier used last, q-routes found)
+    '''
+    sizes = np.maximum(np.asarray(s, dtype=int), 1)
+    extra = int(np.sum(np.asarray(s) == 0))
+    limits = [capacity + extra for capacity in capacities]
+    best_bounds = np.full(len(capacities), np.inf)
+    routes = set()
+    low, high = 0.0, None
+    for step in range(MULTIPLIER_STEPS):
+        cost, pred = q_route_dp(D, sizes, limits[-1], prizes, multiplier)
+        cumulative = np.minimum.accumulate(cost.min(axis=1))
+        bounds = np.array([-cumulative[limit] + multiplier * target for limit in limits]) - penalties
+        best_bounds = np.minimum(best_bounds, bounds)
+
+        order = np.argsort(cost, axis=None)[:ROUTES_PER_PRICING]
+        found = [q_route(pred, sizes, *np.unravel_index(flat, cost.shape)) for flat in order
+                 if np.isfinite(cost.flat[flat])]
+        routes.update(found)
+
+        # the subgradient of the bound of the worst class is target - length of its best route
+        worst = int(np.argmax(best_bounds))
+        q, j = np.unravel_index(np.argmin(cost[:limits[worst] + 1]), cost[:limits[worst] + 1].shape)
+        if route_length(q_route(pred, sizes, q, j), D) <= target:
+            high = multiplier
+        else:
+            low = multiplier
+        multiplier = (low + high) / 2 if high is not None else max(2 * multiplier, 1e-3)
+    return max(0.0, float(best_bounds.max())), multiplier, routes
+
+
+def insertion_routes(D, s, prizes, target, capacities, penalties, n_seeds=5):
+    '''
+    Pricing heuristic: starting from the items of largest prize, insert the
+    item of best prize per added distance, as long as the route stays within
+    the capacity of the class and no longer than target.
+    :return: set of elementary routes of positive penalized prize
+    '''
+    n = len(s)
+    sizes = np.asarray(s)
+    reachable = (D[n, :n] + D[:n, n]) <= target
+    routes = set()
+    for capacity, penalty in zip(capacities, penalties):
+        seeds = [i for i in np.argsort(-prizes) if prizes[i] > EPSILON and reachable[i] and sizes[i] <= capacity]
+        for seed in seeds[:n_seeds]:
+            route = [int(seed)]
+            load = sizes[seed]
+            length = D[n, seed] + D[seed, n]
+            while True:
+                points = [n] + route + [n]
+                before, after = np.array(points[:-1]), np.array(points[1:])
+                # added distance of every item at every position
+                increase = D[before][:, :n] + D[:n, after].T - D[before, after][:, None]
+                position = increase.argmin(axis=0)
+                best_increase = increase[position, np.arange(n)]
+                candidates = (prizes > EPSILON) & (sizes + load <= capacity) & (length + best_increase <= target)
+                candidates[route] = False
+                if not candidates.any():
+                    break
+                ratio = np.where(candidates, prizes / (best_increase + 1), -np.inf)
+                item = int(np.argmax(ratio))
+                route.insert(int(position[item]), item)
+                load += sizes[item]
+                length += best_increase[item]
+            if prizes[route].sum() - penalty > EPSILON:
+                routes.add(tuple(route))
+    return routes
+
+
+def relocate(routes, data):
+    '''
+    Local search on the longest route: move one of its items to the cheapest
+    position of another courier, as long as the longest of the two routes gets
+    shorter than it was.
+    '''
+    m, n, l, s, D = data
+    routes = [list(route) for route in routes]
+    lengths = [route_length(route, D) for route in routes]
+    while True:
+        longest = int(np.argmax(lengths))
+        best = None
+        for position, item in enumerate(routes[longest]):
+            shortened = routes[longest][:position] + routes[longest][position + 1:]
+            shortened_length = route_length(shortened, D)
+            for k in range(m):
+                if k == longest or sum(s[i] for i in routes[k]) + s[item] > l[k]:
+                    continue
+                increase, insert_at = cheapest_insertion(routes[k], item, D)
+                new_max = max(shortened_length, lengths[k] + increase)
+                if new_max < lengths[longest] and (best is None or new_max < best[0]):
+                    best = (new_max, position, k, insert_at)
+        if best is None:
+            return routes
+        new_max, position, k, insert_at = best
+        item = routes[longest].pop(position)
+        routes[k].insert(insert_at, item)
+        for r in (longest, k):
+            routes[r] = two_opt(routes[r], D)
+            lengths[r] = route_length(routes[r], D)
+
+
+def elementary(route, D):
+    '''
+    Keep the first visit of every item of a q-route and improve it with 2-opt.
+    '''
+    seen = []
+    for item in route:
+        if item not in seen:
+            seen.append(item)
+    return tuple(two_opt(seen, D))
+
+
+def add_rows(highs, lower, upper):
+    for low, up in zip(lower, upper):
+        highs.addRow(low, up, 0, np.array([], dtype=np.int32), np.array([]))
+
+
+def new_highs():
+    highs = highspy.Highs()
+    highs.setOptionValue("output_flag", False)
+    return highs
+
+
+class RouteSet:
+    '''
+    Distance and load of the elementary routes collected so far.
+    '''
+    def __init__(self, l, s, D):
+        self.s, self.D = s, D
+        self.max_capacity = max(l)
+        self.distances = {}
+        self.loads = {}
+
+    def add(self, route):
+        '''
+        :return: True if the route is new and fits some courier
+        '''
+        if route in self.distances or not route:
+            return False
+        load = sum(self.s[i] for i in route)
+        if load > self.max_capacity:
+            return False
+        self.distances[route] = route_length(route, self.D)
+        self.loads[route] = load
+        return True
+
+    def columns(self, route, capacities):
+        '''
+        :return: row indices and values of the route in a master with the item rows first
+                 and the capacity class rows after them
+        '''
+        n = len(self.s)
+        rows = list(route) + [n + j for j in range(len(capacities))
+                              if j == 0 or self.loads[route] > capacities[j - 1]]
+        return np.array(rows, dtype=np.int32), np.ones(len(rows))
+
+
+def target_infeasible(route_set, data, target, capacities, counts, deadline):
+    '''
+    Column generation on the phase 1 LP of the routes no longer than target.
+    :return: True if no fractional solution exists, proven with the pricing bound
+    '''
+    m, n, l, s, D = data
+    highs = new_highs()
+    add_rows(highs, [1] * n, [1] * n)
+    add_rows(highs, [-highspy.kHighsInf] * len(capacities), counts)
+    for i in range(n):
+        highs.addCol(1, 0, highspy.kHighsInf, 1, np.array([i], dtype=np.int32), np.array([1.0]))
+    in_master = set()
+
+    def add(route):
+        if route_set.distances[route] <= target and route not in in_master:
+            rows, values = route_set.columns(route, capacities)
+            highs.addCol(0, 0, highspy.kHighsInf, len(rows), rows, values)
+            in_master.add(route)
+            return True
+        return False
+
+    for route in list(route_set.distances):
+        add(route)
+    multiplier = 0.0
+    for iteration in range(MAX_ITERATIONS):
+        highs.run()
+        value = highs.getInfo().objective_function_value
+        if value <= EPSILON:
+            return False
+        duals = np.array(highs.getSolution().row_dual)
+        prizes, mu = duals[:n], duals[n:]
+        penalties = -np.cumsum(mu)
+        bound, multiplier, q_routes = price(D, s, capacities, penalties, prizes, target, multiplier)
+        if value - m * bound > EPSILON:
+            return True
+        added = 0
+        candidates = {elementary(route, D) for route in q_routes}
+        candidates |= insertion_routes(D, s, prizes, target, capacities, penalties)
+        for route in candidates:
+            route_set.add(route)
+            if route in route_set.distances:
+                added += add(route)
+        if added == 0 or time.time() > deadline:
+            return False
+    return False
+
+
+def assign_to_couriers(routes, s, l):
+    '''
+    Heaviest route first, to the smallest courier it fits in.
+    '''
+    assigned = [[] for _ in range(len(l))]
+    free = set(range(len(l)))
+    for route in sorted(routes, key=lambda route: -sum(s[i] for i in route)):
+        load = sum(s[i] for i in route)
+        courier = min((k for k in free if l[k] >= load), key=lambda k: l[k])
+        assigned[courier] = list(route)
+        free.remove(courier)
+    return assigned
+
+
+def solve_min_max(route_set, data, capacities, counts, upper_bound, time_limit):
+    '''
+    Integer min-max problem over the collected routes shorter than upper_bound.
+    Items may be covered more than once, which is much easier to satisfy with
+    a restricted set of routes; the extra visits are removed afterwards.
+    :return: the route of every courier, None if no solution was found
+    '''
+    m, n, l, s, D = data
+    routes = [route for route, distance in route_set.distances.items() if distance < upper_bound]
+    if not routes:
+        return None
+    highs = new_highs()
+    add_rows(highs, [1] * n, [highspy.kHighsInf] * n)
+    add_rows(highs, [-highspy.kHighsInf] * len(capacities), counts)
+    add_rows(highs, [-highspy.kHighsInf] * len(routes), [0] * len(routes))
+    # z, then one binary per route
+    highs.addCol(1, 0, highspy.kHighsInf, len(routes),
+                 np.arange(n + len(capacities), n + len(capacities) + len(routes), dtype=np.int32),
+                 -np.ones(len(routes)))
+    for index, route in enumerate(routes):
+        rows, values = route_set.columns(route, capacities)
+        rows = np.append(rows, n + len(capacities) + index).astype(np.int32)
+        values = np.append(values, route_set.distances[route])
+        highs.addCol(0, 0, 1, len(rows), rows, values)
+    highs.changeColsIntegrality(len(routes), np.arange(1, len(routes) + 1, dtype=np.int32),
+                                np.array([highspy.HighsVarType.kInteger] * len(routes)))
+    highs.setOptionValue("time_limit", float(max(time_limit, 1)))
+    highs.run()
+    if highs.getInfo().primal_solution_status != 2:  # no feasible solution
+        return None
+    values = highs.getSolution().col_value
+    used = [list(route) for index, route in enumerate(routes) if values[index + 1] > 0.5]
+    return assign_to_couriers(remove_extra_visits(used, D), s, l)
+
+
+def remove_extra_visits(routes, D):
+    '''
+    Keep every item only in the route where removing it would save the least distance.
+    '''
+    changed = set()
+    for item in set(i for route in routes for i in route):
+        holders = [r for r, route in enumerate(routes) if item in route]
+        if len(holders) < 2:
+            continue
+        savings = [route_length(routes[r], D) - route_length([i for i in routes[r] if i != item], D)
+                   for r in holders]
+        keep = holders[int(np.argmin(savings))]
+        for r in holders:
+            if r != keep:
+                routes[r] = [i for i in routes[r] if i != item]
+                changed.add(r)
+    for r in changed:
+        routes[r] = two_opt(routes[r], D)
+    return [route for route in routes if route]
+
+
+def solve_data(data, time_limit=300, warm_start=None, gap=None, stats=None, pool_path=ROUTE_POOLS_PATH):
+    '''
+    Solve istance data (m, n, l, s, D) by column generation.
+    :param warm_start: optional (obj, sol) of a previous result, in the output format of this backend
+    :param gap: optional gap target, see Common/bounds.py
+    :param stats: optional dictionary filled with the time taken to build the initial route set
+    :param pool_path: directory of the route pool files
+    :return: the result dictionary {time, optimal, obj, sol}
+    '''
+    start_time = time.time()
+    m, n, l, s, D = data
+    D = np.asarray(D, dtype=int)
+    data = (m, n, l, s, D)
+    capacities, counts = capacity_classes(l)
+
+    # heuristic solution, so that there is always one to return
+    best_routes = repair([[] for _ in range(m)], data, set(), range(n))
+    best_routes = relocate([two_opt(route, D) for route in best_routes], data)
+    if warm_start is not None and warm_start[1]:
+        routes = [[point - 1 for point in path] for path in warm_start[1]]
+        if len(routes) == m and max(map(lambda r: route_length(r, D), routes)) < max(
+                map(lambda r: route_length(r, D), best_routes)):
+            best_routes = routes
+    upper_bound = max(route_length(route, D) for route in best_routes)
+
+    route_set = RouteSet(l, s, D)
+    pool = load_pool(D, pool_path)
+    for route in list(pool) + [tuple(route) for route in best_routes] + [(i,) for i in range(n)]:
+        route_set.add(route)
+    print(f"Column generation: {len(route_set.distances)} routes from the pool and the heuristic solution, "
+          f"upper bound {upper_bound}")
+    if stats is not None:
+        stats["build_time"] = time.time() - start_time
+
+    # bisection on the largest target proven infeasible
+    lower_bound = relaxation_bound(*data)
+    high = upper_bound
+    deadline = start_time + BOUND_SHARE * time_limit
+    first = True
+    while lower_bound < high and time.time() < deadline and not gap_reached(upper_bound, lower_bound, gap):
+        # the first target, just below the heuristic solution, brings the long routes
+        # the integer problem needs to improve on it
+        target = high - 1 if first else (lower_bound + high - 1) // 2
+        first = False
+        if target_infeasible(route_set, data, target, capacities, counts, deadline):
+            lower_bound = target + 1
+        else:
+            high = target
+        print(f"Target {target}: lower bound {lower_bound}, {len(route_set.distances)} routes")
+
+    if lower_bound < upper_bound and not gap_reached(upper_bound, lower_bound, gap):
+        remaining = time_limit - (time.time() - start_time)
+        routes = solve_min_max(route_set, data, capacities, counts, upper_bound, remaining)
+        if routes is not None:
+            routes = relocate(routes, data)
+        # without the triangle inequality, removing extra visits may make a route longer
+        if routes is not None and max(route_length(route, D) for route in routes) < upper_bound:
+            best_routes = routes
+            upper_bound = max(route_length(route, D) for route in best_routes)
+
+    save_pool(D, pool | set(route_set.distances), route_set.distances, pool_path)
+    solve_time = time.time() - start_time
+    print(f"Column generation done in {solve_time:.2f}s: obj {upper_bound}, lower bound {lower_bound}")
+    result = {"time": round(min(solve_time, time_limit), 2), "optimal": False, "obj": int(upper_bound),
+              "sol": [[i + 1 for i in route] for route in best_routes]}
+    return add_certificate(result, data, lower_bound, "column generation bound")
+
+
+def solve_instance(instance, time_limit=300, warm_start=None, gap=None, pool_path=ROUTE_POOLS_PATH):
+    def solve_reduced_data(data, reduced_warm_start, on_incumbent):
+        return solve_data(data, time_limit, reduced_warm_start, gap, pool_path=pool_path)
+
+    return solve_reduced("CG", load_instance(instance), solve_reduced_data, warm_start)
+
+
+def save_result(instance, result, path=RESULTS_PATH):
+    results_path = os.path.join(path, f"{instance}.json")
+    os.makedirs(path, exist_ok=True)
+    with open(results_path, 'w') as file:
+        json.dump({"colgen": result}, file, indent=3)
+
+
+def main(input_choice, time_limit=300, results_path=RESULTS_PATH, pool_path=ROUTE_POOLS_PATH):
+    if input_choice.upper() == 'ALL':
+        instance_numbers = range(1, 22)
+    elif ':' in input_choice:
+        start, end = map(int, input_choice.split(':'))
+        instance_numbers = range(start, end + 1)
+    else:
+        instance_numbers = [int(input_choice)]
+
+    for instance in instance_numbers:
+        print(f"\nSolving istance {instance} by column generation...")
+        save_result(instance, solve_instance(instance, time_limit, pool_path=pool_path), results_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve MCP istances by column generation.')
+    parser.add_argument('instances', type=str, help='istance number, start:end or ALL')
+    parser.add_argument('--time-limit', type=float, default=300)
+    parser.add_argument('--results-path', default=RESULTS_PATH, help='directory of the result files')
+    parser.add_argument('--pool-path', default=ROUTE_POOLS_PATH, help='directory of the route pool files')
+    args = parser.parse_args()
+    main(args.instances, args.time_limit, args.results_path, args.pool_path)
@@ -1,8 +1,8 @@
 import signal
+import re
+import tempfile
 import numpy as np
-import gurobipy as gp
-import highspy as hp
-from pulp import *
+from pulp import *  # PuLP imports gurobipy and highspy itself when those solvers are used
 # Use relative imports
 from .mip_problem import *
 from .utils import *
@@ -10,10 +10,51 @@ import argparse
 import multiprocessing
 import time
 import os
+from Common.bounds import add_certificate, relaxation_bound
+from Common.shared import SharedInstance, attach
+from Common.presolve import presolve, solve_reduced
 
-def solve(solver, instance, time_limit=300, verbose=False):
-    n_couriers, n_items, load_i, obj_size_j, D = retrieve_istance(instance)
+def solve(solver, instance, time_limit=300, verbose=False, warm_start=None):
+    return solve_data(solver, retrieve_istance(instance), time_limit, verbose, warm_start, instance=instance)
+
+
+def mip_dual_bound(MTSP, solver):
+    '''
+    Best lower bound proven by the solver, None if it is not available.
+    HiGHS reports it directly, CBC and Gurobi in their log (written when a gap target is given).
+    '''
+    if isinstance(solver, HiGHS):
+        bound = MTSP.solverModel.getInfo().mip_dual_bound
+        return bound if np.isfinite(bound) else None
+    log_path = solver.optionsDict.get("logPath")
+    if not log_path or not os.path.exists(log_path):
+        return None
+    with open(log_path) as f:
+        log = f.read()
+    # CBC: "best possible 12.07" while searching, "Lower bound: 12.07" at the end; Gurobi: "best bound 12.07,"
+    bounds = re.findall(r"(?:best possible|Lower bound:|best bound)\s+([-+\d.eE]+)", log)
+    return float(bounds[-1].rstrip('.,')) if bounds else None
+
+
+def solve_data(solver, data, time_limit=300, verbose=False, warm_start=None, instance=None, stats=None, gap=None):
+    '''
+    Same as solve, for istance data (m, n, l, s, D) that is not read from the istances folder.
+    stats - optional dictionary filled with the model build time and the dual bound
+    gap - the gap target given to the solver, if any: with it, an "Optimal" status
+          only means that the gap was reached
+    '''
+    n_couriers, n_items, load_i, obj_size_j, D = data
+    D = np.asarray(D)
+    build_start = time.time()
     MTSP, route, max_dist, distances = mip_problem(n_couriers, n_items, load_i, obj_size_j, D, verbose=verbose)
+    if stats is not None:
+        stats["build_time"] = time.time() - build_start
+    if warm_start is not None:
+        obj, paths = warm_start
+        add_warm_start(MTSP, route, max_dist, n_couriers, obj, paths)
+    if gap is not None:
+        # the solver measures the gap from its own bound, so give it the stronger relaxation bound
+        MTSP += max_dist >= relaxation_bound(n_couriers, n_items, load_i, obj_size_j, D)
     depot_node = D.shape[0]  # depot is the last city n+1
    
     MTSP.solve(solver)
@@ -21,6 +62,11 @@ def solve(solver, instance, time_limit=300, verbose=False):
     # If solution found within time, process solution results
     status = LpStatus[MTSP.status]
     optimal = status == "Optimal"
+    dual_bound = mip_dual_bound(MTSP, solver)
+    if stats is not None:
+        stats["dual_bound"] = dual_bound
+    if gap is not None and optimal and MTSP.objective.value() is not None:
+        optimal = bool(dual_bound is not None and np.ceil(dual_bound - 1e-6) >= MTSP.objective.value() - 1e-6)
         
     # Calculate distance metrics if solved
     '''tot_distance = sum(
@@ -34,7 +80,7 @@ def solve(solver, instance, time_limit=300, verbose=False):
     
     # giving some margin to the time limit since timer is not precise but optimal solution can be still found in around 300 plus extra milliseconds (inst 13 is 300.12 w. cbc, 300.00 with highs)
     if solution_time > time_limit and solution_time < time_limit+5:
-        solution_time = 300
+        solution_time = time_limit
 
     if verbose:
         print_route(route, depot_node, n_couriers)
@@ -42,14 +88,16 @@ def solve(solver, instance, time_limit=300, verbose=False):
     
     if solution_time > time_limit+5:
         print(f"Solution for instance {instance} timed out and no solution was available.")
-        return [], depot_node, n_couriers, 300, False, -1, distances
+        return [], depot_node, n_couriers, time_limit, False, -1, distances
     
     return route, depot_node, n_couriers, solution_time, optimal, obj, distances
 
 
-def solver_process(solver,instance,queue):
+def solver_process(solver,handle,instance,queue):
         # Solve and store the result in a queue to retrieve outside of the process
-        result = solve(solver, instance, verbose=False)
+        # the distance matrix is read from the shared memory segment of the parent, not copied
+        with attach(handle) as data:
+            result = solve_data(solver, data, verbose=False, instance=instance)
         queue.put(result)
         
 
@@ -57,35 +105,83 @@ def solver_process(solver,instance,queue):
 def solve_with_timeout(solver, instance, time_limit=305):
 
     queue = multiprocessing.Queue()
-    process = multiprocessing.Process(target=solver_process, args=(solver,instance,queue))
-    process.start()
-    process.join(timeout=time_limit)
-
-    if process.is_alive():
-        print(f"Solver exceeded {time_limit} seconds; terminating the process.")
-        process.terminate()  # Force stop the solver process
-        process.join()       # Ensure process has fully terminated
-        
-        # Retrieve the partial solution (if available)
-        if not queue.empty():
-            partial_solution = queue.get()
-            print("Returning partial solution due to timeout.")
-            return partial_solution  # Return partial solution if available
+    with SharedInstance(retrieve_istance(instance)) as shared:
+        process = multiprocessing.Process(target=solver_process, args=(solver,shared.handle,instance,queue))
+        process.start()
+        process.join(timeout=time_limit)
+        if process.is_alive():
+            print(f"Solver exceeded {time_limit} seconds; terminating the process.")
+            process.terminate()  # Force stop the solver process
+            process.join()       # Ensure process has fully terminated
         else:
-            print("No solution found before timeout.")
-            return None  # No solution, process was terminated before solving
+            return queue.get()  # Retrieve the full solution if completed
+
+    # Retrieve the partial solution (if available)
+    if not queue.empty():
+        partial_solution = queue.get()
+        print("Returning partial solution due to timeout.")
+        return partial_solution  # Return partial solution if available
     else:
-        return queue.get()  # Retrieve the full solution if completed
+        print("No solution found before timeout.")
+        return None  # No solution, process was terminated before solving
     
     
+def make_solver(solver_name, time_limit=300, warm_start=False, options=None, gap=None, log_dir=None):
+    # Build the PuLP solver object for the given name and time limit
+    # (HiGHS through PuLP does not accept initial values, only the upper bound is used)
+    # options - optional dictionary of solver options, e.g. {"cuts": "off"} for cbc or {"presolve": "off"} for highs
+    # gap - optional gap target {"rel": ..., "abs": ...} the solver stops at; CBC and Gurobi
+    #       then write their log to a file in log_dir, to read the dual bound back
+    # log_dir - directory of that log, owned by the caller
+    options = options or {}
+    gap_options = {}
+    if gap is not None:
+        gap_options = {"gapRel": gap.get("rel"), "gapAbs": gap.get("abs")}
+        if solver_name != "highs" and log_dir is not None:
+            gap_options["logPath"] = os.path.join(log_dir, f"{solver_name}.log")
+    if solver_name == "cbc":
+        return PULP_CBC_CMD(timeLimit=time_limit, warmStart=warm_start,
+                            options=[f"{name} {value}" for name, value in options.items()], **gap_options)
+    elif solver_name == "highs":
+        return getSolver('HiGHS', timeLimit=time_limit, msg=False, **gap_options, **options)
+    elif solver_name == "gurobi":
+        return GUROBI_CMD(timeLimit=time_limit, warmStart=warm_start, options=list(options.items()), **gap_options)
+    raise ValueError(f"Unknown MIP solver '{solver_name}'. Solver Options: cbc, highs, gurobi")
+
+
+def solve_instance(instance, solver_name, time_limit=300, warm_start=None, gap=None):
+    '''
+    Solve a single istance with the given solver and time limit and return the
+    result in the JSON output format, without saving it.
+    warm_start - optional (obj, paths) of a previous solution in the JSON output format
+    gap - optional gap target, see make_solver
+    The model is built on the presolved istance, see Common/presolve.py.
+    '''
+    def solve_reduced_data(data, reduced_warm_start, on_incumbent):
+        return solve_instance_data(data, solver_name, time_limit, reduced_warm_start, gap=gap)
+
+    return solve_reduced("MIP", retrieve_istance(instance), solve_reduced_data, warm_start)
+
+
+def solve_instance_data(data, solver_name, time_limit=300, warm_start=None, stats=None, options=None, gap=None):
+    '''
+    Same as solve_instance, for istance data (m, n, l, s, D).
+    options - optional solver options, see make_solver
+    The result also holds the best known lower bound, its source and the gap.
+    '''
+    stats = {} if stats is None else stats
+    # the solver log the dual bound is read from is removed with the directory
+    with tempfile.TemporaryDirectory() as log_dir:
+        solver = make_solver(solver_name, time_limit, warm_start is not None, options, gap, log_dir)
+        route, depot_node, n_couriers, solution_time, optimal, obj, distances = solve_data(solver, data, time_limit, warm_start=warm_start, stats=stats, gap=gap)
+    result = convert_to_json(route, depot_node, n_couriers, solution_time, optimal, obj, data)
+    return add_certificate(result, data, stats.get("dual_bound"), "MIP dual bound")
+
+
 # li, ui = istance range to be solved
-def main(li_ui_solver):
-    TIME_LIMIT = 300    #5mins
-    solvers = {
-        "cbc": PULP_CBC_CMD(timeLimit=TIME_LIMIT),                          
-        "highs": getSolver('HiGHS', timeLimit=TIME_LIMIT, msg=False),       
-        "gurobi": GUROBI_CMD(timeLimit=TIME_LIMIT)                          
-    }
+def main(li_ui_solver, time_limit=300):
+    TIME_LIMIT = time_limit    #5mins by default
+    solvers = {name: make_solver(name, TIME_LIMIT) for name in ("cbc", "highs", "gurobi")}
     li, ui, solver = li_ui_solver.split(",")
     li = int(li)
     ui = int(ui)
@@ -94,33 +190,35 @@ def main(li_ui_solver):
     if solver == "ALL":
         print("Solving with all solvers...")
         for instance in range(li, ui+1):
+            reduction = presolve(retrieve_istance(instance))
             for solver_name, solver_object in solvers.items():
                 
-                result = solve(solver_object, instance, TIME_LIMIT)
+                result = solve_data(solver_object, reduction.data, TIME_LIMIT, instance=instance)
                 if result is None:
                     print(f"Solution for instance {instance} timed out and no solution was available.")
-                    n_couriers, n_items, load_i, obj_size_j, D = retrieve_istance(instance)
+                    n_couriers, n_items, load_i, obj_size_j, D = reduction.data
                     depot_node = D.shape[0]  # depot is the last city n+1
-                    route, time, optimal, obj  = [], 300, False, 'N/A'
+                    route, time, optimal, obj  = [], TIME_LIMIT, False, 'N/A'
                 else:
                     route, depot_node, n_couriers, time, optimal, obj, distances = result
                 
-                json[solver_name] = convert_to_json(route,depot_node, n_couriers, time, optimal, obj)
+                json[solver_name] = reduction.postsolve("MIP", convert_to_json(route,depot_node, n_couriers, time, optimal, obj, reduction.data))
             save_json(instance,json)
     else:
         print(f"Solving with {solver}...")
         for instance in range(li, ui+1):
             
-            result = solve(solvers[solver], instance, TIME_LIMIT)
+            reduction = presolve(retrieve_istance(instance))
+            result = solve_data(solvers[solver], reduction.data, TIME_LIMIT, instance=instance)
             if result is None:
                 print(f"Solution for instance {instance} timed out and no solution was available.")
-                n_couriers, n_items, load_i, obj_size_j, D = retrieve_istance(instance)
+                n_couriers, n_items, load_i, obj_size_j, D = reduction.data
                 depot_node = D.shape[0]  # depot is the last city n+1
-                route, time, optimal, obj  = [], 300, False, 'N/A'
+                route, time, optimal, obj  = [], TIME_LIMIT, False, 'N/A'
             else:
                 route, depot_node, n_couriers, time, optimal, obj, distances = result
             
-            json[solver] = convert_to_json(route, depot_node, n_couriers, time, optimal, obj)
+            json[solver] = reduction.postsolve("MIP", convert_to_json(route, depot_node, n_couriers, time, optimal, obj, reduction.data))
             save_json(instance,json)
     
     
@@ -1,7 +1,6 @@
 # using PuLP library to generate code that can be solved by different solvers
 from pulp import *
 import numpy as np
-import pandas as pd
 import math
 # Use relative import
 from .utils import print_route, print_terminal
@@ -157,4 +156,26 @@ def mip_problem(n_couriers, n_items, capacities, item_size, D, verbose=False):
     for k in range(n_couriers):
         MTSP += lpSum( route[i][j][k] for i in range(0,depot_idx) for j in range(0,depot_idx) ) >= 1'''
                             
-    return MTSP, route, max_allowed_distance, cour_dist
\ No newline at end of file
+    return MTSP, route, max_allowed_distance, cour_dist
+
+
+def add_warm_start(MTSP, route, max_allowed_distance, n_couriers, obj, paths):
+    '''
+    Use a previous solution as initial values of the route variables and its
+    objective as upper bound, so the solver only looks for better solutions.
+    paths is in the JSON output format: [0, item, ..., item, 0] for each courier
+    '''
+    depot_idx = len(route)
+    used_arcs = set()
+    for k, path in enumerate(paths):
+        if not all(isinstance(point, int) for point in path):
+            return  # marked subtour or incomplete route, not a valid solution
+        points = [depot_idx-1 if point == 0 else point-1 for point in path]
+        used_arcs.update((i, j, k) for i, j in zip(points, points[1:]))
+    
+    for i in range(depot_idx):
+        for j in range(depot_idx):
+            for k in range(n_couriers):
+                route[i][j][k].setInitialValue(1 if (i, j, k) in used_arcs else 0)
+    
+    MTSP += max_allowed_distance <= obj
\ No newline at end of file
@@ -1,9 +1,10 @@
 from pulp import value  # using the PuLP library in order to have a solver INDEPENDENT language.
 import numpy as np
-import pandas as pd
 import json
 import os
-from IPython.display import display
+from Common.decoder import arcs_from_pulp, decode_arcs, pad_routes, END_DEPOT, END_NO_ARC
+from Common.delta import result_routes
+from Common.evaluator import evaluate, has_markers
 
 
 def print_route(route, depot_index, n_couriers):
@@ -64,53 +65,46 @@ def retrieve_istance(n):
 
 
 def couriers_paths(x, depot_node, n_couriers):
-    routes = [[] for _ in range(n_couriers)]  # Initialize list of routes for each courier
+    # Read all the arc values at once and follow the routes of all the couriers together
+    routes, ends, repeated = decode_arcs(arcs_from_pulp(x, depot_node, n_couriers))
     
+    paths = []
     for k in range(n_couriers):
-        current_city = depot_node - 1       # Start at the depot
-        routes[k].append(0)                # Route at index k starts at the depot, marked by number -1
-    
-        visited = []            # Keep track of visited cities for this courier
-        
-        while True:
-            next_city = -1                  # Initialize next city to non existent city
-            
-            for j in range(depot_node):   # Iterate over all cities including the depot
-                if value(x[current_city][j][k]) is not None and value(x[current_city][j][k]) > 0.9: # Check if the edge is used
-                    next_city = j
-                    break
-
-            if next_city == -1: # Check for no next city.
-                routes[k].append('No Outgoing Edges') 
-                break  # Exit loop if no more outgoing edges
-            
-            if next_city in visited: # Check for subtour
-                routes[k].append(next_city+1)
-                routes[k].append('Subtour') # Mark that previous city has been already visited
-                break                      #Exit loop if subtour is found
-
-            if next_city == depot_node-1:
-                routes[k].append(0) # Mark that the courier has returned to the depot
-                break
-            
-            routes[k].append(next_city+1)   # Append the next city to the route, summing 1 to remove 0-indexing
-            visited.append(next_city)
-            current_city = next_city
-
-        
-        # if at the end of the loop the next city is not the depot, mark an incomplete path
-        if next_city != depot_node-1 and next_city != -1: # handle subtours + incomplete paths
-            routes[k].append('Incomplete') # Mark an incomplete path ending in not the depot
-
-    return routes
+        path = [0] + [city+1 for city in routes[k][routes[k] >= 0]]   # Route starts at the depot, marked by number 0
+        if ends[k] == END_DEPOT:
+            path.append(0)                          # Mark that the courier has returned to the depot
+        elif ends[k] == END_NO_ARC:
+            path.append('No Outgoing Edges')
+        else:
+            path.append(repeated[k]+1)
+            path.append('Subtour')                  # Mark that previous city has been already visited
+            path.append('Incomplete')               # Mark an incomplete path ending in not the depot
+        paths.append([int(point) if not isinstance(point, str) else point for point in path])
+    return paths
 
 
-def convert_to_json(x,n_cities,n_couriers,time,optimal,obj):
-    if obj < 0: # if obj. function is negative return N/A
-        return {"time": time, "optimal": optimal, "obj": "N/A", "sol": []}
-    else:
-        c_paths = couriers_paths(x,n_cities, n_couriers)
-        return {"time": time, "optimal": optimal, "obj": round(obj), "sol": c_paths}
+def convert_to_json(x,n_cities,n_couriers,time,optimal,obj,data=None):
+    '''
+    Result in the JSON output format. The objective of the solver is only
+    reported for complete routes: with no objective (None, 'N/A' or negative)
+    or with broken routes (subtours, missing outgoing edges) there is no solution.
+    data - optional istance data (m, n, l, s, D): the routes are then checked
+           against it and the objective is the length of the longest one
+    '''
+    no_solution = {"time": time, "optimal": False, "obj": "N/A", "sol": []}
+    if not isinstance(obj, (int, float)) or obj < 0: # no objective value, or negative: return N/A
+        return no_solution
+    c_paths = couriers_paths(x,n_cities, n_couriers)
+    if has_markers(c_paths):
+        print("The solution has broken routes, no solution is reported.")
+        return no_solution
+    if data is not None:
+        evaluation = evaluate(pad_routes(result_routes("MIP", c_paths, data)), data)
+        if not evaluation["feasible"][0]:
+            print("The routes do not serve every item once within the capacities, no solution is reported.")
+            return no_solution
+        obj = evaluation["obj"][0]
+    return {"time": time, "optimal": optimal, "obj": int(round(obj)), "sol": c_paths}
 
 
 def save_json(instance, json_dict):
@@ -120,3 +114,14 @@ def save_json(instance, json_dict):
     os.makedirs(os.path.dirname(results_path), exist_ok=True)
     with open(results_path, 'w') as file:
         json.dump(json_dict, file, indent=3)
+
+
+def update_json(instance, solver_name, result):
+    # Update the entry of one solver in the istance results, keeping the others
+    results_path = f"/app/res/MIP/{instance}.json"
+    json_dict = {}
+    if os.path.exists(results_path):
+        with open(results_path) as file:
+            json_dict = json.load(file)
+    json_dict[solver_name] = result
+    save_json(instance, json_dict)
@@ -1,4 +1,5 @@
-from minizinc import Instance, Model, Solver
+from minizinc import Instance, Model, Solver, Result
+import asyncio
 import os
 import shutil
 import datetime
@@ -6,23 +7,69 @@ import time
 import logging
 import json
 import re
+import numpy as np
+from Common.decoder import arcs_from_path_matrix, decode_arcs, decode_successors, route_items, END_DEPOT
+from Common.bounds import relaxation_bound, gap_reached, add_certificate
+from Common.instances import load_instance, dzn_text
+from Common.presolve import solve_reduced
 
 TIMELIMIT = 5 # Secnonds
 
+# Numeric arguments of the search annotations that can be tuned; the value in
+# the model file is its hand-tuned default
+SEARCH_PARAMETERS = {
+    "relax_rate": r"(relax_and_reconstruct\([^,]+,\s*)(\d+)",          # percentage of variables kept fixed
+    "restart_scale": r"(restart_(?:luby|linear|geometric|constant)\(\s*)([^,)]+)",  # scale of the restart sequence
+}
+
+
+def search_parameters(model_text):
+    """
+    :return: the SEARCH_PARAMETERS used by the model with their value in the model file,
+             e.g. {"relax_rate": "80", "restart_scale": "num_item"}, ignoring commented out annotations
+    """
+    code = "\n".join(line.split('%')[0] for line in model_text.splitlines())
+    matches = {name: re.search(pattern, code) for name, pattern in SEARCH_PARAMETERS.items()}
+    return {name: match.group(2).strip() for name, match in matches.items() if match}
+
+
+def parametrize_model(model_text, names):
+    """
+    Replace the values of the given search parameters by parameters of the same
+    name, whose values are then given as data together with the instance.
+    The model file itself is left untouched.
+    """
+    lines = []
+    for line in model_text.splitlines():
+        code, comment_sign, comment = line.partition('%')
+        for name in names:
+            code = re.sub(SEARCH_PARAMETERS[name], lambda match: match.group(1) + name, code)
+        lines.append(code + comment_sign + comment)
+    declarations = [f"int: {name};" for name in names]
+    return "\n".join(declarations + lines)
+
 class MiniZinc_Mangager:
     def __init__(self,
              solver='gecode',
              instanse_path="/app/instances/dzn_instances/", 
-             model_path="/app/MZN/Solvers/projectmodels/"):
+             model_path="/app/MZN/Solvers/projectmodels/",
+             time_limit=TIMELIMIT):
         """
         :param solver: the solver to be used; default is gecode
         :param isntanse_path: the path to the instances parent directory
         :param model_path: the path to the models parent directory
+        :param time_limit: the time limit of each solve in seconds; default is TIMELIMIT
         """
         self.solver = solver
+        self.time_limit = time_limit
+        self.gap_stop = False
+        self.elapsed = None
+        self.flat_time = None
 
         self.data_parent_directory = instanse_path
-        self.list_of_paths_of_dzn = sorted(os.listdir(self.data_parent_directory))
+        # numeric order, so that Instance10.dzn does not come before Instance2.dzn
+        self.list_of_paths_of_dzn = sorted(os.listdir(self.data_parent_directory),
+                                           key=lambda name: int(re.search(r'\d+', name).group()))
 
         self.model_parent_directory = model_path
         self.list_of_paths_of_models = sorted(os.listdir(self.model_parent_directory))
@@ -65,78 +112,128 @@ class MiniZinc_Mangager:
 
         return self.model_instance
 
-    def solve_instance(self, model_instance=None):
+    def create_model_from_data(self, path_to_model=None, dzn_data=""):
+        """
+        Same as create_model, for instance data given as a dzn string instead of an instance number.
+        :param dzn_data: the instance in the dzn format
+        :return: the model instance for the provided data
+        """
+        self.selected_model_path = path_to_model
+        self.model_instance = Model(os.path.join(self.model_parent_directory, self.selected_model_path))
+        self.couriers = int(re.search(r'num_courier\s*=\s*(\d+)', dzn_data).group(1))
+        self.model_instance.add_string(dzn_data.replace('\n', ''))
+        return self.model_instance
+
+    def create_parametrized_model(self, path_to_model=None, dzn_data="", search_params=None):
+        """
+        Same as create_model_from_data, with the search annotation parameters
+        (see SEARCH_PARAMETERS) given as data instead of the values in the model file.
+        :param search_params: dictionary of parameter values, e.g. {"relax_rate": 60}; a value
+                              can also be an expression of the model, e.g. "num_item"
+        """
+        self.selected_model_path = path_to_model
+        with open(os.path.join(self.model_parent_directory, self.selected_model_path), 'r') as file:
+            model_text = file.read()
+        names = [name for name in search_parameters(model_text) if name in search_params]
+        self.model_instance = Model()
+        self.model_instance.add_string(parametrize_model(model_text, names))
+        self.couriers = int(re.search(r'num_courier\s*=\s*(\d+)', dzn_data).group(1))
+        self.model_instance.add_string(dzn_data.replace('\n', ''))
+        self.model_instance.add_string("".join(f"{name} = {search_params[name]};" for name in names))
+        return self.model_instance
+
+    def objective_name(self):
+        path_to_model = os.path.join(self.model_parent_directory, self.selected_model_path)
+        with open(path_to_model, 'r') as file:
+            return re.search(r'minimize\s+(\w+)', file.read()).group(1)
+
+    def add_upper_bound(self, upper_bound):
+        """
+        Constrain the objective of the created model to be at most upper_bound,
+        e.g. the objective of a previous solution.
+        """
+        self.model_instance.add_string(f"constraint {self.objective_name()} <= {upper_bound};")
+
+    def add_lower_bound(self, lower_bound):
+        """
+        Constrain the objective of the created model to be at least a valid lower bound.
+        """
+        self.model_instance.add_string(f"constraint {self.objective_name()} >= {lower_bound};")
+
+    def solve_instance(self, model_instance=None, gap=None, lower_bound=None):
         """
         :param model_instance: the created model with its data
         :param solver: choice of solver; default is gecode
+        :param gap: optional gap target {"rel": ..., "abs": ...}; the search stops as soon as
+                    a solution is within it of lower_bound
         :return: the result of the solver
         """
         self.chosen_solver = self.solver
+        start_time = time.time()
         if model_instance == None:
             self.solver = Solver.lookup(self.chosen_solver)
             self.instance = Instance(self.solver, self.model_instance)
-            self.result = self.instance.solve(
-                                            timeout=datetime.timedelta(seconds=TIMELIMIT)) # , intermediate_solutions=True
         else:
             self.solver = Solver.lookup(self.chosen_solver)
             self.instance = Instance(self.solver, model_instance)
+        if gap is None:
             self.result = self.instance.solve(
-                                            timeout=datetime.timedelta(seconds=TIMELIMIT)) # , intermediate_solutions=True
+                                            timeout=datetime.timedelta(seconds=self.time_limit)) # , intermediate_solutions=True
+            self.flat_time = self.result.statistics.get("flatTime")
+        else:
+            self.result = asyncio.run(self.solve_until_gap(gap, lower_bound))
+        self.elapsed = time.time() - start_time
         return self.result
+
+    async def solve_until_gap(self, gap, lower_bound):
+        """
+        Go through the intermediate solutions and stop the solver at the first one within the gap.
+        """
+        best = None
+        async for result in self.instance.solutions(timeout=datetime.timedelta(seconds=self.time_limit),
+                                                    intermediate_solutions=True):
+            # the flattening statistics come with the first result only
+            self.flat_time = result.statistics.get("flatTime", self.flat_time)
+            if result.solution is not None:
+                best = result
+                if gap_reached(result.solution.objective, lower_bound, gap):
+                    self.gap_stop = True
+                    break
+            elif best is not None:
+                # the final status comes without a solution when the last one was already reported
+                best = Result(result.status, best.solution, result.statistics)
+            else:
+                best = result
+        return best
     
     def found_courier_path(self):
         """
         Convert the path to a list of found routes for each courier.
         """
-        if self.selected_model_path[:2] in ('01', '02', '03'):
-            self.solutions = self.result.solution
-            solution = self.solutions
-            sequences = solution.sequence
-            distribution_points = len(self.result.solution.sequence[0])
-            travel_route = []
-            for each_courier_sequence in sequences:
-                per_courier_path = [distribution_points]
-                per_courier_path.append(each_courier_sequence[per_courier_path[-1]-1])
-                while per_courier_path[-1] != distribution_points:
-                    per_courier_path.append(each_courier_sequence[per_courier_path[-1]-1])
-                travel_route.append(per_courier_path)
-            return travel_route
-        elif self.selected_model_path[:2] in ('04', '05', '06'):
-            self.solutions = self.result.solution
-            solution = self.solutions
-            paths = solution.path
-            
-            travel_route = []
-            distribution_points = len(paths)
-            for courier in range(1, self.couriers+1):
-                per_courier_path = [distribution_points]
-                per_courier_path.append(paths[distribution_points-1].index(courier)+1)
-                while per_courier_path[-1] != distribution_points:
-                    per_courier_path.append(paths[per_courier_path[-1]-1].index(courier)+1)
-                travel_route.append(per_courier_path)
-            return travel_route
-        elif self.selected_model_path[:2] in ('07', '08', '09'):
-            self.solutions = self.result.solution
-            solution = self.solutions
-            sequences = solution.sequence
-            distribution_points = len(self.result.solution.sequence[0])
-            travel_route = []
-            for each_courier_sequence in sequences:
-                per_courier_path = [distribution_points]
-                per_courier_path.append(each_courier_sequence[per_courier_path[-1]-1])
-                while per_courier_path[-1] != distribution_points:
-                    per_courier_path.append(each_courier_sequence[per_courier_path[-1]-1])
-                travel_route.append(per_courier_path)
-            return travel_route
-        elif self.selected_model_path[:2] in ('10', '11', '12'):
-            travel_route = []
-            for list_of_paths in self.result.solution.sequence:
-                per_courier_path = []
-                for point in list_of_paths:
-                    if point != 0:
-                        per_courier_path.append(point)
-                travel_route.append(per_courier_path)
-            return travel_route
+        self.solutions = self.result.solution
+        solution = self.solutions
+        if self.selected_model_path[:2] in ('10', '11', '12'):
+            # sequence matrix: points in visiting order, padded with zeros
+            sequences = np.asarray(solution.sequence)
+            return [row[row != 0].tolist() for row in sequences]
+
+        if self.selected_model_path[:2] in ('04', '05', '06'):
+            # path matrix: courier travelling each arc
+            distribution_points = len(solution.path)
+            routes, ends, repeated = decode_arcs(arcs_from_path_matrix(solution.path, self.couriers))
+        else:
+            # ('01', '02', '03', '07', '08', '09') successor of each point for each courier
+            distribution_points = len(solution.sequence[0])
+            routes, ends, repeated = decode_successors(np.asarray(solution.sequence) - 1)
+
+        travel_route = []
+        for items, end in zip(route_items(routes), ends):
+            per_courier_path = [distribution_points] + items
+            if end == END_DEPOT or not items:
+                # unused couriers stay at the depot
+                per_courier_path.append(distribution_points)
+            travel_route.append(per_courier_path)
+        return travel_route
     
 
     def solution_to_dict(self, result=None, solution=None):
@@ -146,7 +243,7 @@ class MiniZinc_Mangager:
         if str(self.result.status) == 'UNSATISFIABLE' or str(self.result.status) == 'UNKNOWN':
             return {f"{self.chosen_solver}":
                     {
-                        "time": TIMELIMIT,
+                        "time": self.time_limit,
                         "optimal": False,
                         "obj": None,
                         "sol": None
@@ -156,7 +253,7 @@ class MiniZinc_Mangager:
             solution = self.solutions
             return {f"{self.chosen_solver}":
                     {
-                        "time": TIMELIMIT,
+                        "time": round(self.elapsed, 2) if self.gap_stop else self.time_limit,
                         "optimal": False,
                         "obj": solution.objective,
                         "sol": self.found_courier_path() 
@@ -200,20 +297,98 @@ class MiniZinc_Mangager:
         pass
 
 
+def solver_of_model(model_path):
+    """
+    :param model_path: the file name of the model
+    :return: the MiniZinc solver the model has been written for
+    """
+    solver = model_path.split('-')[-1]
+    if  solver == ' GECODE.mzn':
+        solver = 'gecode'
+    elif solver == ' CHUFFED.mzn':
+        solver = 'chuffed'
+    elif solver == ' ORTOOLS.mzn':
+        solver = 'cp-sat'
+    return solver
+
+
+def solve_instance(inst_num, model_number, time_limit=TIMELIMIT, warm_start=None, gap=None):
+    """
+    Solve a single instance with the given model and time limit.
+    :param warm_start: optional (obj, paths) of a previous solution; only its objective is used, as upper bound
+    :param gap: optional gap target, see MiniZinc_Mangager.solve_instance
+    :return: the result dictionary of the run, without saving it
+    The model is given the presolved instance, see Common/presolve.py.
+    """
+    model_path = MiniZinc_Mangager().get_model_path(model_number)
+    solver = solver_of_model(model_path)
+
+    def solve_reduced_data(data, reduced_warm_start, on_incumbent):
+        minizinc_manager = MiniZinc_Mangager(solver=solver, time_limit=time_limit)
+        model_instance = minizinc_manager.create_model_from_data(path_to_model=model_path, dzn_data=dzn_text(*data))
+        return solve_created_model(minizinc_manager, model_instance, data, reduced_warm_start, gap)
+
+    return solve_reduced("MZN", load_instance(inst_num), solve_reduced_data, warm_start)
+
+
+def solve_created_model(minizinc_manager, model_instance, data, warm_start=None, gap=None, stats=None):
+    """
+    Solve a created model and return its result dictionary, with the best known
+    lower bound, its source and the gap.
+    :param stats: optional dictionary filled with the flattening time
+    """
+    lower_bound = relaxation_bound(*data)
+    if warm_start is not None:
+        minizinc_manager.add_upper_bound(warm_start[0])
+    if gap is not None:
+        minizinc_manager.add_lower_bound(lower_bound)
+    result = minizinc_manager.solve_instance(model_instance=model_instance, gap=gap, lower_bound=lower_bound)
+    if stats is not None and minizinc_manager.flat_time is not None:
+        stats["build_time"] = minizinc_manager.flat_time.total_seconds()
+    sol_dict = minizinc_manager.solution_to_dict(solution=result.solution)
+    # OR-Tools reports the bound it has proven on the objective
+    cp_bound = result.statistics.get("objectiveBound") if result is not None else None
+    for solver_result in sol_dict.values():
+        add_certificate(solver_result, data, cp_bound, "CP objective bound")
+    return sol_dict
+
+
+def solve_data(dzn_data, model_number, time_limit=TIMELIMIT, warm_start=None, search_params=None, gap=None,
+               data=None, stats=None):
+    """
+    Same as solve_instance, for instance data given as a dzn string.
+    :param search_params: optional values of the SEARCH_PARAMETERS of the model
+    :param data: the same instance as (m, n, l, s, D), used for the lower bound
+    :param stats: optional dictionary filled with the flattening time
+    """
+    model_path = MiniZinc_Mangager().get_model_path(model_number)
+    minizinc_manager = MiniZinc_Mangager(solver=solver_of_model(model_path), time_limit=time_limit)
+    if search_params:
+        model_instance = minizinc_manager.create_parametrized_model(path_to_model=model_path, dzn_data=dzn_data,
+                                                                    search_params=search_params)
+    else:
+        model_instance = minizinc_manager.create_model_from_data(path_to_model=model_path, dzn_data=dzn_data)
+    if data is None:
+        if warm_start is not None:
+            minizinc_manager.add_upper_bound(warm_start[0])
+        result = minizinc_manager.solve_instance(model_instance=model_instance)
+        if stats is not None and minizinc_manager.flat_time is not None:
+            stats["build_time"] = minizinc_manager.flat_time.total_seconds()
+        return minizinc_manager.solution_to_dict(solution=result.solution)
+    return solve_created_model(minizinc_manager, model_instance, data, warm_start, gap, stats)
+
+
+def save_result(inst_num, sol_dict):
+    MiniZinc_Mangager().save_to_JSON(sol_dict, filename=inst_num)
+
+
 def project_result_generator(inst_range):
     minizinc_manager = MiniZinc_Mangager()
     for inst_num in range(1, inst_range+1):
         counter = 0
         for model_path_number in ('10', '11', '12'):
             model_path = minizinc_manager.get_model_path(model_path_number)
-
-            solver = model_path.split('-')[-1]
-            if  solver == ' GECODE.mzn':
-                solver = 'gecode'
-            elif solver == ' CHUFFED.mzn':
-                solver = 'chuffed'
-            elif solver == ' ORTOOLS.mzn':
-                solver = 'cp-sat'
+            solver = solver_of_model(model_path)
                 
             minizinc_manager = MiniZinc_Mangager(solver=solver)
             model_instance = minizinc_manager.create_model(path_to_model=model_path, data_instance_num=inst_num)
@@ -222,7 +397,7 @@ def project_result_generator(inst_range):
             minizinc_manager.save_to_JSON(sol_dict, filename=inst_num, parent_path='AllRes', keep_prev=True)
 
 
-def main(instance_method = None):
+def main(instance_method = None, time_limit=TIMELIMIT):
     # Initialization
     if instance_method is None:
         return
@@ -247,13 +422,7 @@ def main(instance_method = None):
     model_number = input_list[1]
 
     model_path = minizinc_manager.get_model_path(model_number)
-    solver = model_path.split('-')[-1]
-    if  solver == ' GECODE.mzn':
-        solver = 'gecode'
-    elif solver == ' CHUFFED.mzn':
-        solver = 'chuffed'
-    elif solver == ' ORTOOLS.mzn':
-        solver = 'cp-sat'
+    solver = solver_of_model(model_path)
 
     if len(input_list[0]) <= 2:
         instance_method = '1'
@@ -266,29 +435,16 @@ def main(instance_method = None):
         instance_number = list(map(int, input_list[0].split(',')))
 
     if instance_method == '1':
-        minizinc_manager = MiniZinc_Mangager(solver=solver)
         print("\nSolving Instance ", instance_number)
-        model_instance = minizinc_manager.create_model(path_to_model=model_path, data_instance_num=instance_number)
-        result = minizinc_manager.solve_instance(model_instance=model_instance)
-        sol_dict = minizinc_manager.solution_to_dict(solution=result.solution)
-        minizinc_manager.save_to_JSON(sol_dict, filename=instance_number)
+        save_result(instance_number, solve_instance(instance_number, model_number, time_limit))
     elif instance_method == '2':
         for inst_num in range(instance_number[0], instance_number[1]+1):
             print("\nSolving Instance ", inst_num)
-            minizinc_manager = MiniZinc_Mangager(solver=solver)
-            model_instance = minizinc_manager.create_model(path_to_model=model_path, data_instance_num=inst_num)
-            result = minizinc_manager.solve_instance(model_instance=model_instance)
-            sol_dict = minizinc_manager.solution_to_dict(solution=result.solution)
-            minizinc_manager.save_to_JSON(sol_dict, filename=inst_num)
+            save_result(inst_num, solve_instance(inst_num, model_number, time_limit))
     elif instance_method == '3':
         for inst_num in instance_number:
             print("\nSolving Instance ", inst_num)
-            minizinc_manager = MiniZinc_Mangager(solver=solver)
-            model_instance = minizinc_manager.create_model(path_to_model=model_path, data_instance_num=inst_num)
-            result = minizinc_manager.solve_instance(model_instance=model_instance)
-            sol_dict = minizinc_manager.solution_to_dict(solution=result.solution)
-            minizinc_manager.save_to_JSON(sol_dict, filename=inst_num)
+            save_result(inst_num, solve_instance(inst_num, model_number, time_limit))
             
 
-main()
 # project_result_generator()
\ No newline at end of file
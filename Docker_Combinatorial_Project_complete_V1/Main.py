@@ -1,7 +1,16 @@
 import argparse
-from MIP.main import main as mip_main
-from SMT.SMT import main as smt_main
-from MZN.Main_MZN import main as mzn_main
+# The backends are imported by the registry only when they are selected
+from Common.registry import BACKENDS
+from Common.budget import run_batch
+from Common.runner import run_job, run_cached, save_job_result, default_time_limit
+from Common.cache import SolveCache
+from Common.journal import RunJournal, run_journaled
+from Common.distributed import run_coordinator
+from Common.selector import auto_jobs
+from Common.instances import N_INSTANCES
+
+AUTO_TIME_LIMIT = 300
+
 
 def process_mzn_input(input_str):
     """
@@ -114,48 +123,113 @@ def validate_instance_input(instance_input):
         except ValueError:
             raise ValueError("Instance must be a number, range (start:end), or 'ALL'")
 
-def run_solver(solver, instance_input):
-    """Run the specified solver with given instance input."""
+def instance_range(instance_part):
+    """Expand 'ALL', 'start:end', 'a,b,c' or a single number into a list of instance numbers."""
+    if instance_part.upper() == 'ALL':
+        return list(range(1, N_INSTANCES + 1))
+    elif ':' in instance_part:
+        start, end = map(int, instance_part.split(':'))
+        return list(range(start, end + 1))
+    elif ',' in instance_part:
+        return list(map(int, instance_part.split(',')))
+    return [int(instance_part)]
+
+
+def build_jobs(solver, instance_input, portfolio_size=1):
+    """
+    Convert the command line input into a list of (backend, instance, option) jobs.
+    """
     if solver == "MIP":
-        mip_args = process_mip_input(instance_input)
-        mip_main(mip_args)
+        li, ui, mip_solver = process_mip_input(instance_input).split(',')
+        mip_solvers = ["cbc", "highs", "gurobi"] if mip_solver == "ALL" else [mip_solver]
+        return [("MIP", instance, name) for instance in range(int(li), int(ui) + 1) for name in mip_solvers]
     
     elif solver == "SMT":
-        smt_main(instance_input)
+        option = None
+        if instance_input.lower().endswith(':race'):
+            option = 'race'
+            instance_input = instance_input[:-len(':race')]
+        return [("SMT", instance, option) for instance in instance_range(instance_input)]
     
     elif solver == "MZN":
-        # Convert the input format for MZN if needed
-        if instance_input and instance_input != 'ALL':
-            # Process the input string to match MZN format
-            mzn_input = process_mzn_input(instance_input)
-            #print(f"Converting MZN input: {instance_input} -> {mzn_input}")
-            mzn_main(mzn_input)
-        else:
-            # Handle 'ALL' case or no input
-            mzn_main(instance_input)
-
+        instance_part, model_number = process_mzn_input(instance_input).split('-')
+        return [("MZN", instance, model_number) for instance in instance_range(instance_part)]
+    
+    elif solver == "CG":
+        return [("CG", instance, None) for instance in instance_range(instance_input)]
+    
+    elif solver == "DP":
+        return [("DP", instance, None) for instance in instance_range(instance_input)]
+    
+    elif solver == 'auto':
+        return auto_jobs(instance_range(instance_input), portfolio_size)
+    
     elif solver == 'all_solvers':
         MIP_input, MZN_input, SMT_input = process_input_for_all_solvers(instance_input)
-        
-        mzn_args = process_mzn_input(MZN_input)
-        mzn_main(mzn_args)
-        
-        mip_args = process_mip_input(MIP_input)
-        mip_main(mip_args)
-        
-        smt_main(SMT_input)
+        return build_jobs("MZN", MZN_input) + build_jobs("MIP", MIP_input) + build_jobs("SMT", SMT_input)
+
+
+def run_jobs(jobs, cache, time_limit=None, journal=None, gap=None):
+    """
+    Run jobs one after the other through the solve cache (if any) and save their results.
+    With a journal, the jobs it marks as done are skipped and the progress of the others is recorded.
+    With a gap target, every job stops as soon as its incumbent is within it of a lower bound.
+    """
+    if journal is not None:
+        journal.add_jobs(jobs)
+    for job in jobs:
+        if journal is not None and journal.is_done(job):
+            print(f"\n{job}: already done, skipping")
+            continue
+        limit = time_limit or default_time_limit(job[0])
+        if journal is not None:
+            result = run_journaled(job, limit, journal, cache, gap=gap)
+        elif cache is not None:
+            result = run_cached(job, limit, cache, gap=gap)
+        else:
+            result = run_job(job, limit, gap=gap)
+        save_job_result(job, result, limit)
+        if journal is not None:
+            journal.mark_done(job, result)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Multi-Courier Problem Solver')
-    parser.add_argument('solver', choices=['MIP', 'SMT', 'MZN', 'all_solvers'], 
-                      help='Solver to use (MIP, SMT, MZN, or all_solvers)')
+    backends_help = '. '.join(f'For {name}: {backend.syntax}' for name, backend in BACKENDS.items())
+    parser.add_argument('solver', choices=list(BACKENDS) + ['all_solvers', 'auto'], 
+                      help=f'Solver to use ({", ".join(BACKENDS)}, all_solvers, or auto to pick the most '
+                           'promising backend and model of each instance from the stored benchmarks)')
     parser.add_argument('instance', nargs='?', default='ALL',
                       help='Instance number, range (e.g., 2:5), or ALL. '
-                           'For MZN: accepts format like "3:5:model_2" or "4:model_1". '
+                           f'{backends_help}. '
                            'For all_solvers: use format "start:end:solver:model" (e.g., "1:5:cbc:model_01") '
                            'or "instance:solver:model" (e.g., "2:cbc:model_02")')   
+    parser.add_argument('--budget', type=float, default=None,
+                      help='Total wall-clock budget in seconds for the whole batch. '
+                           'Per-instance time limits are assigned from the predicted difficulty '
+                           'and the time left over is reused for unproven instances')
+    parser.add_argument('--portfolio', type=int, default=1,
+                      help='For auto: number of configurations run on each instance')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Solve everything from scratch without reading or writing the solve cache')
+    parser.add_argument('--clear-cache', action='store_true',
+                      help='Remove all the cached results before running')
+    parser.add_argument('--resume', action='store_true',
+                      help='Resume the previous batch from its run journal: jobs already done are skipped '
+                           'and interrupted ones restart from their last incumbent')
+    parser.add_argument('--gap-rel', type=float, default=None,
+                      help='Stop every run once (obj - lower bound) / obj is at most this value, e.g. 0.05')
+    parser.add_argument('--gap-abs', type=float, default=None,
+                      help='Stop every run once obj - lower bound is at most this value')
+    parser.add_argument('--queue', default=None,
+                      help='Distributed mode: SQLite file on a shared volume the jobs are put in, to be solved '
+                           'by workers started with "python3 -m Common.distributed worker <queue>" on any host')
+    parser.add_argument('--local-workers', type=int, default=0,
+                      help='With --queue: number of workers to start on this host')
     args = parser.parse_args()
+    gap = None
+    if args.gap_rel is not None or args.gap_abs is not None:
+        gap = {"rel": args.gap_rel, "abs": args.gap_abs}
     
     try:
         # Skip validation for MZN and all_solvers as they have different input formats
@@ -164,8 +238,27 @@ def main():
         else:
             instance_input = args.instance
 
+        cache = None
+        if not args.no_cache:
+            cache = SolveCache()
+            if args.clear_cache:
+                cache.clear()
+            removed = cache.invalidate_stale()
+            if removed:
+                print(f"Removed {removed} cached results of models that have changed")
+
+        journal = RunJournal(resume=args.resume)
+
         print(f"Running {args.solver} solver...")
-        run_solver(args.solver, instance_input)
+        jobs = build_jobs(args.solver, instance_input, args.portfolio)
+        if args.queue is not None:
+            time_limit = AUTO_TIME_LIMIT if args.solver == 'auto' else None
+            run_coordinator(jobs, args.queue, time_limit, gap, resume=args.resume, local_workers=args.local_workers)
+        elif args.budget is not None:
+            run_batch(jobs, args.budget, cache=cache, journal=journal, gap=gap)
+        else:
+            time_limit = AUTO_TIME_LIMIT if args.solver == 'auto' else None
+            run_jobs(jobs, cache, time_limit, journal, gap)
 
     except ValueError as e:
         print(f"Error: {e}")
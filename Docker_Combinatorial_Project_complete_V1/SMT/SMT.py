@@ -1,7 +1,59 @@
 from z3 import *
 import os
+from contextlib import contextmanager
 import time
 import json
+import multiprocessing
+import queue as queue_module
+from Common.decoder import arcs_from_z3, decode_arcs, route_items, route_loads
+from Common.bounds import relaxation_bound, gap_reached, add_certificate, RELAXATION
+from Common.shared import SharedInstance, attach
+from Common.presolve import solve_reduced
+from Common.cache import instance_hash
+
+# Diverse Z3 configurations raced against each other by solve_mcp_race.
+# Each entry sets global parameters (seeds, arithmetic solver), Optimize
+# parameters (engines) and an optional chain of preprocessing tactics
+# applied to the assertions before search.
+RACE_CONFIGS = [
+    {"name": "maxres-seed0",     "global": {"smt.random_seed": 0, "sat.random_seed": 0},
+     "opt": {"maxsat_engine": "maxres"}, "tactics": []},
+    {"name": "relevancy0-seed1", "global": {"smt.random_seed": 1, "sat.random_seed": 1, "smt.relevancy": 0},
+     "opt": {"maxsat_engine": "maxres"}, "tactics": []},
+    {"name": "arith2-seed2",     "global": {"smt.random_seed": 2, "sat.random_seed": 2, "smt.arith.solver": 2},
+     "opt": {"maxsat_engine": "maxres"}, "tactics": []},
+    {"name": "symba-simplify",   "global": {"smt.random_seed": 3, "sat.random_seed": 3},
+     "opt": {"optsmt_engine": "symba"}, "tactics": ["simplify", "propagate-values"]},
+    {"name": "core-maxres-seed4", "global": {"smt.random_seed": 4, "sat.random_seed": 4},
+     "opt": {"maxsat_engine": "maxres", "maxres.hill_climb": True}, "tactics": ["simplify"]},
+    {"name": "arith6-ctx",       "global": {"smt.random_seed": 5, "sat.random_seed": 5, "smt.arith.solver": 6},
+     "opt": {"maxsat_engine": "maxres"}, "tactics": ["simplify", "propagate-values", "ctx-simplify"]},
+    {"name": "phase5-seed6",     "global": {"smt.random_seed": 6, "sat.random_seed": 6, "smt.phase_selection": 5},
+     "opt": {"maxsat_engine": "maxres"}, "tactics": []},
+    {"name": "basic-seed7",      "global": {"smt.random_seed": 7, "sat.random_seed": 7},
+     "opt": {"optsmt_engine": "basic"}, "tactics": ["simplify", "propagate-values"]},
+]
+
+# Share of the time limit spent on bound probes when a gap target is given
+PROBE_SHARE = 0.1
+
+# Tactic pipelines of the bounded-objective probes (max_route_length <= b).
+# The last tactic is the search engine, the others preprocess the assertions
+# together with the probed bound. For the "sat" engine the goal is encoded
+# down to propositional logic: the objective, whose range is too wide for
+# lia2card, is first replaced by its binary expansion over 0..b (see
+# binary_objective), the MTZ u in 0..n are turned into cardinality
+# constraints by lia2card, and the route lengths, sums of If(x, D, 0), into
+# pseudo-Boolean ones, which card2bv and bit-blast reduce to clauses.
+PROBE_PIPELINES = {
+    "smt":       ["smt"],
+    "simplify":  ["simplify", "propagate-values", "solve-eqs", "smt"],
+    "bit-blast": ["simplify", "propagate-values", "solve-eqs", "lia2card", "card2bv", "bit-blast", "sat"],
+}
+
+# Preprocessed probe goals, by (instance hash, bound, pipeline)
+PREPROCESSED_GOALS = {}
+PREPROCESSED_GOALS_SIZE = 64
 
 def create_mcp_solver(m, n, l, s, D):
     solver = Optimize()
@@ -71,10 +123,218 @@ def create_mcp_solver(m, n, l, s, D):
     solver.minimize(max_route_length)
     return solver, x, u, max_route_length
 
-def solve_mcp(m, n, l, s, D, json_filename, results_path):
+def extract_courier_paths(model, x, m, n, l, s, verbose=True):
+    """
+    Read the arcs of a Z3 model in bulk and return the visited items
+    (1-indexed) for each courier.
+    """
+    routes, ends, repeated = decode_arcs(arcs_from_z3(model, m, n))
+    loads = route_loads(routes, s)
+    
+    courier_paths = []
+    for i, path in enumerate(route_items(routes)):
+        if path:
+            if verbose:
+                print(f"Courier {i+1}: o -> {' -> '.join(map(str, path))} -> o")
+                print(f"Total load: {loads[i]}/{l[i]}")
+            courier_paths.append(path)
+    return courier_paths
+
+def save_json_output(json_output, json_filename, results_path):
+    output_filename = os.path.join(results_path, json_filename)
+    with open(output_filename, 'w') as f:
+        json.dump(json_output, f, indent=4)
+    
+    print(f"\nJSON output saved to {output_filename}")
+
+def apply_warm_start(solver, x, max_route_length, n, warm_start):
+    """
+    Bound the objective with a previous solution and suggest its arcs as
+    initial values of the search.
+    warm_start is (obj, paths) with paths in the JSON output format.
+    """
+    obj, paths = warm_start
+    solver.add(max_route_length <= obj)
+    for i, path in enumerate(paths):
+        points = [n] + [k - 1 for k in path] + [n]
+        for j, k in zip(points, points[1:]):
+            solver.set_initial_value(x[i][j][k], True)
+
+def binary_objective(objective, bound):
+    """
+    The objective as a sum of bits covering 0..bound. Substituted for the
+    objective integer, it leaves only pseudo-Boolean constraints on it, and
+    the probe is unchanged since the objective of a route is never negative.
+    """
+    bits = [Bool(f"{objective}_bit_{i}") for i in range(max(1, int(bound).bit_length()))]
+    return Sum([If(bit, 2 ** i, 0) for i, bit in enumerate(bits)])
+
+def preprocessed_goal(assertions, objective, bound, tactics, key, timeout):
+    """
+    Apply the preprocessing tactics of a pipeline (all but its last tactic) to
+    the assertions with objective <= bound.
+    Goals are cached per instance key, bound and pipeline, so that repeated
+    probes of the same instance (e.g. by the tuner or the scaling study) only
+    preprocess once.
+    :return: (subgoals, preprocessing time, cached)
+    """
+    cache_key = (key, bound, tuple(tactics))
+    if cache_key in PREPROCESSED_GOALS:
+        subgoals, preprocess_time = PREPROCESSED_GOALS[cache_key]
+        return subgoals, preprocess_time, True
+    start_time = time.time()
+    goal = Goal()
+    if tactics[-1] == "sat":
+        encoded = binary_objective(objective, bound)
+        goal.add([substitute(assertion, (objective, encoded)) for assertion in assertions])
+        goal.add(encoded <= bound)
+    else:
+        goal.add(assertions)
+        goal.add(objective <= bound)
+    tactics = tactics[:-1]
+    if tactics:
+        pipeline = Then(*tactics) if len(tactics) > 1 else Tactic(tactics[0])
+        subgoals = list(TryFor(pipeline, max(1, int(timeout * 1000)))(goal))
+    else:
+        subgoals = [goal]
+    preprocess_time = time.time() - start_time
+    if len(PREPROCESSED_GOALS) >= PREPROCESSED_GOALS_SIZE:
+        PREPROCESSED_GOALS.pop(next(iter(PREPROCESSED_GOALS)))
+    PREPROCESSED_GOALS[cache_key] = (subgoals, preprocess_time)
+    return subgoals, preprocess_time, False
+
+def probe_bound(assertions, objective, bound, tactics, key, timeout, stats=None):
+    """
+    Decide whether objective <= bound is satisfiable with a tactic pipeline,
+    see PROBE_PIPELINES. Preprocessing and search times are added to stats.
+    :return: sat, unsat or unknown
+    """
+    start_time = time.time()
+    result = unknown
+    cached, preprocess_time, search_start = False, 0, None
+    try:
+        subgoals, preprocess_time, cached = preprocessed_goal(assertions, objective, bound, tactics, key, timeout)
+        # the search tactic runs on the goals directly: turning thousands of
+        # bit-blasted formulas back into a solver is slower than the search itself
+        search_start = time.time()
+        remaining = timeout - (search_start - start_time)
+        if remaining > 0:
+            decided = [subgoal for goal in subgoals
+                       for subgoal in TryFor(Tactic(tactics[-1]), max(1, int(remaining * 1000)))(goal)]
+            if any(len(goal) == 0 for goal in decided):
+                result = sat
+            elif all(goal.inconsistent() for goal in decided):
+                result = unsat
+    except Z3Exception:
+        print(f"Probe {bound}: no answer within {timeout:.1f}s")
+    search_time = time.time() - search_start if search_start is not None else 0
+    if stats is not None:
+        # a cached goal costs no preprocessing in this probe
+        stats["probe_preprocess_time"] = stats.get("probe_preprocess_time", 0) + (0 if cached else preprocess_time)
+        stats["probe_search_time"] = stats.get("probe_search_time", 0) + search_time
+        stats.setdefault("probes", []).append({"bound": bound, "result": str(result), "cached": cached,
+                                               "preprocess_time": round(preprocess_time, 3),
+                                               "search_time": round(search_time, 3)})
+    return result
+
+def probe_lower_bound(solver, max_route_length, low, high, timeout, tactics=None, key=None, stats=None):
+    """
+    Raise a lower bound of the objective with bounded satisfiability probes:
+    if max_route_length <= b is unsatisfiable, b+1 is a lower bound.
+    The probed value moves up with growing steps, and the search stops at the
+    first satisfiable probe at the bound or when the time runs out.
+    tactics - optional probe pipeline, a list of tactic names or a PROBE_PIPELINES
+              name; without it the probes are incremental checks of a plain solver
+    key - instance key of the preprocessed goals cache, e.g. its instance_hash
+    stats - optional dictionary filled with the preprocessing and search times
+    """
+    if isinstance(tactics, str):
+        tactics = PROBE_PIPELINES[tactics]
+    if tactics:
+        assertions = solver.assertions()
+    else:
+        probe = Solver()
+        probe.add(solver.assertions())
+    deadline = time.time() + timeout
+    step = 1
+    while low < high:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        candidate = min(low + step - 1, high - 1)
+        if tactics:
+            result = probe_bound(assertions, max_route_length, candidate, tactics, key, remaining, stats)
+        else:
+            search_start = time.time()
+            probe.push()
+            probe.add(max_route_length <= candidate)
+            probe.set("timeout", int(remaining * 1000))
+            result = probe.check()
+            probe.pop()
+            if stats is not None:
+                stats["probe_search_time"] = stats.get("probe_search_time", 0) + time.time() - search_start
+        if result == unsat:
+            low = candidate + 1
+            step *= 2
+        elif step > 1:
+            step = 1  # try again right above the bound
+        else:
+            break
+    return low
+
+def compare_probe_pipelines(m, n, l, s, D, bounds, pipelines=None, timeout=60):
+    """
+    Probe the same bounds with several tactic pipelines and report the
+    preprocessing and search time of each, to find the pipelines that make
+    an instance tractable.
+    pipelines - names of PROBE_PIPELINES, all of them by default
+    :return: {pipeline: list of probe records}
+    """
+    solver, x, u, max_route_length = create_mcp_solver(m, n, l, s, D)
+    key = instance_hash(m, n, l, s, D)
+    records = {}
+    for name in pipelines or PROBE_PIPELINES:
+        stats = {}
+        for bound in bounds:
+            probe_bound(solver.assertions(), max_route_length, bound, PROBE_PIPELINES[name], key, timeout, stats)
+        records[name] = stats["probes"]
+        for record in stats["probes"]:
+            print(f"{name:>10}  bound {record['bound']:>5}  {record['result']:>7}  "
+                  f"preprocess {record['preprocess_time']:8.3f}s  search {record['search_time']:8.3f}s")
+    return records
+
+@contextmanager
+def global_params(params):
+    """
+    Set global Z3 parameters for the duration of the block only, so that the
+    configuration of one job does not leak into the next ones of the process.
+    """
+    previous = {param: get_param(param) for param in params}
+    for param, param_value in params.items():
+        set_param(param, param_value)
+    try:
+        yield
+    finally:
+        for param, param_value in previous.items():
+            set_param(param, param_value)
+
+def solve_mcp(m, n, l, s, D, json_filename, results_path, timeout=300, warm_start=None, stats=None,
+              on_incumbent=None, config=None, gap=None):
+    """
+    config - optional Z3 configuration with the same keys as the RACE_CONFIGS
+             entries ("global", "opt", "tactics"), e.g. a tuned one, and an
+             optional "probe_tactics" pipeline of the bound probes, see PROBE_PIPELINES;
+             its global parameters are restored once the instance is solved
+    gap - optional gap target {"rel": ..., "abs": ...}: the search stops as soon as
+          the incumbent is within it of the lower bound
+    """
+    with global_params((config or {}).get("global", {})):
+        return search_mcp(m, n, l, s, D, json_filename, results_path, timeout, warm_start, stats, on_incumbent,
+                          config, gap)
+
+def search_mcp(m, n, l, s, D, json_filename, results_path, timeout, warm_start, stats, on_incumbent, config, gap):
     print("\nSolving MCP instance...")
     
-    timeout = 300  # 5 minutes timeout
     start_time = time.time()
     
     # Track the best solution found
@@ -82,8 +342,32 @@ def solve_mcp(m, n, l, s, D, json_filename, results_path):
     best_max_route = None
     
     solver, x, u, max_route_length = create_mcp_solver(m, n, l, s, D)
-    solver.set("timeout", timeout * 1000)
+    if config is not None:
+        solver = preprocess_solver(solver, max_route_length, config.get("tactics", []))
+    if stats is not None:
+        stats["build_time"] = time.time() - start_time
+    lower_bound, bound_source = relaxation_bound(m, n, l, s, D), RELAXATION
+    if gap is not None:
+        high = warm_start[0] if warm_start is not None else sum(map(sum, D))
+        probe_stats = {}
+        probed = probe_lower_bound(solver, max_route_length, lower_bound, high, PROBE_SHARE * timeout,
+                                   tactics=(config or {}).get("probe_tactics"),
+                                   key=instance_hash(m, n, l, s, D), stats=probe_stats)
+        if probed > lower_bound:
+            lower_bound, bound_source = probed, "SMT bound probes"
+        print(f"Lower bound: {lower_bound} ({bound_source}), probes: "
+              f"preprocessing {probe_stats.get('probe_preprocess_time', 0):.2f}s, "
+              f"search {probe_stats.get('probe_search_time', 0):.2f}s")
+        if stats is not None:
+            stats.update(probe_stats)
+    
+    solver.set("timeout", max(1, int((timeout - (time.time() - start_time)) * 1000)))
     solver.set("maxsat_engine", "maxres")
+    if config is not None:
+        for param, param_value in config.get("opt", {}).items():
+            solver.set(param, param_value)
+    if warm_start is not None:
+        apply_warm_start(solver, x, max_route_length, n, warm_start)
     
     # Callback to track solutions as they're found
     def on_model(m):
@@ -92,6 +376,11 @@ def solve_mcp(m, n, l, s, D, json_filename, results_path):
         print(f"Found solution with max route length: {current_route}")
         best_solution = m
         best_max_route = current_route
+        if on_incumbent is not None:
+            on_incumbent(current_route, extract_courier_paths(m, x, len(l), n, l, s, verbose=False))
+        if gap_reached(current_route, lower_bound, gap):
+            print(f"Gap target reached (lower bound {lower_bound})")
+            main_ctx().interrupt()
     
     solver.set_on_model(on_model)
     
@@ -100,9 +389,10 @@ def solve_mcp(m, n, l, s, D, json_filename, results_path):
     
     print(f"Solution time: {solve_time:.2f} seconds")
     
+    # Optimize only answers sat once the objective is proven optimal
     json_output = {
         "time": round(solve_time, 2),
-        "optimal": solve_time < timeout,
+        "optimal": result == sat,
         "obj": None,
         "sol": []
     }
@@ -111,41 +401,12 @@ def solve_mcp(m, n, l, s, D, json_filename, results_path):
         model = best_solution
         max_route = best_max_route
         
-        if solve_time >= timeout:
-            print("WARNING: Solution is not optimal (timeout reached)")
+        if result != sat:
+            print("WARNING: Solution is not proven optimal")
         print(f"\nBest maximum route length found: {max_route}")
         
         json_output["obj"] = max_route
-        courier_paths = []
-        
-        for i in range(m):
-            tour = []
-            current = n
-            total_load = 0
-            path = []
-            
-            while True:
-                next_point = None
-                for k in range(n+1):
-                    if k != current and model.evaluate(x[i][current][k]):
-                        next_point = k
-                        if k != n:
-                            total_load += s[k]
-                            path.append(k + 1)
-                        break
-                
-                if next_point == n:
-                    break
-                elif next_point is not None:
-                    tour.append(str(next_point + 1))
-                    current = next_point
-                else:
-                    break
-            
-            if tour:
-                print(f"Courier {i+1}: o -> {' -> '.join(tour)} -> o")
-                print(f"Total load: {total_load}/{l[i]}")
-                courier_paths.append(path)
+        courier_paths = extract_courier_paths(model, x, m, n, l, s)
         
         json_output["sol"] = courier_paths
     
@@ -153,13 +414,165 @@ def solve_mcp(m, n, l, s, D, json_filename, results_path):
         print(f"Solver timed out after {timeout} seconds without finding a solution")
     else:
         print("No solution exists")
+    add_certificate(json_output, (m, n, l, s, D), lower_bound, bound_source)
     
     # Save JSON output
-    output_filename = os.path.join(results_path, json_filename)
-    with open(output_filename, 'w') as f:
-        json.dump(json_output, f, indent=4)
+    if results_path is not None:
+        save_json_output(json_output, json_filename, results_path)
+    return json_output
+
+def preprocess_solver(solver, objective, tactics):
+    """
+    Run the assertions of an Optimize instance through a chain of Z3 tactics
+    and return a fresh Optimize holding the simplified formulas.
+    Only equivalence-preserving tactics that keep the decision variables should
+    be used here, since the routes are read back from the x variables.
+    """
+    if not tactics:
+        return solver
+    goal = Goal()
+    goal.add(solver.assertions())
+    pipeline = Then(*tactics) if len(tactics) > 1 else Tactic(tactics[0])
+    preprocessed = Optimize()
+    for subgoal in pipeline(goal):
+        preprocessed.add(subgoal.as_expr())
+    preprocessed.minimize(objective)
+    return preprocessed
+
+def race_worker(config, handle, timeout, results_queue, warm_start=None):
+    """
+    Solve the instance with a single race configuration, streaming every
+    improving model back to the parent through results_queue.
+    handle - the instance published by the parent in shared memory (Common/shared.py)
+    """
+    with attach(handle) as (m, n, l, s, D):
+        # the Z3 terms need Python integers, read once from the shared matrix
+        D = [list(map(int, row)) for row in D]
+    name = config["name"]
+    for param, param_value in config["global"].items():
+        set_param(param, param_value)
     
-    print(f"\nJSON output saved to {output_filename}")
+    build_start = time.time()
+    solver, x, u, max_route_length = create_mcp_solver(m, n, l, s, D)
+    solver = preprocess_solver(solver, max_route_length, config["tactics"])
+    results_queue.put(("built", name, time.time() - build_start, None))
+    solver.set("timeout", int(timeout * 1000))
+    for param, param_value in config["opt"].items():
+        solver.set(param, param_value)
+    if warm_start is not None:
+        apply_warm_start(solver, x, max_route_length, n, warm_start)
+    
+    def on_model(model):
+        current_route = model.eval(max_route_length, model_completion=True).as_long()
+        paths = extract_courier_paths(model, x, m, n, l, s, verbose=False)
+        results_queue.put(("incumbent", name, current_route, paths))
+    
+    solver.set_on_model(on_model)
+    result = solver.check()
+    
+    if result == sat:
+        # Optimize only answers sat once the objective is proven optimal
+        model = solver.model()
+        current_route = model.eval(max_route_length, model_completion=True).as_long()
+        paths = extract_courier_paths(model, x, m, n, l, s, verbose=False)
+        results_queue.put(("optimal", name, current_route, paths))
+    else:
+        results_queue.put(("done", name, str(result), None))
+
+def solve_mcp_race(m, n, l, s, D, json_filename, results_path, workers=None, timeout=300, warm_start=None,
+                   stats=None, on_incumbent=None, gap=None):
+    """
+    Race several diverse Z3 configurations in separate processes.
+    The best incumbent reported by any of them is kept, and all of them are
+    stopped as soon as one proves optimality or the incumbent reaches the gap target.
+    stats - optional dictionary filled with the build time of the slowest configuration
+    """
+    lower_bound = relaxation_bound(m, n, l, s, D)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    configs = RACE_CONFIGS[:max(1, min(workers, len(RACE_CONFIGS)))]
+    print(f"\nRacing {len(configs)} Z3 configurations on MCP instance...")
+    
+    start_time = time.time()
+    results_queue = multiprocessing.Queue()
+    # the distance matrix is published once for all the workers instead of being pickled into each of them
+    with SharedInstance((m, n, l, s, D)) as shared:
+        processes = {}
+        for config in configs:
+            process = multiprocessing.Process(target=race_worker,
+                                              args=(config, shared.handle, timeout, results_queue, warm_start))
+            process.start()
+            processes[config["name"]] = process
+    
+        best_max_route = None
+        best_paths = []
+        winner = None
+        optimal = False
+        gap_stop = False
+        finished = set()
+    
+        while len(finished) < len(processes):
+            remaining = timeout - (time.time() - start_time)
+            if remaining <= 0:
+                break
+            try:
+                kind, name, value, paths = results_queue.get(timeout=min(remaining, 1.0))
+            except queue_module.Empty:
+                # A worker killed by the OS (e.g. out of memory) never reports back
+                for name, process in processes.items():
+                    if not process.is_alive() and name not in finished and process.exitcode != 0:
+                        print(f"Configuration {name} exited with code {process.exitcode}")
+                        finished.add(name)
+                continue
+        
+            if kind == "built":
+                if stats is not None:
+                    stats["build_time"] = max(stats.get("build_time", 0), value)
+                continue
+
+            if kind in ("incumbent", "optimal") and (best_max_route is None or value < best_max_route):
+                best_max_route = value
+                best_paths = paths
+                winner = name
+                print(f"[{name}] Found solution with max route length: {value}")
+                if on_incumbent is not None:
+                    on_incumbent(value, paths)
+                if gap_reached(value, lower_bound, gap):
+                    print(f"Gap target reached (lower bound {lower_bound})")
+                    gap_stop = True
+                    break
+        
+            if kind == "optimal":
+                optimal = True
+                break
+            if kind == "done":
+                finished.add(name)
+    
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+    
+    solve_time = time.time() - start_time
+    print(f"Solution time: {solve_time:.2f} seconds")
+    
+    json_output = {
+        "time": round(solve_time, 2) if optimal or gap_stop else timeout,
+        "optimal": optimal,
+        "obj": best_max_route,
+        "sol": best_paths
+    }
+    add_certificate(json_output, (m, n, l, s, D))
+    
+    if best_max_route is None:
+        print(f"No configuration found a solution within {timeout} seconds")
+    else:
+        if not optimal:
+            print("WARNING: Solution is not optimal (" + ("gap target reached)" if gap_stop else "timeout reached)"))
+        print(f"\nBest maximum route length found: {best_max_route} (by {winner})")
+    
+    if results_path is not None:
+        save_json_output(json_output, json_filename, results_path)
     return json_output
 
 def read_instance(file_path):
@@ -179,14 +592,46 @@ def read_instance(file_path):
         print(f"Error reading file: {str(e)}")
         raise
 
-def main(input_choice):
+INSTANCES_PATH = "/app/instances/dat_instances"
+RESULTS_PATH = "/app/res/SMT"
+
+def solve_instance(instance_num, time_limit=300, race=False, warm_start=None, gap=None):
+    """
+    Solve a single instance with the given time limit and return the JSON
+    output without saving it.
+    warm_start - optional (obj, paths) of a previous solution
+    gap - optional gap target, see solve_mcp
+    The model is built on the presolved instance, see Common/presolve.py.
+    """
+    def solve_reduced_data(data, reduced_warm_start, on_incumbent):
+        m, n, l, s, D = data
+        D = [list(map(int, row)) for row in D]
+        if race:
+            return solve_mcp_race(m, n, l, s, D, None, None, timeout=time_limit, warm_start=reduced_warm_start,
+                                  gap=gap)
+        return solve_mcp(m, n, l, s, D, None, None, timeout=time_limit, warm_start=reduced_warm_start, gap=gap)
+
+    data = read_instance(os.path.join(INSTANCES_PATH, f"inst{instance_num:02d}.dat"))
+    return solve_reduced("SMT", data, solve_reduced_data, warm_start)
+
+def save_result(instance_num, json_output):
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    save_json_output(json_output, f"{instance_num:02d}.json", RESULTS_PATH)
+
+def main(input_choice, time_limit=300):
     # Set specific paths
-    instances_path = "/app/instances/dat_instances"
-    results_path = "/app/res/SMT"
+    instances_path = INSTANCES_PATH
+    results_path = RESULTS_PATH
     
     # Ensure the solutions directory exists
     os.makedirs(results_path, exist_ok=True)
     
+    # An optional trailing ":race" selects the parallel configuration race
+    race = False
+    if input_choice.lower().endswith(':race'):
+        race = True
+        input_choice = input_choice[:-len(':race')]
+    
     # Determine which instances to process
     if input_choice.upper() == 'ALL':
         instance_numbers = range(1, 22)  # Assuming 21 instances
@@ -203,9 +648,7 @@ def main(input_choice):
         
         if os.path.exists(file_path):
             try:
-                m, n, l, s, D = read_instance(file_path)
-                json_filename = f"{instance_num:02d}.json"
-                solve_mcp(m, n, l, s, D, json_filename, results_path)
+                save_result(instance_num, solve_instance(instance_num, time_limit, race=race))
             except Exception as e:
                 print(f"Failed to process instance {filename}: {str(e)}")
         else:
@@ -213,8 +656,10 @@ def main(input_choice):
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1:
-        user_input = sys.argv[1]
+    if len(sys.argv) > 3 and sys.argv[1] == "probes":
+        # probes <instance> <bound,bound,...> [pipeline,pipeline,...]
+        compare_probe_pipelines(*read_instance(os.path.join(INSTANCES_PATH, f"inst{int(sys.argv[2]):02d}.dat")),
+                                [int(bound) for bound in sys.argv[3].split(",")],
+                                sys.argv[4].split(",") if len(sys.argv) > 4 else None)
     else:
-        user_input = "1"
-    main(user_input)
\ No newline at end of file
+        main(sys.argv[1] if len(sys.argv) > 1 else "1")
\ No newline at end of file
@@ -0,0 +1 @@
+# Makes the Common, MIP and SMT packages importable from the tests, as in the container
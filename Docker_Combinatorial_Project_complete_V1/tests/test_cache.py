@@ -0,0 +1,42 @@
+import os
+
+import Common.cache as cache
+import Common.registry as registry
+import Common.runner as runner
+from Common.cache import SolveCache, cache_key, model_files
+
+APP = os.path.join(os.path.dirname(__file__), "..")
+DATA = (1, 2, [5], [1, 1], [[0, 2, 3], [2, 0, 4], [3, 4, 0]])
+JOB = ("DP", 1, None)
+
+
+def use_repository_files(monkeypatch):
+    monkeypatch.setattr(registry, "APP_PATH", APP)
+    monkeypatch.setattr(cache, "APP_PATH", APP)
+
+
+def test_model_files_include_shared_modules(monkeypatch):
+    use_repository_files(monkeypatch)
+    names = [os.path.relpath(path, APP) for path in model_files(JOB)]
+    assert names[0] == os.path.join("Common", "exact_dp.py")
+    for name in ["presolve.py", "decoder.py", "bounds.py", "evaluator.py"]:
+        assert os.path.join("Common", name) in names
+    assert all(os.path.exists(path) for path in model_files(JOB))
+
+
+def test_run_cached_keys_on_params_and_gap(monkeypatch, tmp_path):
+    use_repository_files(monkeypatch)
+    result = {"time": 1, "optimal": True, "obj": 9, "sol": [[1, 2]]}
+    runs = []
+    monkeypatch.setattr(runner, "load_instance", lambda instance: DATA)
+    monkeypatch.setattr(runner, "tuned_params", lambda backend, option, data: None)
+    monkeypatch.setattr(runner, "run_job", lambda job, *args: runs.append(args) or result)
+    solve_cache = SolveCache(str(tmp_path))
+
+    runner.run_cached(JOB, 10, solve_cache, gap={"rel": 0.1})
+    runner.run_cached(JOB, 10, solve_cache, gap={"rel": 0.1})
+    assert len(runs) == 1
+    runner.run_cached(JOB, 10, solve_cache)
+    assert len(runs) == 2
+    assert solve_cache.lookup(JOB, DATA, {"params": None, "gap": None})["obj"] == 9
+    assert cache_key(JOB, DATA, {"params": {"x": 1}, "gap": None}) != cache_key(JOB, DATA, {"params": None, "gap": None})
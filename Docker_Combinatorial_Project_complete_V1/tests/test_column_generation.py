@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+
+import MIP.column_generation as column_generation
+from Common.exact_dp import solve_data as exact_dp
+
+
+def instance(seed, n=8, m=3):
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, 30, size=(n + 1, 2))
+    D = np.abs(points[:, None] - points[None]).sum(axis=2)
+    s = rng.integers(1, 5, size=n).tolist()
+    return m, n, [sum(s) // 2] * m, s, D
+
+
+@pytest.mark.parametrize("seed", [0, 2, 6, 18])
+def test_bound_and_objective_match_the_exact_optimum(seed, tmp_path):
+    data = instance(seed)
+    optimum = exact_dp(data)["obj"]
+    result = column_generation.solve_data(data, 30, pool_path=str(tmp_path))
+    assert result["bound"] <= optimum == result["obj"]
+
+
+def test_unchanged_pool_is_not_rewritten(tmp_path):
+    data = instance(0)
+    column_generation.solve_data(data, 30, pool_path=str(tmp_path))
+    pool_file = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    os.utime(pool_file, (0, 0))
+    routes = column_generation.load_pool(data[4], str(tmp_path))
+    distances = {route: column_generation.route_length(route, data[4]) for route in routes}
+    column_generation.save_pool(data[4], set(routes), distances, str(tmp_path))
+    assert os.path.getmtime(pool_file) == 0
+    new_route = (2, 0, 1)
+    assert new_route not in routes
+    distances[new_route] = column_generation.route_length(new_route, data[4])
+    column_generation.save_pool(data[4], set(routes) | {new_route}, distances, str(tmp_path))
+    assert os.path.getmtime(pool_file) > 0
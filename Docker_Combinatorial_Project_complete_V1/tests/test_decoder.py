@@ -0,0 +1,25 @@
+import numpy as np
+
+from Common.decoder import decode_successors, END_DEPOT, END_SUBTOUR
+
+
+def test_single_route_serving_all_items():
+    # depot is point 2: 2 -> 0 -> 1 -> 2
+    routes, ends, repeated = decode_successors(np.array([[1, 2, 0]]))
+    assert routes.tolist() == [[0, 1]]
+    assert ends.tolist() == [END_DEPOT]
+
+
+def test_subtour_after_all_items():
+    routes, ends, repeated = decode_successors(np.array([[1, 0, 0]]))
+    assert routes.tolist() == [[0, 1]]
+    assert ends.tolist() == [END_SUBTOUR]
+    assert repeated.tolist() == [0]
+
+
+def test_smt_single_courier():
+    from SMT.SMT import solve_mcp
+    D = [[0, 2, 3], [2, 0, 4], [3, 4, 0]]
+    result = solve_mcp(1, 2, [5], [1, 1], D, None, None, timeout=30)
+    assert result["obj"] == 9
+    assert sorted(result["sol"][0]) == [1, 2]
@@ -0,0 +1,72 @@
+import numpy as np
+
+import Common.runner as runner
+from Common.delta import apply_patch, repair, resolve
+from Common.evaluator import evaluate
+from Common.decoder import pad_routes
+
+# items 0..5 on a line, the depot (point 6) at the origin
+POSITIONS = [1, 2, 3, 4, 5, 6, 0]
+D = [[abs(a - b) for b in POSITIONS] for a in POSITIONS]
+DATA = (3, 6, [6, 6, 6], [2, 2, 2, 2, 2, 2], D)
+ROUTES = [[0, 1], [2, 3], [4, 5]]
+
+
+def assert_feasible(result):
+    evaluation = evaluate(pad_routes(result["routes"]), result["data"])
+    assert evaluation["feasible"][0]
+    assert result["obj"] == int(evaluation["obj"][0])
+
+
+def test_remove_item():
+    result = resolve(DATA, ROUTES, {"remove_items": [4]})
+    assert_feasible(result)
+    assert result["data"][1] == 5
+    assert result["touched"] == [1]
+    assert result["routes"] == [[0, 1], [2], [3, 4]]
+
+
+def test_capacity_cut_evicts_items():
+    result = resolve(DATA, ROUTES, {"capacities": {"3": 2}})
+    assert_feasible(result)
+    assert len(result["routes"][2]) == 1
+    # the evicted item goes to the courier whose route stays the shortest
+    assert result["touched"] == [0, 2]
+
+
+def test_add_item():
+    # new item at position 3: items first, then the new item itself, then the depot
+    distances = [abs(3 - p) for p in POSITIONS[:6]] + [0, 3]
+    result = resolve(DATA, ROUTES, {"add_items": [{"size": 1, "to": distances, "from": distances}]})
+    assert_feasible(result)
+    assert result["data"][1] == 7
+    # the first courier only goes up to position 2, its route stays the shortest
+    assert result["touched"] == [0]
+    assert sorted(result["routes"][0]) == [0, 1, 6] and result["distances"][0] == 6
+
+
+def test_repair_raises_when_an_item_fits_nowhere():
+    data, item_map = apply_patch(DATA, {"capacities": {"1": 1, "2": 1, "3": 1}})
+    try:
+        repair(ROUTES, data, set(), [])
+    except ValueError:
+        return
+    raise AssertionError("expected a ValueError")
+
+
+def test_reoptimize_leaves_out_empty_couriers(monkeypatch):
+    sub_instances = []
+    real_run_on_data = runner.run_on_data
+
+    def run_on_data(backend, option, data, time_limit, **kwargs):
+        sub_instances.append(data)
+        return real_run_on_data(backend, option, data, time_limit, **kwargs)
+
+    monkeypatch.setattr(runner, "run_on_data", run_on_data)
+    routes = [[0, 1, 2], [3, 4, 5], []]
+    result = resolve(DATA, routes, {"capacities": {"3": 4}, "remove_items": [1]}, backend="DP")
+    assert_feasible(result)
+    assert result["touched"] == [0, 2]
+    m, n, l, s, sub_D = sub_instances[0]
+    assert (m, n, l) == (1, 2, [6])
+    assert np.asarray(sub_D).shape == (3, 3)
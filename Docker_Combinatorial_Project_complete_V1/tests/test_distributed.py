@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import signal
+import time
+
+import numpy as np
+
+import Common.distributed as distributed
+import Common.runner as runner
+from Common.distributed import (DONE, PENDING, RUNNING, HeartbeatMonitor, JobQueue, run_coordinator,
+                                start_local_workers)
+
+
+def instance(number, n=7, m=2):
+    rng = np.random.default_rng(number)
+    points = rng.integers(0, 30, size=(n + 1, 2))
+    D = np.abs(points[:, None] - points[None]).sum(axis=2)
+    return m, n, [n] * m, [1] * n, D.tolist()
+
+
+def test_local_workers_solve_every_job(monkeypatch, tmp_path):
+    saved = []
+    monkeypatch.setattr(distributed, "load_instance", instance)
+    monkeypatch.setattr(runner, "save_job_result", lambda job, result, limit: saved.append(job))
+    jobs = [("DP", number, None) for number in range(1, 5)]
+    results = run_coordinator(jobs, str(tmp_path / "queue.db"), time_limit=30, local_workers=2, poll=0.2)
+
+    assert sorted(results) == sorted(jobs) and sorted(saved) == sorted(jobs)
+    assert all(result["optimal"] for result in results.values())
+    assert JobQueue(str(tmp_path / "queue.db")).counts() == {DONE: len(jobs)}
+    # the local workers and everything they started are stopped
+    assert multiprocessing.active_children() == []
+
+
+def test_job_of_killed_worker_is_requeued(monkeypatch, tmp_path):
+    monkeypatch.setattr(distributed, "load_instance", lambda number: instance(number, n=14, m=3))
+    path = str(tmp_path / "queue.db")
+    queue = JobQueue(path)
+    queue.enqueue([("SMT", 1, None)], [60])
+    worker = start_local_workers(path, 1)[0]
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline and not queue.running_beats():
+            time.sleep(0.1)
+        running = queue.running_beats()
+        assert list(running) == [1]
+        os.killpg(worker.pid, signal.SIGKILL)
+        worker.join()
+
+        monitor = HeartbeatMonitor(timeout=0.5)
+        assert monitor.stale(queue.running_beats()) == []
+        time.sleep(1)
+        stale = monitor.stale(queue.running_beats())
+        assert stale == [(1, running[1][0], running[1][1])]
+        assert queue.requeue(*stale[0])
+        assert queue.counts() == {PENDING: 1}
+        # the row is read before the new claim is counted
+        row = queue.claim("other-worker")
+        assert row["id"] == 1 and row["attempts"] == 1
+        assert queue.counts() == {RUNNING: 1}
+    finally:
+        distributed.stop_process_group(worker)
@@ -0,0 +1,28 @@
+import numpy as np
+
+from Common.evaluator import audit_result, evaluate, stack_routes
+
+DATA = (2, 2, [5, 5], [1, 1], np.array([[0, 2, 3], [2, 0, 4], [3, 4, 0]]))
+
+
+def test_evaluate_batch():
+    batch = stack_routes([[[0, 1], []], [[0], [1]], [[0], [0]]], 2)
+    evaluation = evaluate(batch, DATA)
+    assert evaluation["obj"].tolist() == [9, 8, 6]
+    assert evaluation["feasible"].tolist() == [True, True, False]
+
+
+def test_audit_mzn_result():
+    result = {"gecode": {"time": 1, "optimal": True, "obj": 8, "sol": [[3, 1, 3], [3, 2, 3]]}}
+    assert audit_result("MZN", result, DATA) == result
+
+
+def test_audit_discards_broken_routes():
+    result = {"time": 10, "optimal": True, "obj": 0, "sol": [[0, 'No Outgoing Edges'], [0, 'No Outgoing Edges']]}
+    audited = audit_result("MIP", result, DATA)
+    assert audited["obj"] == "N/A" and audited["sol"] == [] and not audited["optimal"]
+
+
+def test_audit_fixes_objective():
+    result = {"time": 1, "optimal": False, "obj": 12, "sol": [[1], [2]]}
+    assert audit_result("CG", result, DATA)["obj"] == 8
@@ -0,0 +1,22 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pulp', 'z3', 'minizinc', 'highspy', 'gurobipy', 'pandas', 'IPython')
+IMPORT_BUDGET = 1.0  # seconds, the default budget of python -m Common.registry
+
+
+def test_main_imports_no_solver_library_within_budget():
+    # a fresh interpreter: the other tests import the solvers themselves
+    check = ("import json, sys, time; start = time.perf_counter(); import Main; "
+             f"print(json.dumps([time.perf_counter() - start, "
+             f"sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules)]))")
+    process = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True,
+                             env=dict(os.environ, PYTHONPATH=ROOT), timeout=60)
+    assert process.returncode == 0, process.stderr
+    import_time, imported = json.loads(process.stdout.strip().splitlines()[-1])
+    assert imported == []
+    assert import_time <= IMPORT_BUDGET
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+import pytest
+
+from MIP.main import solve_instance_data
+
+DATA = (2, 5, [10, 10], [1, 2, 3, 1, 2],
+        [[0, 3, 4, 6, 5, 2], [3, 0, 2, 5, 6, 3], [4, 2, 0, 3, 5, 4],
+         [6, 5, 3, 0, 2, 5], [5, 6, 5, 2, 0, 4], [2, 3, 4, 5, 4, 0]])
+
+
+@pytest.mark.parametrize("solver", ["cbc", "highs"])
+def test_gap_run_reads_dual_bound_and_leaves_no_log(solver, monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    stats = {}
+    result = solve_instance_data(DATA, solver, 30, stats=stats, gap={"rel": 0.5})
+    assert result["obj"] != "N/A"
+    assert stats["dual_bound"] is not None
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,20 @@
+import numpy as np
+
+from Common.exact_dp import solve_data
+from Common.presolve import presolve, solve_reduced
+
+
+def test_item_fitting_no_courier():
+    data = (1, 1, [3], [5], np.array([[0, 2], [2, 0]]))
+    reduction = presolve(data)
+    assert reduction.data is data and not reduction.renumbered
+    result = solve_reduced("DP", data, lambda reduced, warm_start, on_incumbent: solve_data(reduced))
+    assert result["obj"] == "N/A" and result["sol"] == []
+
+
+def test_dropped_courier_mapped_back():
+    # the second courier cannot carry any item
+    data = (2, 2, [5, 0], [1, 1], np.array([[0, 2, 3], [2, 0, 4], [3, 4, 0]]))
+    result = solve_reduced("DP", data, lambda reduced, warm_start, on_incumbent: solve_data(reduced))
+    assert result["obj"] == 9
+    assert sorted(result["sol"][0]) == [1, 2] and result["sol"][1] == []
@@ -0,0 +1,18 @@
+import pytest
+
+from Common.scaling import measure
+from Common.shared import SharedInstance
+
+DATA = (2, 5, [10, 10], [1, 2, 3, 1, 2],
+        [[0, 3, 4, 6, 5, 2], [3, 0, 2, 5, 6, 3], [4, 2, 0, 3, 5, 4],
+         [6, 5, 3, 0, 2, 5], [5, 6, 5, 2, 0, 4], [2, 3, 4, 5, 4, 0]])
+
+
+@pytest.mark.parametrize("backend, option", [("DP", None), ("CG", None), ("SMT", None), ("SMT", "race"),
+                                             ("MIP", "highs")])
+def test_every_backend_reports_its_build_time(backend, option):
+    with SharedInstance(DATA) as shared:
+        record = measure(backend, option, shared.handle, 20)
+    assert "error" not in record, record
+    assert record["build_time"] is not None and record["build_time"] >= 0
+    assert record["peak_memory_kb"] > 0
@@ -0,0 +1,115 @@
+import os
+import signal
+import time
+
+import numpy as np
+
+from Common.service import SolverService
+
+DATA = (1, 2, [5], [1, 1], [[0, 2, 3], [2, 0, 4], [3, 4, 0]])
+
+
+def hard_instance(n=14, m=3, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, 100, size=(n + 1, 2))
+    D = np.abs(points[:, None] - points[None]).sum(axis=2)
+    return m, n, [n] * m, [1] * n, D.tolist()
+
+
+def descendants(pid):
+    children = {}
+    for name in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except FileNotFoundError:
+            continue
+        if fields[0] != "Z":
+            children.setdefault(int(fields[1]), []).append(int(name))
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def wait_for(service, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = service.status(job_id)
+        if job["state"] not in ("pending", "running"):
+            return job
+        time.sleep(0.1)
+    raise TimeoutError(job_id)
+
+
+def test_dead_worker_is_replaced():
+    service = SolverService({"DP": 1})
+    try:
+        assert wait_for(service, service.submit("DP", None, DATA, 10))["result"]["obj"] == 9
+        killed = service.workers["DP"][0]
+        os.kill(killed.process.pid, signal.SIGKILL)
+        deadline = time.time() + 10
+        while time.time() < deadline and service.workers["DP"][0] is killed:
+            time.sleep(0.1)
+        assert service.health()["workers"]["DP"] == [True]
+        assert wait_for(service, service.submit("DP", None, DATA, 10))["result"]["obj"] == 9
+    finally:
+        service.shutdown()
+
+
+def test_running_job_of_dead_worker_fails():
+    service = SolverService({"DP": 1})
+    try:
+        wait_for(service, service.submit("DP", None, DATA, 10))
+        # the job is dispatched to the stopped worker, which is then killed before solving it
+        pid = service.workers["DP"][0].process.pid
+        os.kill(pid, signal.SIGSTOP)
+        job_id = service.submit("DP", None, DATA, 10)
+        assert service.status(job_id)["state"] == "running"
+        os.kill(pid, signal.SIGKILL)
+        job = wait_for(service, job_id)
+        assert job["state"] == "failed" and "exited" in job["result"]
+        assert not service.shared
+        assert wait_for(service, service.submit("DP", None, DATA, 10))["state"] == "done"
+    finally:
+        service.shutdown()
+
+
+def test_smt_race_job():
+    service = SolverService({"SMT": 1})
+    try:
+        job = wait_for(service, service.submit("SMT", "race", DATA, 10))
+        assert job["state"] == "done" and job["result"]["obj"] == 9
+    finally:
+        service.shutdown()
+
+
+def test_cancelled_race_job_stops_its_processes():
+    service = SolverService({"SMT": 1})
+    try:
+        worker = service.workers["SMT"][0]
+        job_id = service.submit("SMT", "race", hard_instance(), 120)
+        deadline = time.time() + 30
+        while time.time() < deadline and not descendants(worker.process.pid):
+            time.sleep(0.1)
+        race = descendants(worker.process.pid)
+        assert race
+        assert service.cancel(job_id)
+        assert service.status(job_id)["state"] == "cancelled"
+        deadline = time.time() + 10
+        while time.time() < deadline and any(is_running(pid) for pid in race):
+            time.sleep(0.1)
+        assert not any(is_running(pid) for pid in race)
+        assert wait_for(service, service.submit("SMT", "race", DATA, 10))["result"]["obj"] == 9
+    finally:
+        service.shutdown()
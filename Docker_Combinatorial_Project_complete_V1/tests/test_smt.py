@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from z3 import sat, unsat
+
+from Common import exact_dp
+from Common.cache import instance_hash
+from SMT.SMT import PROBE_PIPELINES, RACE_CONFIGS, create_mcp_solver, probe_bound
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a crashing configuration takes its process down: each one runs in its own interpreter
+SOLVE = '''
+import sys
+from SMT.SMT import RACE_CONFIGS, read_instance, solve_mcp
+config = RACE_CONFIGS[int(sys.argv[1])]
+m, n, l, s, D = read_instance("instances/dat_instances/inst01.dat")
+result = solve_mcp(m, n, l, s, D, None, None, timeout=60, config=config)
+sys.exit(0 if result["obj"] == 14 else 1)
+'''
+
+
+@pytest.mark.parametrize("index", range(len(RACE_CONFIGS)), ids=[config["name"] for config in RACE_CONFIGS])
+def test_race_config_solves_inst01(index):
+    process = subprocess.run([sys.executable, "-c", SOLVE, str(index)], cwd=ROOT, capture_output=True,
+                             env=dict(os.environ, PYTHONPATH=ROOT), timeout=120)
+    assert process.returncode == 0, process.stderr.decode()[-500:]
+
+
+def probe_instance():
+    # 2 couriers, 6 items: the objective ranges over more values than lia2card encodes
+    points = [(25, 19), (15, 8), (9, 1), (2, 0), (5, 24), (19, 27), (15, 18)]
+    D = [[abs(a - c) + abs(b - d) for c, d in points] for a, b in points]
+    return 2, 6, [15, 16], [5, 4, 4, 3, 3, 5], D
+
+
+@pytest.mark.parametrize("pipeline", list(PROBE_PIPELINES))
+def test_probe_pipeline_decides_optimum(pipeline):
+    m, n, l, s, D = probe_instance()
+    opt = exact_dp.solve_data((m, n, l, s, D))["obj"]
+    solver, x, u, max_route_length = create_mcp_solver(m, n, l, s, D)
+    key = instance_hash(m, n, l, s, D)
+    tactics = PROBE_PIPELINES[pipeline]
+    assert probe_bound(solver.assertions(), max_route_length, opt - 1, tactics, key, 60) == unsat
+    assert probe_bound(solver.assertions(), max_route_length, opt, tactics, key, 60) == sat
+
+
+def test_config_globals_are_restored():
+    from z3 import get_param
+    from SMT.SMT import solve_mcp
+    before = {param: get_param(param) for param in ("smt.random_seed", "smt.arith.solver", "smt.phase_selection")}
+    config = {"global": {"smt.random_seed": 7, "smt.arith.solver": 2, "smt.phase_selection": 5}, "opt": {}}
+    m, n, l, s, D = probe_instance()
+    assert solve_mcp(m, n, l, s, D, None, None, timeout=30, config=config)["obj"] == 62
+    assert {param: get_param(param) for param in before} == before
@@ -0,0 +1,73 @@
+import contextlib
+import io
+import os
+import re
+import subprocess
+
+import pytest
+import z3
+
+import Common.runner as runner
+from Common.tuner import PARAMETER_SPACE, backend_params, cost, default_config, model_parameter_space, tune_worker
+
+DATA = (1, 2, [5], [1, 1], [[0, 2, 3], [2, 0, 4], [3, 4, 0]])
+
+
+def test_failed_run_costs_infinity():
+    handle = (1, 2, [5], [1, 1], "no-such-segment", (3, 3), "<i8")
+    run_summary = tune_worker(("DP", None, {}, handle, 7))
+    assert run_summary == (7, False, None)
+    assert cost(run_summary)[0] == float('inf')
+
+
+def test_smt_default_config_is_untuned():
+    params = backend_params("SMT", default_config(PARAMETER_SPACE[("SMT", None)]))
+    for name, value in params["global"].items():
+        assert z3.get_param(name) == str(value)
+    help_text = io.StringIO()
+    with contextlib.redirect_stdout(help_text):
+        z3.Optimize().help()
+    for name, value in params["opt"].items():
+        assert re.search(rf"{name} .*\(default: {value}\)", help_text.getvalue())
+    assert params["tactics"] == []
+
+
+def test_cbc_default_config_is_untuned():
+    from pulp import PULP_CBC_CMD
+    cbc = PULP_CBC_CMD().path
+    for name, value in default_config(PARAMETER_SPACE[("MIP", "cbc")]).items():
+        output = subprocess.run([cbc, f"-{name}??"], capture_output=True, text=True).stdout
+        assert re.search(r"current\s+([^\s>]+)", output).group(1) == str(value)
+
+
+def test_highs_default_config_is_untuned():
+    highspy = pytest.importorskip("highspy")
+    highs = highspy.Highs()
+    for name, value in default_config(PARAMETER_SPACE[("MIP", "highs")]).items():
+        assert highs.getOptionValue(name)[1] == value
+
+
+@pytest.mark.parametrize("model, expected", [
+    ("07. 2D Sequence Base Approach - Final Model - GECODE.mzn", {"relax_rate": 50, "restart_scale": 100}),
+    ("10. 2D Heuristic Sequence Approach - Final Model - ORTOOLS.mzn", {"relax_rate": 80, "restart_scale": "num_item"}),
+])
+def test_mzn_default_config_is_the_model(model, expected):
+    pytest.importorskip("minizinc")
+    with open(os.path.join(os.path.dirname(__file__), "..", "MZN", "Solvers", "projectmodels", model)) as f:
+        assert default_config(model_parameter_space(f.read())) == expected
+
+
+def test_run_on_data_uses_tuned_params(monkeypatch):
+    tuned = {"global": {"smt.random_seed": 1}, "opt": {}, "tactics": []}
+    received = {}
+    real_backend = runner.get_backend("DP")
+
+    class Backend:
+        def solve_data(self, data, option, time_limit, params=None, **kwargs):
+            received["params"] = params
+            return real_backend.solve_data(data, option, time_limit)
+
+    monkeypatch.setattr(runner, "tuned_params", lambda backend, option, data: tuned)
+    monkeypatch.setattr(runner, "get_backend", lambda backend: Backend())
+    assert runner.run_on_data("DP", None, DATA, 10)["obj"] == 9
+    assert received["params"] == tuned